@@ -0,0 +1,246 @@
+import gc
+import json
+import logging
+import pathlib
+import platform
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+
+import click
+
+import get_all_routes as codegen
+from synthetic_spec import generate_synthetic_spec
+
+default_baseline_file = "./bench_baseline.json"
+scales = {
+    "10": {"paths": 10, "schemas": 10},
+    "1k": {"paths": 1_000, "schemas": 500},
+    "10k": {"paths": 10_000, "schemas": 5_000},
+}
+
+
+class StageTimer:
+    """keeps the best (lowest) measurement of every stage over the repeats of a benchmark"""
+
+    def __init__(self):
+        self.stages: dict[str, dict[str, float]] = {}
+
+    def run(self, stage: str, fn, *args, **kwargs):
+        # garbage left by the previous stage would be collected on this stage's clock
+        gc.collect()
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        measurement = {"seconds": seconds, "peak_mb": peak / 2**20}
+        best = self.stages.setdefault(stage, measurement)
+        for metric, value in measurement.items():
+            best[metric] = min(best[metric], value)
+        return result
+
+
+def clear_codegen_caches() -> None:
+    """every repeat starts cold, like a fresh generator run"""
+    codegen._type_node_cache.clear()
+    codegen._union_type_cache.clear()
+    codegen.compile_path_template.cache_clear()
+    codegen.format_static_elm_path.cache_clear()
+    codegen.get_elm_identifier.cache_clear()
+
+
+def generate_definitions(schemas: dict[str, Any]) -> list[codegen.ElmSchema]:
+    return [
+        codegen.generate_elm_type_and_encoder_decoder_fn(schema_props)
+        for schema_props in schemas.values()
+    ]
+
+
+def generate_api_definitions(apis: dict[str, Any]) -> list[codegen.ElmOperation]:
+    return [
+        codegen.generate_elm_api_function(route, method, method_vals)
+        for route, methods in apis["paths"].items()
+        for method, method_vals in methods.items()
+    ]
+
+
+def format_definitions(definitions, api_definitions):
+    elm_types, elm_encoder_fns, elm_decoder_fns = [], [], []
+    for elm_schema in definitions:
+        elm_types.append(
+            codegen.format_elm_types(elm_schema.record, elm_schema.union_types)
+        )
+        for encoder_fn in elm_schema.encoders:
+            elm_encoder_fns.append(codegen.format_elm_encoder_fn(encoder_fn))
+        for decoder_fn in elm_schema.decoders:
+            elm_decoder_fns.append(codegen.format_elm_decoder_fn(decoder_fn))
+    elm_functions = {
+        operation.fn_name: codegen.format_api_fn(operation)
+        for operation in api_definitions
+    }
+    return elm_functions, elm_types, elm_encoder_fns, elm_decoder_fns
+
+
+def calibration_workload() -> None:
+    """fixed json and string work, shows how fast the machine is right now"""
+    rows = [
+        {"name": f"field_{i}", "type": "integer", "items": list(range(i % 16))}
+        for i in range(20_000)
+    ]
+    json.loads(json.dumps(rows))
+    "\n".join(f'{row["name"]} : {row["type"]}' for row in rows)
+
+
+def run_benchmark(scale: str, output_dir: str, repeat: int = 1) -> dict[str, Any]:
+    """best of repeat runs per stage, a single run is within the noise of max_regression"""
+    spec_bytes = json.dumps(generate_synthetic_spec(**scales[scale])).encode("utf-8")
+    timer = StageTimer()
+    tracemalloc.start()
+    try:
+        for run in range(repeat):
+            apis = definitions = api_definitions = elm_functions = None
+            clear_codegen_caches()
+            timer.run("calibration", calibration_workload)
+            apis = timer.run("load", codegen.parse_openapi_spec, spec_bytes)
+            codegen.index_openapi_document(apis)
+            definitions = timer.run(
+                "types", generate_definitions, apis["components"]["schemas"]
+            )
+            api_definitions = timer.run(
+                "api_functions", generate_api_definitions, apis
+            )
+            elm_functions, elm_types, elm_encoder_fns, elm_decoder_fns = timer.run(
+                "format", format_definitions, definitions, api_definitions
+            )
+            # a new file every run, an unchanged file is not rewritten
+            timer.run(
+                "write",
+                codegen.write_http_fns_file,
+                elm_functions,
+                elm_types=elm_types,
+                elm_encoder_fns=elm_encoder_fns,
+                elm_decoder_fns=elm_decoder_fns,
+                output_file=str(
+                    pathlib.Path(output_dir, f"ApiGen{scale}_{run}.elm")
+                ),
+            )
+        _, total_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    calibration = timer.stages.pop("calibration")
+    return {
+        "stages": timer.stages,
+        "total_seconds": sum(stage["seconds"] for stage in timer.stages.values()),
+        "peak_mb": total_peak / 2**20,
+        "calibration_seconds": calibration["seconds"],
+    }
+
+
+def compare_with_baseline(
+    results: dict[str, Any], baseline: dict[str, Any], max_regression: float
+) -> list[str]:
+    regressions = []
+    for scale, result in results.items():
+        baseline_result = baseline.get("results", {}).get(scale)
+        if baseline_result is None:
+            continue
+        # how much slower the machine is than when the baseline was taken; a shared vm
+        # drifts by more than max_regression over minutes, which best-of-N can't hide
+        slowdown = 1.0
+        if "calibration_seconds" in baseline_result:
+            slowdown = max(
+                1.0,
+                result["calibration_seconds"] / baseline_result["calibration_seconds"],
+            )
+        for stage, measurement in result["stages"].items():
+            baseline_stage = baseline_result["stages"].get(stage)
+            if baseline_stage is None:
+                continue
+            for metric in ("seconds", "peak_mb"):
+                # tiny stages are all noise, only flag what is measurable
+                if baseline_stage[metric] < 0.005:
+                    continue
+                ratio = measurement[metric] / baseline_stage[metric]
+                if metric == "seconds":
+                    ratio /= slowdown
+                if ratio > 1 + max_regression:
+                    regressions.append(
+                        f"{scale}/{stage} {metric}: {baseline_stage[metric]:.3f} -> {measurement[metric]:.3f} ({ratio:.2f}x)"
+                    )
+    return regressions
+
+
+def print_results(results: dict[str, Any]) -> None:
+    print(f'{"scale":<6} {"stage":<14} {"seconds":>10} {"peak MB":>10}')
+    for scale, result in results.items():
+        for stage, measurement in result["stages"].items():
+            print(
+                f'{scale:<6} {stage:<14} {measurement["seconds"]:>10.4f} {measurement["peak_mb"]:>10.2f}'
+            )
+        print(
+            f'{scale:<6} {"total":<14} {result["total_seconds"]:>10.4f} {result["peak_mb"]:>10.2f}'
+        )
+
+
+@click.command()
+@click.option(
+    "-s",
+    "--scale",
+    "selected_scales",
+    multiple=True,
+    type=click.Choice(list(scales)),
+    help="Scales to run (default: all)",
+)
+@click.option("--baseline", default=default_baseline_file, type=click.Path())
+@click.option(
+    "--save-baseline", is_flag=True, help="Store these results as the new baseline"
+)
+@click.option(
+    "--max-regression",
+    default=0.25,
+    type=float,
+    help="Allowed slowdown / memory growth before failing (0.25 = 25%)",
+)
+@click.option(
+    "-r",
+    "--repeat",
+    default=5,
+    type=click.IntRange(min=1),
+    help="Runs per scale, the fastest run of every stage is compared",
+)
+def main(selected_scales, baseline, save_baseline, max_regression, repeat):
+    """Time every codegen stage on synthetic specs and compare with the baseline"""
+    codegen.logger.setLevel(logging.ERROR)
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for scale in selected_scales or scales:
+            results[scale] = run_benchmark(scale, output_dir, repeat=repeat)
+    print_results(results)
+
+    if save_baseline:
+        with open(baseline, "w") as f:
+            f.write(
+                json.dumps(
+                    {"python": platform.python_version(), "results": results}, indent=2
+                )
+            )
+        print(f"saved baseline to {baseline}")
+        return
+    if not pathlib.Path(baseline).is_file():
+        print(f"no baseline at {baseline}, run with --save-baseline to create one")
+        return
+    with open(baseline, "r") as f:
+        regressions = compare_with_baseline(
+            results, json.loads(f.read()), max_regression
+        )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        raise SystemExit(1)
+    print("no regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
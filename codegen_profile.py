@@ -0,0 +1,113 @@
+import contextlib
+import heapq
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Any, Iterator
+
+
+class StageProfiler:
+    """wall / cpu time and tracemalloc peak per stage, plus the slowest items per stage.
+
+    stages can nest (e.g. every schema compiled while the file is being written);
+    a stage's seconds exclude the time spent in the stages nested inside it.
+    """
+
+    def __init__(self, slowest_count: int = 10, trace_memory: bool = True):
+        self.slowest_count = slowest_count
+        self.trace_memory = trace_memory
+        self.stages: dict[str, dict[str, float]] = {}
+        self.slowest_items: dict[str, list[tuple[float, str]]] = {}
+        self.trace_events: list[dict[str, Any]] = []
+        self._frames: list[dict[str, float]] = []
+        self._origin = time.perf_counter()
+
+    def start(self) -> None:
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self) -> None:
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextlib.contextmanager
+    def measure(self, stage: str, item: str | None = None) -> Iterator[None]:
+        if self.trace_memory and tracemalloc.is_tracing():
+            if self._frames:
+                parent = self._frames[-1]
+                parent["peak"] = max(parent["peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        frame = {"child_wall": 0.0, "child_cpu": 0.0, "peak": 0.0}
+        self._frames.append(frame)
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - start_wall
+            cpu = time.process_time() - start_cpu
+            self._frames.pop()
+            peak = frame["peak"]
+            if self.trace_memory and tracemalloc.is_tracing():
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+            if self._frames:
+                parent = self._frames[-1]
+                parent["child_wall"] += wall
+                parent["child_cpu"] += cpu
+                parent["peak"] = max(parent["peak"], peak)
+
+            stats = self.stages.setdefault(
+                stage, {"wall": 0.0, "cpu": 0.0, "peak_bytes": 0, "count": 0}
+            )
+            stats["wall"] += wall - frame["child_wall"]
+            stats["cpu"] += cpu - frame["child_cpu"]
+            stats["peak_bytes"] = max(stats["peak_bytes"], peak)
+            stats["count"] += 1
+            if item is not None:
+                slowest = self.slowest_items.setdefault(stage, [])
+                if len(slowest) < self.slowest_count:
+                    heapq.heappush(slowest, (wall, item))
+                else:
+                    heapq.heappushpop(slowest, (wall, item))
+            self.trace_events.append(
+                {
+                    "name": item if item is not None else stage,
+                    "cat": stage,
+                    "ph": "X",
+                    "ts": (start_wall - self._origin) * 1e6,
+                    "dur": wall * 1e6,
+                    "pid": os.getpid(),
+                    "tid": threading.get_ident(),
+                    "args": {"cpu_ms": cpu * 1e3, "peak_bytes": peak},
+                }
+            )
+
+    def summary(self) -> str:
+        lines = [f'{"stage":<16} {"count":>7} {"wall s":>9} {"cpu s":>9} {"peak MB":>9}']
+        for stage, stats in self.stages.items():
+            lines.append(
+                f'{stage:<16} {stats["count"]:>7} {stats["wall"]:>9.3f} {stats["cpu"]:>9.3f} {stats["peak_bytes"] / 2**20:>9.2f}'
+            )
+        for stage, slowest in self.slowest_items.items():
+            lines.append(f"slowest {stage}:")
+            for seconds, item in sorted(slowest, reverse=True):
+                lines.append(f"    {seconds * 1e3:>9.2f} ms  {item}")
+        return "\n".join(lines)
+
+    def write_chrome_trace(self, trace_file: str) -> None:
+        """trace event format, open with chrome://tracing or https://ui.perfetto.dev"""
+        with open(trace_file, "w") as f:
+            f.write(
+                json.dumps(
+                    {"traceEvents": self.trace_events, "displayTimeUnit": "ms"}
+                )
+            )
+
+
+def measure(
+    profiler: StageProfiler | None, stage: str, item: str | None = None
+) -> contextlib.AbstractContextManager:
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.measure(stage, item)
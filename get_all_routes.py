@@ -1,116 +1,1181 @@
-from typing import Any, Union
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Iterable, Iterator, Union
 
 import click
 import requests
 from termcolor import colored
+
+try:
+    import orjson
+except ImportError:  # optional, only makes loading big specs faster
+    orjson = None
+try:
+    import yaml
+except ImportError:  # optional, only needed to $ref yaml documents
+    yaml = None
+from codegen_profile import StageProfiler, measure
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextvars import ContextVar, copy_context
+import contextlib
+import copy
+import fnmatch
+import functools
+import gzip
+import hashlib
+import io
 import json
+import logging
+import mmap
+import os
 import pathlib
+import re
+import secrets
+import tempfile
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
 
 local_openapi_json = "http://localhost:8000/openapi.json"
-skip_non_api_routes = True
 open_square_bracket, close_square_braket = "[", "]"
 open_curly_bracket, close_curly_braket = "{", "}"
 # use_fast_api_web_data = True # TODO toggle fastapi webdata
-tab = "    "
-type_prefix = "Api"
+manifest_file_loc = "./codegen/manifest.json"
+# the only top level sections the generator reads, everything else is dropped after loading
+openapi_sections = ("openapi", "info", "paths", "components")
+gzip_magic = b"\x1f\x8b"
+request_timeout = 30.0
+# external $ref documents fetched over http, keyed by url and revalidated with their ETag
+ref_cache_dir = "./codegen/refs"
+# external $ref documents fetched at once, also the size of their connection pool
+ref_fetch_workers = 16
+# keys whose values are schemas, an external $ref below them is hoisted into components/schemas
+schema_keywords = frozenset(
+    ("schema", "schemas", "items", "properties", "additionalProperties")
+    + ("allOf", "anyOf", "oneOf", "not")
+)
+_http_session: requests.Session | None = None
+# json pointer -> node of the document being generated, see index_openapi_document
+ref_index: ContextVar[dict[str, Any]] = ContextVar("ref_index", default={})
+# widest D.mapN of elm/json, wider records are decoded in stages
+max_map_arity = 8
+decoder_styles = ("map", "pipeline")
+# methods the <fn>_retry variants are generated for
+idempotent_methods = ("get", "head", "put", "delete", "options")
+retry_max_delay_ms = 10000
+# query parameters selecting the page of a list operation, per pagination style
+pagination_params = {
+    "offset": ("offset", "skip", "start"),
+    "page": ("page", "page_number"),
+    "cursor": ("cursor", "after", "page_token", "next_token", "starting_after"),
+}
+page_size_params = ("limit", "page_size", "per_page", "size", "count")
+# response properties holding the items of a page / the cursor of the next one
+page_items_properties = ("items", "data", "results", "records", "entries")
+next_cursor_properties = ("next_cursor", "next", "next_page_token", "cursor")
+# bump whenever the shape of generated fragments changes so stale manifests are ignored
+manifest_version = 5
+
+TRACE = 5
+logging.addLevelName(TRACE, "TRACE")
+logger = logging.getLogger("elm_openapi_codegen")
+# the library stays silent unless the cli (or the embedding app) configures logging
+logger.addHandler(logging.NullHandler())
+# issues found while generating, see report_issue / write_diagnostics_report.
+# generate() collects into a list of its own, everything else shares diagnostics
+diagnostics: list[dict[str, Any]] = []
+current_diagnostics: ContextVar[list[dict[str, Any]]] = ContextVar(
+    "current_diagnostics", default=diagnostics
+)
+diagnostic_context: ContextVar[dict[str, Any]] = ContextVar(
+    "diagnostic_context", default={}
+)
+
+
+@dataclass(frozen=True, slots=True)
+class GeneratorOptions:
+    """everything that shapes the generated elm code, see generate"""
+
+    module_name: str = "ApiGen"
+    type_prefix: str = "Api"
+    # only generate routes starting with /api
+    skip_non_api_routes: bool = True
+    tab: str = "    "
+    # ApiGen.Types, ApiGen.Codecs and one module per tag instead of a single module
+    split_modules: bool = False
+    include_tags: tuple[str, ...] = ()
+    exclude_tags: tuple[str, ...] = ()
+    path_globs: tuple[str, ...] = ()
+    operation_ids: tuple[str, ...] = ()
+    tree_shake: bool = False
+    jobs: int = 1
+    # "map" decodes records with D.map..D.map8, "pipeline" with Json.Decode.Pipeline
+    decoder_style: str = "map"
+    # <module_name>.Cache and a <fn>_cached variant of every GET operation
+    cache: bool = False
+    # seconds a GET response is cached unless x-cache-ttl or cache_ttls say otherwise
+    cache_ttl: float = 60.0
+    cache_max_entries: int = 200
+    # (operationId, seconds) overriding x-cache-ttl
+    cache_ttls: tuple[tuple[str, float], ...] = ()
+    # <module_name>.Tasks and a <fn>_task variant of every operation
+    tasks: bool = False
+    # milliseconds an operation may take unless x-timeout-ms or tag_timeouts say otherwise
+    timeout_ms: int = 90000
+    # (tag, milliseconds) for the operations of a tag without x-timeout-ms
+    tag_timeouts: tuple[tuple[str, int], ...] = ()
+    # <module_name>.Retry and a <fn>_retry variant of every idempotent operation
+    retry: bool = False
+    # <module_name>.Paging and a <fn>_pages source of every paginated list operation
+    pagination: bool = False
+    # defaults of Retry.default_policy
+    retry_attempts: int = 3
+    retry_delay_ms: int = 200
+    retry_statuses: tuple[int, ...] = (502, 503, 504)
+
+
+generator_options: ContextVar[GeneratorOptions] = ContextVar(
+    "generator_options", default=GeneratorOptions()
+)
+
+
+class ColoredFormatter(logging.Formatter):
+    level_colors = {
+        logging.ERROR: "red",
+        logging.WARNING: "red",
+        logging.DEBUG: "blue",
+        TRACE: "yellow",
+    }
+
+    def format(self, record: logging.LogRecord) -> str:
+        color = getattr(record, "color", self.level_colors.get(record.levelno))
+        message = super().format(record)
+        return colored(message, color) if color else message
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(ColoredFormatter("%(message)s"))
+    logger.handlers[:] = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+@contextlib.contextmanager
+def diagnostic_scope(**context: Any) -> Iterator[None]:
+    """route / schema that issues reported inside the block are attributed to"""
+    token = diagnostic_context.set({**diagnostic_context.get(), **context})
+    try:
+        yield
+    finally:
+        diagnostic_context.reset(token)
+
+
+def report_issue(code: str, message: str, *args: Any, **context: Any) -> None:
+    current_diagnostics.get().append(
+        {
+            "code": code,
+            "message": message % args if args else message,
+            **diagnostic_context.get(),
+            **context,
+        }
+    )
+    logger.warning(message, *args)
+
+
+def reset_diagnostics() -> None:
+    current_diagnostics.get().clear()
+
+
+def write_diagnostics_report(report_file: str) -> None:
+    pathlib.Path(report_file).parent.mkdir(parents=True, exist_ok=True)
+    with open(report_file, "w") as f:
+        f.write(json.dumps({"warnings": current_diagnostics.get()}, indent=2))
+
+
+def collect_diagnostics_of(fn, *args) -> tuple[Any, list[dict[str, Any]]]:
+    """runs fn in a worker process and hands its issues back to the parent"""
+    reset_diagnostics()
+    result = fn(*args)
+    return result, list(current_diagnostics.get())
+
+
+def get_http_session() -> requests.Session:
+    """one pooled session per process so repeated fetches reuse connections"""
+    global _http_session
+    if _http_session is None:
+        session = requests.Session()
+        session.headers.update(
+            {"Accept": "application/json", "Accept-Encoding": "gzip, deflate"}
+        )
+        _http_session = session
+    return _http_session
+
+
+def get_openapi_cache_metadata_loc(write_file_loc: str) -> str:
+    return f"{write_file_loc}.meta.json"
+
+
+def read_openapi_cache_metadata(write_file_loc: str) -> dict[str, Any]:
+    metadata_file = pathlib.Path(get_openapi_cache_metadata_loc(write_file_loc))
+    if not (pathlib.Path(write_file_loc).is_file() and metadata_file.is_file()):
+        return {}
+    try:
+        with open(metadata_file, "r") as f:
+            return json.loads(f.read())
+    except json.JSONDecodeError:
+        return {}
+
+
+def loads_json(data: bytes | memoryview | str) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def select_openapi_sections(document: dict[Any, Any]) -> dict[Any, Any]:
+    return {k: document[k] for k in openapi_sections if k in document}
+
+
+def parse_openapi_spec(data: bytes | memoryview) -> dict[Any, Any]:
+    """parses a (possibly gzip compressed) spec, keeping only openapi_sections"""
+    if data[:2] == gzip_magic:
+        data = gzip.decompress(data)
+    return select_openapi_sections(loads_json(data))
+
+
+def read_openapi_file(spec_file: str) -> dict[Any, Any]:
+    # memory mapped so a big spec is parsed without first copying it into a str
+    with open(spec_file, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return parse_openapi_spec(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return parse_openapi_spec(view)
 
 
 def get_openapi_config(
     open_api_json_req_url: str = local_openapi_json,
     write_file_loc: str = "./codegen/openapi.json",
+    timeout: float = request_timeout,
+    profiler: StageProfiler | None = None,
 ) -> dict[Any, Any]:
-    if pathlib.Path(write_file_loc).is_file():
-        with open(write_file_loc, "r") as f:
-            return json.loads(f.read())
+    is_cached = pathlib.Path(write_file_loc).is_file()
+    metadata = read_openapi_cache_metadata(write_file_loc)
+    conditional_headers = {}
+    if metadata.get("url") == open_api_json_req_url:
+        if metadata.get("etag"):
+            conditional_headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            conditional_headers["If-Modified-Since"] = metadata["last_modified"]
+
+    try:
+        with measure(profiler, "fetch"):
+            resp = get_http_session().get(
+                open_api_json_req_url, headers=conditional_headers, timeout=timeout
+            )
+    except requests.exceptions.RequestException:
+        if not is_cached:
+            raise
+        logger.warning(
+            "could not reach %s, using cached %s", open_api_json_req_url, write_file_loc
+        )
+        with measure(profiler, "parse"):
+            return read_openapi_file(write_file_loc)
+
+    if resp.status_code == 304 and is_cached:
+        with measure(profiler, "parse"):
+            return read_openapi_file(write_file_loc)
+    resp.raise_for_status()
+
+    with measure(profiler, "parse"):
+        apis = parse_openapi_spec(resp.content)
+    pathlib.Path(write_file_loc).parent.mkdir(parents=True, exist_ok=True)
+    # the body is cached as received, re-serializing a big spec costs as much as parsing it
+    with open(write_file_loc, "wb") as f:
+        f.write(
+            gzip.compress(resp.content, compresslevel=1)
+            if write_file_loc.endswith(".gz")
+            else resp.content
+        )
+    with open(get_openapi_cache_metadata_loc(write_file_loc), "w") as f:
+        f.write(
+            json.dumps(
+                {
+                    "url": open_api_json_req_url,
+                    "etag": resp.headers.get("ETag"),
+                    "last_modified": resp.headers.get("Last-Modified"),
+                }
+            )
+        )
+    return apis
+
+
+def load_openapi_spec(url_or_path: str, write_file_loc: str) -> dict[Any, Any]:
+    if url_or_path.startswith(("http://", "https://")):
+        apis = get_openapi_config(url_or_path, write_file_loc)
+    else:
+        apis = read_openapi_file(url_or_path)
+    return bundle_external_refs(apis, get_spec_base_uri(url_or_path))
+
+
+def decode_json_pointer(ref: str) -> list[str]:
+    pointer = urllib.parse.unquote(ref.partition("#")[2])
+    if pointer in ("", "/"):
+        return []
+    return [
+        token.replace("~1", "/").replace("~0", "~")
+        for token in pointer.lstrip("/").split("/")
+    ]
 
-    resp = requests.get(open_api_json_req_url)
-    apis = resp.json()
-    with open(write_file_loc, "w") as f:
-        f.write(json.dumps(apis, indent=2))
+
+def encode_json_pointer(tokens: list[str]) -> str:
+    return "#" + "".join(
+        "/" + str(token).replace("~", "~0").replace("/", "~1") for token in tokens
+    )
+
+
+def normalize_ref(ref: str) -> str:
+    return encode_json_pointer(decode_json_pointer(ref))
+
+
+def build_ref_index(document: dict[Any, Any]) -> dict[str, Any]:
+    """maps the json pointer of every object / array in the document to the node"""
+    index: dict[str, Any] = {}
+    stack: list[tuple[str, Any]] = [("#", document)]
+    while stack:
+        pointer, node = stack.pop()
+        index[pointer] = node
+        if isinstance(node, dict):
+            children = node.items()
+        elif isinstance(node, list):
+            children = enumerate(node)
+        else:
+            continue
+        for key, child in children:
+            if isinstance(child, (dict, list)):
+                escaped_key = str(key).replace("~", "~0").replace("/", "~1")
+                stack.append((f"{pointer}/{escaped_key}", child))
+    return index
+
+
+def index_openapi_document(apis: dict[Any, Any]) -> dict[str, Any]:
+    index = build_ref_index(apis)
+    ref_index.set(index)
+    return index
+
+
+def init_worker(index: dict[str, Any], options: GeneratorOptions) -> None:
+    """gives a pool worker the $ref index and options of the run it works for"""
+    ref_index.set(index)
+    generator_options.set(options)
+
+
+def resolve_ref(ref: str) -> Any:
+    return ref_index.get().get(normalize_ref(ref))
+
+
+def deref(node: Any) -> Any:
+    """follows $ref chains (e.g. #/components/requestBodies/X) to the referenced node"""
+    seen: set[str] = set()
+    while isinstance(node, dict) and "$ref" in node and node["$ref"] not in seen:
+        seen.add(node["$ref"])
+        target = resolve_ref(node["$ref"])
+        if target is None:
+            break
+        node = target
+    return node
+
+
+def get_schema_name_from_ref(ref: str) -> str | None:
+    """name of the component schema a $ref points at, None for any other location"""
+    tokens = decode_json_pointer(ref)
+    if len(tokens) == 3 and tokens[:2] == ["components", "schemas"]:
+        return tokens[2]
+    return None
+
+
+def get_schema_name_or_last_token(ref: str) -> str:
+    schema_name = get_schema_name_from_ref(ref)
+    if schema_name is not None:
+        return schema_name
+    tokens = decode_json_pointer(ref)
+    return tokens[-1] if tokens else ref
+
+
+def get_spec_base_uri(url_or_path: str) -> str:
+    """uri the relative external $refs of a spec are resolved against"""
+    if url_or_path.startswith(("http://", "https://", "file:")):
+        return url_or_path
+    return pathlib.Path(url_or_path).resolve().as_uri()
+
+
+def split_ref(ref: str, base_uri: str) -> tuple[str, str]:
+    """absolute uri of the document a $ref points into and the json pointer inside it"""
+    location, _, pointer = ref.partition("#")
+    return urllib.parse.urljoin(base_uri, location), normalize_ref(f"#{pointer}")
+
+
+def iter_ref_uris(document: Any, base_uri: str) -> Iterator[str]:
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str):
+                yield split_ref(ref, base_uri)[0]
+            children = node.values()
+        else:
+            children = node
+        stack.extend(c for c in children if isinstance(c, (dict, list)))
+
+
+def parse_ref_document(data: bytes, uri: str) -> Any:
+    if data[:2] == gzip_magic:
+        data = gzip.decompress(data)
+    if urllib.parse.urlsplit(uri).path.endswith((".yaml", ".yml")):
+        if yaml is None:
+            raise click.ClickException(f"pip install pyyaml to $ref the yaml {uri}")
+        return yaml.safe_load(data)
+    return loads_json(data)
+
+
+def fetch_ref_document(
+    uri: str,
+    session: requests.Session,
+    cache_dir: str = ref_cache_dir,
+    timeout: float = request_timeout,
+) -> Any:
+    parts = urllib.parse.urlsplit(uri)
+    if parts.scheme == "file":
+        with open(urllib.request.url2pathname(parts.path), "rb") as f:
+            return parse_ref_document(f.read(), uri)
+
+    cache_file = pathlib.Path(cache_dir, hashlib.sha256(uri.encode()).hexdigest())
+    metadata = read_openapi_cache_metadata(str(cache_file))
+    conditional_headers = {}
+    if metadata.get("url") == uri and metadata.get("etag"):
+        conditional_headers["If-None-Match"] = metadata["etag"]
+    try:
+        resp = session.get(uri, headers=conditional_headers, timeout=timeout)
+    except requests.exceptions.RequestException:
+        if not cache_file.is_file():
+            raise
+        logger.warning("could not reach %s, using cached %s", uri, cache_file)
+        return parse_ref_document(cache_file.read_bytes(), uri)
+    if resp.status_code == 304 and cache_file.is_file():
+        return parse_ref_document(cache_file.read_bytes(), uri)
+    resp.raise_for_status()
+
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    cache_file.write_bytes(resp.content)
+    with open(get_openapi_cache_metadata_loc(str(cache_file)), "w") as f:
+        f.write(json.dumps({"url": uri, "etag": resp.headers.get("ETag")}))
+    return parse_ref_document(resp.content, uri)
+
+
+def fetch_ref_documents(
+    document: dict[Any, Any],
+    base_uri: str,
+    cache_dir: str = ref_cache_dir,
+    workers: int = ref_fetch_workers,
+) -> dict[str, Any]:
+    """every document reachable through the external $refs of document, by uri.
+
+    the documents one $ref hop further away are fetched together, at most workers at once.
+    """
+    documents = {base_uri: document}
+    pending = set(iter_ref_uris(document, base_uri)) - documents.keys()
+    if not pending:
+        return documents
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=workers, pool_maxsize=workers, pool_block=True
+    )
+    with requests.Session() as session, ThreadPoolExecutor(workers) as executor:
+        session.headers.update(get_http_session().headers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        fetch = functools.partial(
+            fetch_ref_document, session=session, cache_dir=cache_dir
+        )
+        while pending:
+            uris = sorted(pending)
+            logger.debug("fetching %d $ref documents", len(uris))
+            documents.update(zip(uris, executor.map(fetch, uris)))
+            pending = {
+                ref_uri
+                for uri in uris
+                for ref_uri in iter_ref_uris(documents[uri], uri)
+            } - documents.keys()
+    return documents
+
+
+def resolve_json_pointer(document: Any, pointer: str) -> Any:
+    node = document
+    for token in decode_json_pointer(pointer):
+        node = node[int(token)] if isinstance(node, list) else node[token]
+    return node
+
+
+def get_ref_component_section(
+    section: str | None, key: Any, child_key: Any
+) -> str | None:
+    """components section a $ref found at node[key][child_key] is hoisted into"""
+    if section == "schemas" or child_key in schema_keywords:
+        return "schemas"
+    if child_key in ("requestBody", "requestBodies") or key == "requestBodies":
+        return "requestBodies"
+    if child_key == "parameters" or key == "parameters":
+        return "parameters"
+    if key in ("responses", "headers"):
+        return key
+    return None
+
+
+def get_hoisted_ref_location(
+    target_uri: str, pointer: str, section: str | None
+) -> tuple[str, str]:
+    """components section and name the target of an external $ref is copied to"""
+    tokens = decode_json_pointer(pointer)
+    if len(tokens) == 3 and tokens[0] == "components":
+        return tokens[1], tokens[2]
+    if tokens:
+        return section or "schemas", tokens[-1]
+    path = urllib.parse.urlsplit(target_uri).path
+    return section or "schemas", pathlib.PurePosixPath(path).stem
+
+
+def bundle_external_refs(
+    apis: dict[Any, Any],
+    base_uri: str,
+    cache_dir: str = ref_cache_dir,
+    workers: int = ref_fetch_workers,
+) -> dict[Any, Any]:
+    """turns a multi-file spec into one document.
+
+    the target of every external $ref (./common/errors.json#/Error or
+    https://.../shared.yaml#/X) is copied into the components of apis and the $ref is
+    pointed at the copy, so the generator only ever sees local #/components/... refs.
+    """
+    documents = fetch_ref_documents(apis, base_uri, cache_dir, workers)
+    if len(documents) == 1:
+        return apis
+    components = apis.setdefault("components", {})
+    # copies are walked with the uri of the document they come from, so they are kept
+    # apart from components until every $ref in them is rewritten
+    hoisted: dict[str, dict[str, Any]] = {}
+    local_refs: dict[tuple[str, str], str] = {}
+    stack: list[tuple[Any, str, Any, str | None]] = [(apis, base_uri, None, None)]
+
+    def hoist(target: tuple[str, str], ref: str, section: str | None) -> str:
+        try:
+            node = resolve_json_pointer(documents[target[0]], target[1])
+        except (KeyError, IndexError, ValueError, TypeError):
+            report_issue("unresolved_ref", "%s does not exist", ref)
+            return ref
+        section, name = get_hoisted_ref_location(*target, section)
+        existing, copies = components.get(section, {}), hoisted.setdefault(section, {})
+        unique_name, suffix = name, 1
+        while unique_name in existing or unique_name in copies:
+            suffix += 1
+            unique_name = f"{name}{suffix}"
+        copies[unique_name] = copy.deepcopy(node)
+        if section == "schemas" and isinstance(node, dict):
+            # elm types are named after the title, refs after the component name
+            copies[unique_name]["title"] = unique_name
+        local_refs[target] = encode_json_pointer(["components", section, unique_name])
+        stack.append((copies[unique_name], target[0], unique_name, section))
+        return local_refs[target]
+
+    while stack:
+        node, uri, key, section = stack.pop()
+        if isinstance(node, list):
+            stack.extend((child, uri, key, section) for child in node)
+            continue
+        ref = node.get("$ref")
+        if isinstance(ref, str) and not (uri == base_uri and ref.startswith("#")):
+            target = split_ref(ref, uri)
+            if target[0] == base_uri:
+                node["$ref"] = target[1]
+            elif target in local_refs:
+                node["$ref"] = local_refs[target]
+            else:
+                node["$ref"] = hoist(target, ref, section)
+        for child_key, child in node.items():
+            if isinstance(child, (dict, list)):
+                child_section = get_ref_component_section(section, key, child_key)
+                stack.append((child, uri, child_key, child_section))
+
+    for section, copies in hoisted.items():
+        components.setdefault(section, {}).update(copies)
+    logger.info(
+        "bundled %d $ref targets of %d documents", len(local_refs), len(documents) - 1
+    )
     return apis
 
 
+def build_schema_dependency_graph(schemas: dict[Any, Any]) -> dict[str, list[str]]:
+    graph: dict[str, list[str]] = {}
+    for schema_name, schema_props in schemas.items():
+        dependencies = []
+        stack = [schema_props]
+        while stack:
+            current = stack.pop()
+            if isinstance(current, dict):
+                ref_name = (
+                    get_schema_name_from_ref(current["$ref"])
+                    if isinstance(current.get("$ref"), str)
+                    else None
+                )
+                if ref_name in schemas and ref_name not in dependencies:
+                    dependencies.append(ref_name)
+                stack.extend(reversed(list(current.values())))
+            elif isinstance(current, list):
+                stack.extend(reversed(current))
+        graph[schema_name] = dependencies
+    return graph
+
+
+def find_schema_cycles(graph: dict[str, list[str]]) -> list[list[str]]:
+    """tarjan's strongly connected components, iterative; dependencies come out first"""
+    index_counter = 0
+    indices: dict[str, int] = {}
+    lowlinks: dict[str, int] = {}
+    on_stack: set[str] = set()
+    scc_stack: list[str] = []
+    components: list[list[str]] = []
+    for root in graph:
+        if root in indices:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, next_child = work.pop()
+            if next_child == 0:
+                indices[node] = lowlinks[node] = index_counter
+                index_counter += 1
+                scc_stack.append(node)
+                on_stack.add(node)
+            children = graph[node]
+            if next_child < len(children):
+                work.append((node, next_child + 1))
+                child = children[next_child]
+                if child not in indices:
+                    work.append((child, 0))
+                elif child in on_stack:
+                    lowlinks[node] = min(lowlinks[node], indices[child])
+                continue
+            if lowlinks[node] == indices[node]:
+                component = []
+                while True:
+                    member = scc_stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component[::-1])
+            if work:
+                parent = work[-1][0]
+                lowlinks[parent] = min(lowlinks[parent], lowlinks[node])
+    return components
+
+
+def topological_schema_order(
+    schemas: dict[Any, Any],
+) -> tuple[list[str], dict[str, frozenset[str]]]:
+    """schema names with dependencies first, plus the cycle each recursive schema is in"""
+    graph = build_schema_dependency_graph(schemas)
+    order: list[str] = []
+    recursive_schemas: dict[str, frozenset[str]] = {}
+    for component in find_schema_cycles(graph):
+        order.extend(component)
+        if len(component) > 1 or component[0] in graph[component[0]]:
+            cycle = frozenset(component)
+            for schema_name in component:
+                recursive_schemas[schema_name] = cycle
+    return order, recursive_schemas
+
+
+def transitive_ref_targets(node: Any, schemas: dict[Any, Any]) -> dict[str, Any]:
+    """json pointer -> node of every $ref node reaches, transitively.
+
+    refs into any component (parameters, requestBodies, responses, ...) are followed, the
+    same way reachable_schemas does. without a $ref index (a bare schemas dict) component
+    schema refs are looked up in schemas.
+    """
+    targets: dict[str, Any] = {}
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            ref = current.get("$ref")
+            if isinstance(ref, str) and normalize_ref(ref) not in targets:
+                target = resolve_ref(ref)
+                if target is None:
+                    schema_name = get_schema_name_from_ref(ref)
+                    target = schemas.get(schema_name) if schema_name else None
+                targets[normalize_ref(ref)] = target
+                stack.append(target)
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+    return targets
+
+
+def fingerprint_fragment_inputs(node: Any, schemas: dict[Any, Any]) -> str:
+    """hash of a schema / operation together with every node it references (transitively)"""
+    options = generator_options.get()
+    fragment_inputs = {
+        "node": node,
+        "refs": transitive_ref_targets(node, schemas),
+        "type_prefix": options.type_prefix,
+        "tab": options.tab,
+        "decoder_style": options.decoder_style,
+        "cache": [options.cache, options.cache_ttl, options.cache_ttls],
+        "tasks": options.tasks,
+        "timeout": [options.timeout_ms, options.tag_timeouts],
+        "retry": options.retry,
+        "pagination": options.pagination,
+    }
+    return hashlib.sha256(
+        json.dumps(fragment_inputs, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+def is_generated_route(route: str) -> bool:
+    return not generator_options.get().skip_non_api_routes or route.startswith("/api")
+
+
+def select_operations(
+    paths: dict[str, Any],
+    include_tags: Iterable[str] = (),
+    exclude_tags: Iterable[str] = (),
+    path_globs: Iterable[str] = (),
+    operation_ids: Iterable[str] = (),
+) -> dict[str, Any]:
+    """paths with only the operations matching every given selector (an empty selector matches all)"""
+    include_tags, exclude_tags = set(include_tags), set(exclude_tags)
+    path_globs, operation_ids = list(path_globs), set(operation_ids)
+    selected_paths = {}
+    for route, methods in paths.items():
+        if path_globs and not any(
+            fnmatch.fnmatchcase(route, path_glob) for path_glob in path_globs
+        ):
+            continue
+        selected_methods = {}
+        for method, method_vals in methods.items():
+            tags = set(method_vals.get("tags", []))
+            if include_tags and not tags & include_tags:
+                continue
+            if tags & exclude_tags:
+                continue
+            if operation_ids and method_vals.get("operationId") not in operation_ids:
+                continue
+            selected_methods[method] = method_vals
+        if selected_methods:
+            selected_paths[route] = selected_methods
+    return selected_paths
+
+
+def reachable_schemas(paths: dict[str, Any]) -> set[str]:
+    """component schemas the generated operations of paths use, following every $ref transitively"""
+    schema_names: set[str] = set()
+    followed_refs: set[str] = set()
+    stack = [
+        method_vals
+        for route, methods in paths.items()
+        if is_generated_route(route)
+        for method_vals in methods.values()
+    ]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            ref = current.get("$ref")
+            if isinstance(ref, str) and ref not in followed_refs:
+                followed_refs.add(ref)
+                schema_name = get_schema_name_from_ref(ref)
+                if schema_name is not None:
+                    schema_names.add(schema_name)
+                stack.append(resolve_ref(ref))
+            stack.extend(current.values())
+        elif isinstance(current, list):
+            stack.extend(current)
+    return schema_names
+
+
+def tree_shake_openapi_document(
+    apis: dict[Any, Any], paths: dict[str, Any] | None = None
+) -> dict[Any, Any]:
+    """copy of apis with only paths (default: all of them) and the schemas they reach"""
+    paths = apis["paths"] if paths is None else paths
+    index_openapi_document(apis)
+    components = apis.get("components", {})
+    schemas = components.get("schemas", {})
+    schema_names = reachable_schemas(paths)
+    logger.info(
+        "kept %d/%d routes and %d/%d schemas",
+        len(paths),
+        len(apis["paths"]),
+        len(schema_names & schemas.keys()),
+        len(schemas),
+    )
+    return dict(
+        apis,
+        paths=paths,
+        components=dict(
+            components,
+            schemas={
+                name: schema for name, schema in schemas.items() if name in schema_names
+            },
+        ),
+    )
+
+
+def empty_manifest() -> dict[str, Any]:
+    return {
+        "version": manifest_version,
+        "schemas": {},
+        "operations": {},
+    }
+
+
+def load_manifest(manifest_file: str = manifest_file_loc) -> dict[str, Any]:
+    if not pathlib.Path(manifest_file).is_file():
+        return empty_manifest()
+    try:
+        with open(manifest_file, "r") as f:
+            manifest = json.loads(f.read())
+    except json.JSONDecodeError:
+        logger.warning("ignoring unreadable manifest %s", manifest_file)
+        return empty_manifest()
+    if manifest.get("version") != manifest_version:
+        return empty_manifest()
+    return manifest
+
+
+def save_manifest(
+    manifest: dict[str, Any], manifest_file: str = manifest_file_loc
+) -> None:
+    with ChangeAwareFile(manifest_file) as f:
+        f.write(json.dumps(manifest))
+
+
 def get_type_alias_from_schema_ref(schema_ref: str) -> str:
-    elm_type_alias = f'{type_prefix}{schema_ref.split("/")[-1]}'
+    type_prefix = generator_options.get().type_prefix
+    elm_type_alias = f"{type_prefix}{get_schema_name_or_last_token(schema_ref)}"
     return elm_type_alias
 
 
+@dataclass(frozen=True, slots=True)
+class ElmParam:
+    name: str
+    elm_type: str
+    # name of the (single valued) query parameter the argument is sent as
+    query_name: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class ElmPagination:
+    """how the <fn>_pages source of a list operation asks for a page and finds the next"""
+
+    # "offset", "page" or "cursor", see pagination_params
+    style: str
+    # argument of the api function selecting the page, and whether it is a Maybe
+    page_param: str
+    page_param_is_maybe: bool
+    # elm Int expression of the page size, 0 when unknown
+    page_size: str
+    item_type: str
+    # record field of the response with the items, None when the response is the list
+    items_field: str | None
+    # cursor style: record field of the response with the next cursor
+    cursor_field: str | None = None
+    cursor_is_maybe: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class ElmOperation:
+    """one api function; turned into elm by format_api_fn"""
+
+    fn_name: str
+    http_method: str
+    # elm expression of the url
+    route: str
+    params: tuple[ElmParam, ...]
+    # elm expression of the json body, None when the operation has none
+    request_body: str | None
+    # elm expression handed to HttpBuilder.withExpect
+    expect: str
+    # elm expression of the List ( String, String ) of headers, None when there are none
+    headers: str | None = None
+    timeout_ms: int = 90000
+    output_type: str = "Cmd msg"
+    # decoder of a successful response, used by the cached variant
+    response_decoder: str = "decoder"
+    # None unless a <fn_name>_cached variant going through the Cache module is generated
+    cache_ttl_ms: int | None = None
+    # elm type of a successful response, used by the task variant
+    response_type: str = "a"
+    # None unless a <fn_name>_pages source going through the Paging module is generated
+    pagination: ElmPagination | None = None
+
+
+path_param_re = re.compile(r"\{([^{}]+)\}")
+param_elm_types = {"integer": "Int", "number": "Float", "boolean": "Bool"}
+# elm functions turning a non String parameter into the text sent in the url / header
+param_to_string_fns = {
+    "Int": "String.fromInt",
+    "Float": "String.fromFloat",
+    "Bool": '(\\b -> if b then "true" else "false")',
+}
+
+
+@dataclass(frozen=True, slots=True)
+class PathPart:
+    """literal text or {parameter} of a path template"""
+
+    text: str
+    is_param: bool = False
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_path_template(route: str) -> tuple[tuple[PathPart, ...], ...]:
+    """splits a route once into path segments, each a run of literal / parameter parts"""
+    segments = []
+    for segment in (route[1:] if route.startswith("/") else route).split("/"):
+        if "{" not in segment:
+            segments.append((PathPart(segment),))
+            continue
+        parts, end = [], 0
+        for match in path_param_re.finditer(segment):
+            if match.start() > end:
+                parts.append(PathPart(segment[end : match.start()]))
+            parts.append(PathPart(match.group(1), is_param=True))
+            end = match.end()
+        if end < len(segment) or not parts:
+            parts.append(PathPart(segment[end:]))
+        segments.append(tuple(parts))
+    return tuple(segments)
+
+
+@functools.lru_cache(maxsize=4096)
+def format_static_elm_path(route: str) -> str | None:
+    """elm list of the path segments of a route without parameters, None if it has some"""
+    if path_param_re.search(route):
+        return None
+    segments = (route[1:] if route.startswith("/") else route).split("/")
+    return format_elm_list([format_elm_string(segment) for segment in segments])
+
+
+def get_param_elm_type(schema: dict[Any, Any]) -> tuple[str, bool]:
+    """elm type of a parameter and whether it is a list (?tag=a&tag=b)"""
+    schema = deref(schema)
+    variants = [deref(s) for s in schema.get("anyOf", schema.get("oneOf", []))]
+    variants = [s for s in variants if s.get("type") != "null"]
+    if len(variants) == 1:
+        schema = variants[0]
+    json_type = schema.get("type")
+    if isinstance(json_type, list):
+        json_type = next((t for t in json_type if t != "null"), None)
+    if json_type == "array":
+        return get_param_elm_type(schema.get("items", {}))[0], True
+    return param_elm_types.get(json_type, "String"), False
+
+
+@functools.lru_cache(maxsize=4096)
+def get_elm_identifier(name: str) -> str:
+    elm_name = re.sub(r"\W", "_", name)
+    if not elm_name[:1].isalpha():
+        elm_name = f"p_{elm_name}"
+    return generate_elm_prop_name(elm_name[0].lower() + elm_name[1:])
+
+
+def generate_elm_param_name(name: str, used_names: set[str]) -> str:
+    elm_name = get_elm_identifier(name)
+    while elm_name in used_names:
+        elm_name += "_"
+    used_names.add(elm_name)
+    return elm_name
+
+
+def param_to_string(elm_type: str, value: str) -> str:
+    if elm_type == "String":
+        return value
+    return f"{param_to_string_fns[elm_type]} {value}"
+
+
+def format_query_builder(name: str, elm_type: str) -> str:
+    """elm function turning a value of elm_type into the query parameter name"""
+    if elm_type == "Int":
+        return f'Url.Builder.int "{name}"'
+    if elm_type == "String":
+        return f'Url.Builder.string "{name}"'
+    return f'(Url.Builder.string "{name}" << {param_to_string_fns[elm_type]})'
+
+
+def format_elm_string(text: str) -> str:
+    return '"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def parenthesize(elm_expression: str) -> str:
+    if elm_expression.startswith("(") and elm_expression.endswith(")"):
+        return elm_expression
+    return f"({elm_expression})"
+
+
+def format_elm_list(items: list[str]) -> str:
+    return f'[ {", ".join(items)} ]' if items else "[]"
+
+
+def format_optional_list(items: list[tuple[str, bool]]) -> str:
+    """elm list of the (expression, is_required) items, leaving out the Nothing ones"""
+    if all(is_required for _, is_required in items):
+        return format_elm_list([item for item, _ in items])
+    return "List.filterMap identity " + format_elm_list(
+        [f"Just ({item})" if is_required else item for item, is_required in items]
+    )
+
+
 def add_url_parameters_to_fn(
-    method_vals,
-    args,
-    args_names,
-    elm_route,
-    route,
-):
-    if "parameters" not in method_vals:
-        return elm_route, args, args_names
-
-    parameters = method_vals.get("parameters")
-    route_path = route.split("/")
-    print(f"\tparameters (total={len(parameters)}):", parameters)
-    for rp in route_path:
-        if "{" in rp and "}" in rp:
-            for url_param in parameters:
-                print(f"{url_param=}")
-                if url_param["in"] == "path":
-                    if rp.replace("{", "").replace("}", "") == url_param["name"]:
-                        elm_route = elm_route.replace(
-                            rp, f"\"++ {url_param['name']} ++\""
-                        )
-                        args.append("String")
-                        args_names.append(url_param["name"])
-    elm_route = elm_route.replace('++""', "").strip()
-    return elm_route, args, args_names
-
-
-def add_encoder_to_fn(method_vals, elm_fn_definition_dict):
-    args = elm_fn_definition_dict["args"]
-    args_names = elm_fn_definition_dict["args_names"]
-    elm_request_encoder = ""
-
-    request_body = method_vals.get("requestBody", {})
-    # print("requestBody=", request_body)
+    method_vals: dict[Any, Any], params: list[ElmParam], route: str
+) -> tuple[str, str | None]:
+    """Url.Builder expression of the url and the list of headers to send, if any.
+
+    path, query and header parameters become arguments of the elm function, typed after
+    their schema. optional query / header parameters are Maybes left out when Nothing.
+    """
+    used_names = {p.name for p in params} | {"msg", "decoder"}
+    parameters: dict[tuple[str, str], dict[Any, Any]] = {}
+    for param in map(deref, method_vals.get("parameters", [])):
+        if param.get("in") in ("path", "query", "header"):
+            parameters[param["in"], param["name"]] = param
+        else:
+            report_issue(
+                "unsupported_parameter",
+                "%s parameters are not supported, skipping %s",
+                param.get("in"),
+                param.get("name"),
+            )
+    logger.log(TRACE, "\tparameters (total=%d): %s", len(parameters), parameters)
+    static_path = None if parameters else format_static_elm_path(route)
+    if static_path is not None:
+        return f"Url.Builder.absolute {static_path} []", None
+
+    path_values: dict[str, str] = {}
+    path_segments = []
+    for segment in compile_path_template(route):
+        parts = []
+        for part in segment:
+            if not part.is_param:
+                parts.append(format_elm_string(part.text))
+                continue
+            if part.text not in path_values:
+                param = parameters.get(("path", part.text))
+                if param is None:
+                    report_issue(
+                        "undeclared_path_parameter",
+                        "{%s} is not declared, passing it as a String",
+                        part.text,
+                    )
+                elm_type, _ = get_param_elm_type((param or {}).get("schema", {}))
+                elm_name = generate_elm_param_name(part.text, used_names)
+                params.append(ElmParam(elm_name, elm_type))
+                path_values[part.text] = (
+                    f"Url.percentEncode {elm_name}"
+                    if elm_type == "String"
+                    else param_to_string(elm_type, elm_name)
+                )
+            parts.append(path_values[part.text])
+        path_segments.append(" ++ ".join(parts))
+
+    query: list[tuple[str, bool]] = []
+    list_queries: list[str] = []
+    headers: list[tuple[str, bool]] = []
+    for (location, name), param in parameters.items():
+        if location == "path":
+            continue
+        elm_type, is_list = get_param_elm_type(param.get("schema", {}))
+        is_required = param.get("required", False)
+        elm_name = generate_elm_param_name(name, used_names)
+        if location == "query" and is_list:
+            params.append(ElmParam(elm_name, f"(List {elm_type})"))
+            builder = parenthesize(format_query_builder(name, elm_type))
+            list_queries.append(f"List.map {builder} {elm_name}")
+            continue
+        params.append(
+            ElmParam(
+                elm_name,
+                elm_type if is_required else f"(Maybe {elm_type})",
+                name if location == "query" else None,
+            )
+        )
+        if location == "query":
+            builder = format_query_builder(name, elm_type)
+        elif elm_type == "String":
+            builder = f'Tuple.pair "{name}"'
+        else:
+            builder = f'(Tuple.pair "{name}" << {param_to_string_fns[elm_type]})'
+        if is_required:
+            item = f"{builder} {elm_name}"
+        else:
+            item = f"Maybe.map {parenthesize(builder)} {elm_name}"
+        (query if location == "query" else headers).append((item, is_required))
+
+    elm_query = " ++ ".join(
+        ([format_optional_list(query)] if query or not list_queries else [])
+        + list_queries
+    )
+    if not (elm_query.startswith("[") and elm_query.endswith("]")):
+        elm_query = f"({elm_query})"
+    elm_route = f"Url.Builder.absolute {format_elm_list(path_segments)} {elm_query}"
+    return elm_route, format_optional_list(headers) if headers else None
+
+
+def add_encoder_to_fn(method_vals, params: list[ElmParam]):
+    request_body = deref(method_vals.get("requestBody", {}))
     schema_name = (
         request_body.get("content", {}).get("application/json", {}).get("schema")
     )
 
     if schema_name:
-        elm_function_arg_type = recursive_type_gen(schema_name, "")
-        elm_encoder_fn_name = elm_encoder_recursive_type_gen(schema_name, "")
-        print(colored(f"{elm_function_arg_type=}\n{elm_encoder_fn_name}", "blue"))
-        args = [elm_function_arg_type] + args
-        args_names = ["req_body"] + args_names
-        elm_request_encoder = (
-            f"{tab}{tab}|> HttpBuilder.withJsonBody ({elm_encoder_fn_name} req_body)"
+        type_node = compile_type_node(schema_name)
+        logger.debug(
+            "request body %s encoded by %s", type_node.elm_type, type_node.encoder
         )
+        params.insert(0, ElmParam("req_body", type_node.elm_type))
+        return f"({type_node.encoder} req_body)"
     elif len(request_body.keys()) > 0:
-        print(colored(f"\tUsing generic encoder argument\n\t{request_body=}", "blue"))
-        args = ["E.Value"] + args
-        args_names = ["request_body_encoder"] + args_names
-        elm_request_encoder = (
-            f"{tab}{tab}|> HttpBuilder.withJsonBody request_body_encoder"
+        report_issue(
+            "generic_request_body",
+            "request body has no application/json schema, using a generic E.Value argument",
         )
-    return args, args_names, elm_request_encoder
+        params.insert(0, ElmParam("request_body_encoder", "E.Value"))
+        return "request_body_encoder"
+    return None
 
 
 def add_response_type(
-    method_vals: dict[Any, Any], elm_fn_definition_dict: dict[Any, Any]
-):
+    method_vals: dict[Any, Any], params: list[ElmParam]
+) -> tuple[str, str, str]:
+    """the expect expression of the operation, the decoder and the elm type of its response"""
     responses = method_vals.get("responses")
 
-    args = elm_fn_definition_dict["args"]
-    add_to_args = ["(FastApiWebData a -> msg)", "D.Decoder a"]
-    add_to_args_names = ["msg", "decoder"]
-
-    args_names = elm_fn_definition_dict["args_names"]
-    with_expect_const = f"{tab}{tab}|> HttpBuilder.withExpect\n{tab}{tab}{tab}"
-    elm_response_decoder = f"{with_expect_const}(expect_fast_api_response (RemoteData.fromResult >> msg) decoder)"
+    response_params = [
+        ElmParam("msg", "(FastApiWebData a -> msg)"),
+        ElmParam("decoder", "D.Decoder a"),
+    ]
+    elm_expect = "(expect_fast_api_response (RemoteData.fromResult >> msg) decoder)"
+    response_decoder = "decoder"
+    response_type = "a"
     # TODO: add response types for other numbers
     if responses:
-        print(f"responses ({len(responses.keys())})=")
+        logger.log(TRACE, "responses (%d)=", len(responses))
         for resp_key, resp_val in method_vals["responses"].items():
+            resp_val = deref(resp_val)
             is_success_resp_key = resp_key == "200" or resp_key == "201"
-            print(colored(f"\t{resp_key}={resp_val}", "yellow"))
+            logger.log(TRACE, "\t%s=%s", resp_key, resp_val)
             response_schema = (
                 resp_val.get("content", {})
                 .get("application/json", {})
@@ -118,147 +1183,554 @@ def add_response_type(
             )
             schemas_count = len(response_schema.keys())
             if schemas_count == 0:
-                print(
-                    colored(
-                        "\tWARN: schema response not defined",
-                        "red",
-                    )
+                report_issue(
+                    "response_schema_missing",
+                    "schema response not defined",
+                    response=resp_key,
                 )
             elif is_success_resp_key:
                 # TODO: test for recursive types as well
-                elm_decoder_fn = elm_decoder_recursive_type_gen(
-                    response_schema, ""
-                )  # convert_to_elm_decoder_type(response_schema)
-                elm_type_name = recursive_type_gen(response_schema, "")
-                # if '$ref' in response_schema:
-                #    elm_decoder_fn = generate_elm_decoder_fn_name(elm_type_name)
-
-                add_to_args = [f"(FastApiWebData {elm_type_name} -> msg)"]
-                add_to_args_names = ["msg"]
-                print(colored(f'{"-"*10}\n{elm_type_name}\n{"-"*10}\n', "red"))
-                print(
-                    colored(
-                        f"\t using schema to add decoder function={elm_decoder_fn}",
-                        "blue",
-                    )
+                type_node = compile_type_node(response_schema)
+                elm_type = format_elm_argument(type_node.elm_type)
+                response_params = [ElmParam("msg", f"(FastApiWebData {elm_type} -> msg)")]
+                logger.debug(
+                    "response %s decoded by %s", type_node.elm_type, type_node.decoder
                 )
-                elm_response_decoder = f"{with_expect_const}( expect_fast_api_response (RemoteData.fromResult >> msg) {elm_decoder_fn} )"
+                elm_expect = f"( expect_fast_api_response (RemoteData.fromResult >> msg) {format_elm_argument(type_node.decoder)} )"
+                response_decoder = type_node.decoder
+                response_type = type_node.elm_type
 
-    args += add_to_args
-    args_names += add_to_args_names
-    return args, args_names, elm_response_decoder
+    params.extend(response_params)
+    return elm_expect, response_decoder, response_type
 
 
 def generate_elm_api_function(
     route: str, method: str, method_vals: dict[Any, Any]
-) -> dict[Any, Any]:
+) -> ElmOperation:
     operation_id = method_vals["operationId"]
-    print(colored(f"{operation_id=} ", "yellow"))
-    print("keys=", method_vals.keys())
-    elm_fn_definition_dict = {
-        "fn_name": operation_id,
-        "args": [],
-        "args_names": [],
-        "output_arg": "Cmd msg",
-        "fn_body": {
-            "route": '"' + route + '"',
-            "http_method": method,
-            "http_builder_fns": [
-                f"{tab}{tab}|> HttpBuilder.{method}",
-                f"{tab}{tab}|> HttpBuilder.withTimeout 90000",
-            ],
-        },
-    }
-
-    args, args_names, elm_request_encoder = add_encoder_to_fn(
-        method_vals, elm_fn_definition_dict
+    logger.debug("operation_id=%s", operation_id)
+    logger.log(TRACE, "keys=%s", method_vals.keys())
+    params: list[ElmParam] = []
+    request_body = add_encoder_to_fn(method_vals, params)
+    elm_route, elm_headers = add_url_parameters_to_fn(method_vals, params, route)
+    elm_expect, response_decoder, response_type = add_response_type(method_vals, params)
+    return ElmOperation(
+        fn_name=operation_id,
+        http_method=method,
+        route=elm_route,
+        params=tuple(params),
+        request_body=request_body,
+        expect=elm_expect,
+        headers=elm_headers,
+        response_decoder=response_decoder,
+        cache_ttl_ms=get_cache_ttl_ms(method, method_vals, request_body),
+        response_type=response_type,
+        timeout_ms=get_timeout_ms(method_vals),
+        pagination=(
+            get_elm_pagination(method_vals, params)
+            if generator_options.get().pagination
+            else None
+        ),
     )
-    if len(elm_request_encoder) > 0:
-        elm_fn_definition_dict["fn_body"]["http_builder_fns"].insert(
-            1, elm_request_encoder
+
+
+def get_success_response_schema(method_vals: dict[Any, Any]) -> dict[Any, Any] | None:
+    schema = None
+    for resp_key, resp_val in (method_vals.get("responses") or {}).items():
+        if resp_key in ("200", "201"):
+            schema = (
+                deref(resp_val)
+                .get("content", {})
+                .get("application/json", {})
+                .get("schema")
+            ) or schema
+    return schema
+
+
+def get_elm_pagination(
+    method_vals: dict[Any, Any], params: list[ElmParam]
+) -> ElmPagination | None:
+    """pagination of a list operation, None when it has none.
+
+    the x-pagination extension ({"style", "page_param", "size_param", "items",
+    "next_cursor"}, every key optional) names what detection would guess from the query
+    parameters (offset / page / cursor and limit) and the response (a list, or a record
+    with an items list and for cursors a next cursor). x-pagination: false turns it off.
+    """
+    extension = method_vals.get("x-pagination")
+    if extension is False:
+        return None
+    if not isinstance(extension, dict):
+        extension = {}
+    query_params = {p.query_name: p for p in params if p.query_name is not None}
+    style, page_param = extension.get("style"), extension.get("page_param")
+    if style is None and page_param is not None:
+        style = next(
+            (style for style, names in pagination_params.items() if page_param in names),
+            None,
+        )
+    for candidate_style, names in pagination_params.items():
+        if page_param is not None or style not in (None, candidate_style):
+            continue
+        page_param = next((name for name in names if name in query_params), None)
+        if page_param is not None:
+            style = candidate_style
+    if page_param is None and not extension:
+        return None
+
+    def invalid(message: str, *args: Any) -> None:
+        # a guess that did not work out is no pagination rather than a mistake
+        if "x-pagination" in method_vals:
+            report_issue("invalid_pagination", message, *args)
+
+    page_elm_type = "String" if style == "cursor" else "Int"
+    page = query_params.get(page_param)
+    if style not in pagination_params:
+        return invalid("unknown pagination style %r", style)
+    if page is None:
+        return invalid("no %s page query parameter %r", style, page_param)
+    if page.elm_type not in (page_elm_type, f"(Maybe {page_elm_type})"):
+        return invalid(
+            "%s is a %s, expected %s", page_param, page.elm_type, page_elm_type
         )
-    elm_fn_definition_dict["args"] = args
-    elm_fn_definition_dict["args_names"] = args_names
-    elm_route = elm_fn_definition_dict["fn_body"]["route"]
 
-    elm_route, args, args_names = add_url_parameters_to_fn(
-        method_vals,
-        elm_fn_definition_dict["args"],
-        elm_fn_definition_dict["args_names"],
-        elm_route,
-        route,
+    page_size = "0"
+    size_param = extension.get("size_param") or next(
+        (name for name in page_size_params if name in query_params), None
     )
-    elm_fn_definition_dict["fn_body"]["route"] = elm_route
-    elm_fn_definition_dict["args"] = args
-    elm_fn_definition_dict["args_names"] = args_names
-
-    args, args_names, elm_response_decoder = add_response_type(
-        method_vals, elm_fn_definition_dict
+    size = query_params.get(size_param)
+    if size is not None and size.elm_type == "Int":
+        page_size = size.name
+    elif size is not None and size.elm_type == "(Maybe Int)":
+        page_size = f"(Maybe.withDefault 0 {size.name})"
+
+    response_schema = get_success_response_schema(method_vals) or {}
+    schema = deref(response_schema)
+    items_field = cursor_field = None
+    cursor_is_maybe = False
+    if schema.get("type") == "array":
+        items_schema = schema.get("items", {})
+    elif "$ref" in response_schema and "properties" in schema:
+        properties = schema["properties"]
+        list_properties = [
+            name
+            for name, prop in properties.items()
+            if deref(prop).get("type") == "array"
+        ]
+        items_field = extension.get("items") or next(
+            (name for name in page_items_properties if name in list_properties),
+            list_properties[0] if len(list_properties) == 1 else None,
+        )
+        if items_field not in list_properties:
+            return invalid("no list of items %r in the response", items_field)
+        items_schema = deref(properties[items_field]).get("items", {})
+        if style == "cursor":
+            cursor_field = extension.get("next_cursor") or next(
+                (name for name in next_cursor_properties if name in properties), None
+            )
+            if cursor_field not in properties:
+                return invalid("no next cursor %r in the response", cursor_field)
+        # the names and types the response record was generated with; its issues are
+        # reported where the record itself is generated, so they go to a throwaway list
+        context = copy_context()
+        context.run(current_diagnostics.set, [])
+        record = context.run(
+            generate_elm_type_and_encoder_decoder_fn,
+            {"title": get_schema_name_from_ref(response_schema["$ref"]), **schema},
+        )
+        record_fields = {field.json_name: field for field in record.record.fields}
+        if cursor_field is not None:
+            cursor_type = re.sub(r"[\s()]+", " ", record_fields[cursor_field].elm_type)
+            if cursor_type.strip() not in ("String", "Maybe String"):
+                # a cursor of another type always is a mistake, guessed or not
+                report_issue(
+                    "invalid_pagination",
+                    "next cursor %r is a %s, expected String or Maybe String",
+                    cursor_field,
+                    record_fields[cursor_field].elm_type,
+                )
+                return None
+            cursor_is_maybe = cursor_type.strip().startswith("Maybe")
+            cursor_field = record_fields[cursor_field].elm_name
+        items_field = record_fields[items_field].elm_name
+    else:
+        return invalid("the response is neither a list nor a record with one")
+    if style == "cursor" and items_field is None:
+        return invalid("a list response has no next cursor")
+    if "anyOf" in items_schema:
+        return invalid("items of several types are not supported")
+
+    return ElmPagination(
+        style=style,
+        page_param=page.name,
+        page_param_is_maybe=page.elm_type.startswith("(Maybe"),
+        page_size=page_size,
+        item_type=compile_type_node(items_schema).elm_type,
+        items_field=items_field,
+        cursor_field=cursor_field,
+        cursor_is_maybe=cursor_is_maybe,
     )
 
-    elm_fn_definition_dict["args"] = args
-    elm_fn_definition_dict["args_names"] = args_names
-    elm_fn_definition_dict["fn_body"]["http_builder_fns"].append(elm_response_decoder)
-    elm_fn_definition_dict["fn_body"]["http_builder_fns"].append(
-        f"{tab}{tab}|> HttpBuilder.request"
-    )
 
-    return elm_fn_definition_dict
+def get_timeout_ms(method_vals: dict[Any, Any]) -> int:
+    """the x-timeout-ms extension of the operation beats --timeout-for-tag, which beats --timeout-ms"""
+    options = generator_options.get()
+    timeout = method_vals.get("x-timeout-ms")
+    if timeout is None:
+        tag_timeouts = dict(options.tag_timeouts)
+        timeout = next(
+            (
+                tag_timeouts[tag]
+                for tag in method_vals.get("tags") or ()
+                if tag in tag_timeouts
+            ),
+            options.timeout_ms,
+        )
+    try:
+        return max(1, round(float(timeout)))
+    except (TypeError, ValueError):
+        report_issue(
+            "invalid_timeout", "x-timeout-ms %r is not a number of milliseconds", timeout
+        )
+        return options.timeout_ms
 
 
-def format_api_fn(
-    elm_fn_definition,
-    method,
-):
-    elm_fn_declaration = f'{elm_fn_definition["fn_name"]} : {" -> ".join(elm_fn_definition["args"])} -> {elm_fn_definition["output_arg"]}'
-    elm_fn_arguments = (
-        f'{elm_fn_definition["fn_name"]} {" ".join(elm_fn_definition["args_names"])} ='
+def get_cache_ttl_ms(
+    method: str, method_vals: dict[Any, Any], request_body: str | None
+) -> int | None:
+    """ttl of the cached variant of a GET operation, None when it gets none.
+
+    --cache-ttl-for beats the x-cache-ttl extension of the operation, which beats --cache-ttl
+    """
+    options = generator_options.get()
+    if not options.cache or method != "get" or request_body is not None:
+        return None
+    ttl = dict(options.cache_ttls).get(
+        method_vals["operationId"], method_vals.get("x-cache-ttl", options.cache_ttl)
     )
-    elm_route = elm_fn_definition["fn_body"]["route"]
-    method = elm_fn_definition["fn_body"]["http_method"]
+    try:
+        return max(0, round(float(ttl) * 1000))
+    except (TypeError, ValueError):
+        report_issue("invalid_cache_ttl", "x-cache-ttl %r is not a number of seconds", ttl)
+        return round(options.cache_ttl * 1000)
 
-    elm_fn_body_http_fns = "\n".join(elm_fn_definition["fn_body"]["http_builder_fns"])
+
+def format_api_fn(operation: ElmOperation) -> str:
+    tab = generator_options.get().tab
+    elm_fn_declaration = f'{operation.fn_name} : {" -> ".join([p.elm_type for p in operation.params])} -> {operation.output_type}'
+    elm_fn_arguments = (
+        f'{operation.fn_name} {" ".join([p.name for p in operation.params])} ='
+    )
+    pipe = f"\n{tab}{tab}|> "
+    elm_request_body = (
+        ""
+        if operation.request_body is None
+        else f"{pipe}HttpBuilder.withJsonBody {operation.request_body}"
+    )
+    elm_headers = (
+        ""
+        if operation.headers is None
+        else f"{pipe}HttpBuilder.withHeaders {operation.headers}"
+    )
     formatted_fn_output = f"""
 {elm_fn_declaration}
 {elm_fn_arguments}
-{tab}{elm_route}
-{elm_fn_body_http_fns}
+{tab}{operation.route}{pipe}HttpBuilder.{operation.http_method}{elm_headers}{elm_request_body}{pipe}HttpBuilder.withTimeout {operation.timeout_ms}{pipe}HttpBuilder.withExpect
+{tab}{tab}{tab}{operation.expect}{pipe}HttpBuilder.request
 """.strip()
+    if operation.cache_ttl_ms is not None:
+        formatted_fn_output = (
+            f"{formatted_fn_output}\n\n{format_cached_api_fn(operation)}"
+        )
+    options = generator_options.get()
+    if options.tasks or options.retry or operation.pagination is not None:
+        formatted_fn_output = f"{formatted_fn_output}\n\n{format_task_api_fn(operation)}"
+    if options.retry and operation.http_method in idempotent_methods:
+        formatted_fn_output = (
+            f"{formatted_fn_output}\n\n{format_retry_api_fn(operation)}"
+        )
+    if operation.pagination is not None:
+        formatted_fn_output = (
+            f"{formatted_fn_output}\n\n{format_pages_api_fn(operation)}"
+        )
     return formatted_fn_output
 
 
-def generate_all_elm_api_functions(apis: dict[Any, Any]):
-    print(colored("Assuming everyting is content-type: application/json", "red"))
-    print(
-        colored(
-            "Assuming elm http builder methods and openapi http methods are one-to-one",
-            "red",
+def format_cached_api_fn(operation: ElmOperation) -> str:
+    """<fn_name>_cached: answers from the Cache module, sharing identical GETs in flight"""
+    tab = generator_options.get().tab
+    used_names = {p.name for p in operation.params}
+    to_cache_msg, now, cache = (
+        generate_elm_param_name(name, used_names)
+        for name in ("to_cache_msg", "now", "cache")
+    )
+    fn_name = f"{operation.fn_name}_cached"
+    param_types = " -> ".join(p.elm_type for p in operation.params)
+    param_names = " ".join(p.name for p in operation.params)
+    decoder = format_elm_argument(operation.response_decoder)
+    return f"""
+{fn_name} : (Cache.Msg -> msg) -> Time.Posix -> {param_types} -> Cache.Cache msg -> ( Cache.Cache msg, Cmd msg )
+{fn_name} {to_cache_msg} {now} {param_names} {cache} =
+{tab}Cache.get {to_cache_msg}
+{tab}{tab}{{ url = {operation.route}
+{tab}{tab}, headers = {operation.headers or "[]"}
+{tab}{tab}, timeout = Just {operation.timeout_ms}
+{tab}{tab}, ttl_ms = Just {operation.cache_ttl_ms}
+{tab}{tab}}}
+{tab}{tab}(fast_api_response_to_result {decoder} >> RemoteData.fromResult >> msg)
+{tab}{tab}{now}
+{tab}{tab}{cache}
+""".strip()
+
+
+def format_task_api_fn(operation: ElmOperation) -> str:
+    """<fn_name>_task: the same request as a Task, to be chained or joined with others"""
+    tab = generator_options.get().tab
+    params = [p for p in operation.params if p.name != "msg"]
+    fn_name = f"{operation.fn_name}_task"
+    output_type = (
+        f"Task.Task FastApiHttpError {format_elm_argument(operation.response_type)}"
+    )
+    elm_fn_declaration = " -> ".join([*(p.elm_type for p in params), output_type])
+    elm_fn_arguments = " ".join([fn_name, *(p.name for p in params)])
+    headers = (
+        "[]"
+        if operation.headers is None
+        else f"http_headers {parenthesize(operation.headers)}"
+    )
+    body = (
+        "Http.emptyBody"
+        if operation.request_body is None
+        else f"Http.jsonBody {format_elm_argument(operation.request_body)}"
+    )
+    decoder = format_elm_argument(operation.response_decoder)
+    return f"""
+{fn_name} : {elm_fn_declaration}
+{elm_fn_arguments} =
+{tab}Http.task
+{tab}{tab}{{ method = "{operation.http_method.upper()}"
+{tab}{tab}, headers = {headers}
+{tab}{tab}, url = {operation.route}
+{tab}{tab}, body = {body}
+{tab}{tab}, resolver = Http.stringResolver (fast_api_response_to_result {decoder})
+{tab}{tab}, timeout = Just {operation.timeout_ms}
+{tab}{tab}}}
+""".strip()
+
+
+def format_retry_api_fn(operation: ElmOperation) -> str:
+    """<fn_name>_retry: the task variant, sent again on timeouts, network errors and retry_statuses"""
+    tab = generator_options.get().tab
+    policy = generate_elm_param_name("policy", {p.name for p in operation.params})
+    fn_name = f"{operation.fn_name}_retry"
+    msg_type = f"(FastApiWebData {format_elm_argument(operation.response_type)} -> msg)"
+    param_types = " -> ".join(
+        msg_type if p.name == "msg" else p.elm_type for p in operation.params
+    )
+    param_names = " ".join(p.name for p in operation.params)
+    task_args = [p.name for p in operation.params if p.name != "msg"]
+    task_call = " ".join([f"{operation.fn_name}_task", *task_args])
+    return f"""
+{fn_name} : Retry.Policy -> {param_types} -> {operation.output_type}
+{fn_name} {policy} {param_names} =
+{tab}{task_call}
+{tab}{tab}|> Retry.retry (is_retryable_error {policy}.retry_statuses) {policy} ({operation.route})
+{tab}{tab}|> Task.attempt (RemoteData.fromResult >> msg)
+""".strip()
+
+
+def format_pages_api_fn(operation: ElmOperation) -> str:
+    """<fn_name>_pages: the Paging.Source walking the pages of the task variant"""
+    tab = generator_options.get().tab
+    pagination = operation.pagination
+    params = [
+        p for p in operation.params if p.name not in ("msg", pagination.page_param)
+    ]
+    used_names = {p.name for p in params}
+    page, response = (
+        generate_elm_param_name(name, used_names) for name in ("page", "response")
+    )
+    fn_name = f"{operation.fn_name}_pages"
+    output_type = (
+        f"Paging.Source FastApiHttpError {format_elm_argument(pagination.item_type)}"
+    )
+    elm_fn_declaration = " -> ".join([*(p.elm_type for p in params), output_type])
+    elm_fn_arguments = " ".join([fn_name, *(p.name for p in params)])
+
+    if pagination.style == "cursor":
+        first = "Paging.Cursor Nothing"
+        page_arg = f"Paging.cursor_of {page}"
+        if not pagination.page_param_is_maybe:
+            page_arg = f'Maybe.withDefault "" ({page_arg})'
+    else:
+        first = (
+            f"Paging.Offset 0 {pagination.page_size}"
+            if pagination.style == "offset"
+            else f"Paging.Number 1 {pagination.page_size}"
+        )
+        page_arg = (
+            f"Paging.offset_of {page}"
+            if pagination.style == "offset"
+            else f"Paging.number_of {page}"
         )
+        if pagination.page_param_is_maybe:
+            page_arg = f"Just ({page_arg})"
+    task_args = [
+        parenthesize(page_arg) if p.name == pagination.page_param else p.name
+        for p in operation.params
+        if p.name != "msg"
+    ]
+    items = (
+        response
+        if pagination.items_field is None
+        else f"{response}.{pagination.items_field}"
     )
-    print(colored("Assume url param name is a valid elm variable", "red"))
-    elm_functions = {}
+    if pagination.cursor_field is None:
+        loaded = f"Paging.loaded {page} {items}"
+    else:
+        next_cursor = f"{response}.{pagination.cursor_field}"
+        if not pagination.cursor_is_maybe:
+            next_cursor = f"(Just {next_cursor})"
+        loaded = f"Paging.cursor_loaded {page} {next_cursor} {items}"
+    return f"""
+{fn_name} : {elm_fn_declaration}
+{elm_fn_arguments} =
+{tab}{{ first = {first}
+{tab}, fetch =
+{tab}{tab}\\{page} ->
+{tab}{tab}{tab}{" ".join([f"{operation.fn_name}_task", *task_args])}
+{tab}{tab}{tab}{tab}|> Task.map (\\{response} -> {loaded})
+{tab}}}
+""".strip()
+
+
+def format_elm_argument(expression: str) -> str:
+    """expression parenthesized unless it is a single word or already in parentheses"""
+    expression = expression.strip()
+    if " " in expression:
+        return parenthesize(expression)
+    return expression
+
+
+def compile_elm_api_function(
+    route: str, method: str, method_vals: dict[Any, Any]
+) -> tuple[str, str]:
+    with diagnostic_scope(
+        route=route, method=method, operation_id=method_vals.get("operationId")
+    ):
+        operation = generate_elm_api_function(route, method, method_vals)
+        formatted_fn_output = format_api_fn(operation)
+    logger.log(TRACE, "%s", formatted_fn_output, extra={"color": "green"})
+    return operation.fn_name, formatted_fn_output
+
+
+def imap_in_order(fn, *iterables, jobs: int = 1) -> Iterator[Any]:
+    """lazily map fn over the inputs, in a process pool when jobs > 1, keeping input order"""
+    if jobs <= 1:
+        yield from map(fn, *iterables)
+        return
+    work = [list(it) for it in iterables]
+    if len(work[0]) == 0:
+        return
+    chunksize = max(1, len(work[0]) // (jobs * 4))
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=init_worker,
+        initargs=(ref_index.get(), generator_options.get()),
+    ) as executor:
+        for result, issues in executor.map(
+            functools.partial(collect_diagnostics_of, fn), *work, chunksize=chunksize
+        ):
+            current_diagnostics.get().extend(issues)
+            yield result
+
+
+def iter_elm_api_functions(
+    apis: dict[Any, Any],
+    manifest: dict[str, Any] | None = None,
+    jobs: int = 1,
+    profiler: StageProfiler | None = None,
+) -> Iterator[tuple[str, str]]:
+    """yields (fn_name, formatted function) per operation, skipping duplicate names"""
+    diagnostics = current_diagnostics.get()
+    logger.info("Assuming everyting is content-type: application/json")
+    logger.info(
+        "Assuming elm http builder methods and openapi http methods are one-to-one"
+    )
+    logger.info("Assume url param name is a valid elm variable")
+    schemas = apis.get("components", {}).get("schemas", {})
+    cached_operations = manifest["operations"] if manifest is not None else {}
+    compiled_operations = {}
+    operations = []
     for route, methods in apis["paths"].items():
-        if skip_non_api_routes and not route.startswith("/api"):
-            print(f"skipping {route=}")
+        if not is_generated_route(route):
+            logger.debug("skipping route=%s", route)
             continue
-        print("-" * 25)
-        print(colored(f"{route=}", "yellow"))
 
         for method, method_vals in methods.items():
-            elm_fn_definition = generate_elm_api_function(route, method, method_vals)
-            formatted_fn_output = format_api_fn(
-                elm_fn_definition,
-                method,
+            operation_key = f"{method} {route}"
+            operation_hash = None
+            if manifest is not None:
+                with measure(profiler, "fingerprint"):
+                    operation_hash = fingerprint_fragment_inputs(
+                        {"route": route, "method": method, "operation": method_vals},
+                        schemas,
+                    )
+                cached = cached_operations.get(operation_key)
+                if cached is not None and cached["hash"] == operation_hash:
+                    compiled_operations[operation_key] = cached
+            operations.append((operation_key, operation_hash, route, method, method_vals))
+
+    uncompiled = [op for op in operations if op[0] not in compiled_operations]
+    compiled = imap_in_order(
+        compile_elm_api_function,
+        [route for _, _, route, _, _ in uncompiled],
+        [method for _, _, _, method, _ in uncompiled],
+        [method_vals for _, _, _, _, method_vals in uncompiled],
+        jobs=jobs,
+    )
+    seen_fn_names: set[str] = set()
+    for operation_key, operation_hash, _, _, _ in operations:
+        if operation_key in compiled_operations:
+            fn_name = compiled_operations[operation_key]["fn_name"]
+            formatted_fn_output = compiled_operations[operation_key]["fragment"]
+            diagnostics.extend(compiled_operations[operation_key].get("issues", []))
+        else:
+            issues_start = len(diagnostics)
+            with measure(profiler, "api_functions", operation_key):
+                fn_name, formatted_fn_output = next(compiled)
+            if manifest is not None:
+                compiled_operations[operation_key] = {
+                    "hash": operation_hash,
+                    "fn_name": fn_name,
+                    "fragment": formatted_fn_output,
+                    "issues": diagnostics[issues_start:],
+                }
+        if fn_name in seen_fn_names:
+            report_issue(
+                "duplicate_operation_id",
+                "%s already exists, skipping %s",
+                fn_name,
+                operation_key,
+                operation_id=fn_name,
             )
+            continue
+        seen_fn_names.add(fn_name)
+        yield fn_name, formatted_fn_output
+    if manifest is not None:
+        manifest["operations"] = {
+            operation_key: compiled_operations[operation_key]
+            for operation_key, _, _, _, _ in operations
+        }
+
 
-            print(colored(formatted_fn_output, "green"))
-            if elm_fn_definition["fn_name"] in elm_functions:
-                print(colored(f'ERR: {elm_fn_definition["fn_name"]} already exists'))
-            elm_functions[elm_fn_definition["fn_name"]] = formatted_fn_output
-    return elm_functions
+def generate_all_elm_api_functions(
+    apis: dict[Any, Any], manifest: dict[str, Any] | None = None, jobs: int = 1
+) -> dict[str, str]:
+    return dict(iter_elm_api_functions(apis, manifest=manifest, jobs=jobs))
 
 
-elm_expect_fastpai_fn_and_types = """
+elm_fast_api_types = """
 type FastApiHttpError
     = BadUrl String
     | Timeout
@@ -282,8 +1754,9 @@ type alias ValidationError =
 
 type alias ValidationErrorDetail =
     { loc : List LocType, msg : String, type_ : String }
+""".strip()
 
-
+elm_fast_api_codecs = """
 loc_decoder : D.Decoder LocType
 loc_decoder =
     D.oneOf [ D.string |> D.map StringLoc, D.int |> D.map IntLoc ]
@@ -303,117 +1776,1447 @@ decode_ValidationErrorDetail =
         (D.field "type" D.string)
 
 
+fast_api_response_to_result : D.Decoder value -> Http.Response String -> Result FastApiHttpError value
+fast_api_response_to_result decoder response =
+    case response of
+        Http.BadUrl_ url ->
+            Err <| BadUrl url
+
+        Http.Timeout_ ->
+            Err <| Timeout
+
+        Http.NetworkError_ ->
+            Err <| NetworkError
+
+        Http.BadStatus_ metadata str_body ->
+            Err <|
+                BadStatus metadata.statusCode <|
+                    case D.decodeString decode_validation_error str_body of
+                        Ok value ->
+                            value
+
+                        Err err ->
+                            { detail = [ { loc = [], msg = D.errorToString err, type_ = "" } ] }
+
+        Http.GoodStatus_ _ str_body ->
+            case D.decodeString decoder str_body of
+                Ok value ->
+                    Ok value
+
+                Err err ->
+                    Err (BadBody (D.errorToString err))
+
+
 expect_fast_api_response : (Result FastApiHttpError value -> msg) -> D.Decoder value -> Http.Expect msg
 expect_fast_api_response to_msg decoder =
-    Http.expectStringResponse
-        to_msg
-        (\\response ->
+    Http.expectStringResponse to_msg (fast_api_response_to_result decoder)
+
+
+http_headers : List ( String, String ) -> List Http.Header
+http_headers =
+    List.map (\\( name, value ) -> Http.header name value)
+
+
+is_retryable_error : List Int -> FastApiHttpError -> Bool
+is_retryable_error retry_statuses error =
+    case error of
+        Timeout ->
+            True
+
+        NetworkError ->
+            True
+
+        BadStatus status _ ->
+            List.member status retry_statuses
+
+        _ ->
+            False
+""".strip()
+
+# written next to the main module when GeneratorOptions.pagination is set
+elm_paging_module = """
+module {paging_module} exposing
+    ( Loaded
+    , Page(..)
+    , Source
+    , all
+    , continue
+    , cursor_loaded
+    , cursor_of
+    , fetch
+    , loaded
+    , number_of
+    , offset_of
+    , skip
+    , stream
+    , window
+    )
+
+{-| walking the pages of the <fn>_pages sources.
+
+stream the pages into a message one at a time with `stream`, then `continue` from every
+page received; `continue` does nothing after the last page. offset and page number
+sources can also load `window` pages at once: the next window starts `skip size` pages
+later, unless one of the pages loaded was the last.
+
+-}
+
+import Task exposing (Task)
+
+
+{-| Offset offset page_size, Number number page_size (page numbers start at 1, a page
+size of 0 is unknown) or Cursor cursor (Nothing is the first page)
+-}
+type Page
+    = Offset Int Int
+    | Number Int Int
+    | Cursor (Maybe String)
+
+
+type alias Loaded item =
+    { page : Page
+    , items : List item
+    , next : Maybe Page
+    }
+
+
+type alias Source x item =
+    { first : Page
+    , fetch : Page -> Task x (Loaded item)
+    }
+
+
+fetch : (Result x (Loaded item) -> msg) -> Source x item -> Page -> Cmd msg
+fetch to_msg source page =
+    Task.attempt to_msg (source.fetch page)
+
+
+stream : (Result x (Loaded item) -> msg) -> Source x item -> Cmd msg
+stream to_msg source =
+    fetch to_msg source source.first
+
+
+continue : (Result x (Loaded item) -> msg) -> Source x item -> Loaded item -> Cmd msg
+continue to_msg source page =
+    case page.next of
+        Just next ->
+            fetch to_msg source next
+
+        Nothing ->
+            Cmd.none
+
+
+{-| the size pages from page on, requested at the same time; a single page for cursors
+and offsets of unknown page size
+-}
+window : Int -> (Result x (Loaded item) -> msg) -> Source x item -> Page -> Cmd msg
+window size to_msg source page =
+    List.range 0 (size - 1)
+        |> List.filterMap (\\n -> skip n page)
+        |> List.map (fetch to_msg source)
+        |> Cmd.batch
+
+
+skip : Int -> Page -> Maybe Page
+skip n page =
+    case page of
+        Offset offset page_size ->
+            if n == 0 || page_size > 0 then
+                Just (Offset (offset + n * page_size) page_size)
+
+            else
+                Nothing
+
+        Number number page_size ->
+            Just (Number (number + n) page_size)
+
+        Cursor _ ->
+            if n == 0 then
+                Just page
+
+            else
+                Nothing
+
+
+{-| the items of every page, loaded one page after another
+-}
+all : Source x item -> Task x (List item)
+all source =
+    all_from source [] source.first
+
+
+all_from : Source x item -> List (List item) -> Page -> Task x (List item)
+all_from source pages page =
+    source.fetch page
+        |> Task.andThen
+            (\\current ->
+                case current.next of
+                    Just next ->
+                        all_from source (current.items :: pages) next
+
+                    Nothing ->
+                        Task.succeed (List.concat (List.reverse (current.items :: pages)))
+            )
+
+
+offset_of : Page -> Int
+offset_of page =
+    case page of
+        Offset offset _ ->
+            offset
+
+        Number number page_size ->
+            (number - 1) * page_size
+
+        Cursor _ ->
+            0
+
+
+number_of : Page -> Int
+number_of page =
+    case page of
+        Offset offset page_size ->
+            if page_size > 0 then
+                offset // page_size + 1
+
+            else
+                1
+
+        Number number _ ->
+            number
+
+        Cursor _ ->
+            1
+
+
+cursor_of : Page -> Maybe String
+cursor_of page =
+    case page of
+        Cursor cursor ->
+            cursor
+
+        _ ->
+            Nothing
+
+
+{-| an empty page, or one shorter than the page size, is the last
+-}
+loaded : Page -> List item -> Loaded item
+loaded page items =
+    let
+        count =
+            List.length items
+
+        is_last page_size =
+            count == 0 || (page_size > 0 && count < page_size)
+
+        next =
+            case page of
+                Offset offset page_size ->
+                    if is_last page_size then
+                        Nothing
+
+                    else
+                        Just (Offset (offset + count) page_size)
+
+                Number number page_size ->
+                    if is_last page_size then
+                        Nothing
+
+                    else
+                        Just (Number (number + 1) page_size)
+
+                Cursor _ ->
+                    Nothing
+    in
+    { page = page, items = items, next = next }
+
+
+{-| a missing or empty next cursor ends the pages
+-}
+cursor_loaded : Page -> Maybe String -> List item -> Loaded item
+cursor_loaded page next_cursor items =
+    { page = page
+    , items = items
+    , next =
+        case next_cursor of
+            Just "" ->
+                Nothing
+
+            Just cursor ->
+                Just (Cursor (Just cursor))
+
+            Nothing ->
+                Nothing
+    }
+""".strip()
+
+# written next to the main module when GeneratorOptions.retry is set
+elm_retry_module = """
+module {retry_module} exposing
+    ( Policy
+    , default_policy
+    , retry
+    )
+
+{-| sending a <fn>_task again while it fails with a transient error.
+
+the n-th retry waits a random time between 0 and base_delay_ms * 2 ^ (n - 1), capped at
+max_delay_ms ("full jitter"), so clients that failed together do not retry together.
+the delays are drawn from policy.seed, salted with the url of the request and the time of
+its first failure: give every client its own seed, e.g.
+Random.generate GotRetrySeed Random.independentSeed on init.
+
+-}
+
+import Process
+import Random
+import Task exposing (Task)
+import Time
+
+
+type alias Policy =
+    { max_attempts : Int
+    , base_delay_ms : Float
+    , max_delay_ms : Float
+    , retry_statuses : List Int
+    , seed : Random.Seed
+    }
+
+
+default_policy : Policy
+default_policy =
+    { max_attempts = {max_attempts}
+    , base_delay_ms = {base_delay_ms}
+    , max_delay_ms = {max_delay_ms}
+    , retry_statuses = {retry_statuses}
+    , seed = Random.initialSeed 0
+    }
+
+
+{-| task (requesting url), run at most policy.max_attempts times while it fails with an
+error should_retry accepts
+-}
+retry : (x -> Bool) -> Policy -> String -> Task x a -> Task x a
+retry should_retry policy url task =
+    task
+        |> Task.onError
+            (\\error ->
+                if 1 < policy.max_attempts && should_retry error then
+                    Time.now
+                        |> Task.andThen
+                            (\\now ->
+                                retry_attempt should_retry policy 1 (salted_seed policy.seed url now) task
+                            )
+
+                else
+                    Task.fail error
+            )
+
+
+retry_attempt : (x -> Bool) -> Policy -> Int -> Random.Seed -> Task x a -> Task x a
+retry_attempt should_retry policy attempt seed task =
+    let
+        ( delay_ms, next_seed ) =
+            Random.step (backoff_ms policy attempt) seed
+    in
+    Process.sleep delay_ms
+        |> Task.andThen (\\_ -> task)
+        |> Task.onError
+            (\\error ->
+                if attempt + 1 < policy.max_attempts && should_retry error then
+                    retry_attempt should_retry policy (attempt + 1) next_seed task
+
+                else
+                    Task.fail error
+            )
+
+
+backoff_ms : Policy -> Int -> Random.Generator Float
+backoff_ms policy attempt =
+    Random.float 0 (min policy.max_delay_ms (policy.base_delay_ms * toFloat (2 ^ (attempt - 1))))
+
+
+{-| requests sharing a policy still draw different delays
+-}
+salted_seed : Random.Seed -> String -> Time.Posix -> Random.Seed
+salted_seed seed salt now =
+    let
+        ( base, _ ) =
+            Random.step (Random.int 0 Random.maxInt) seed
+    in
+    String.foldl
+        (\\char hash -> modBy Random.maxInt (hash * 31 + Char.toCode char))
+        (modBy Random.maxInt (base + Time.posixToMillis now))
+        salt
+        |> Random.initialSeed
+""".strip()
+
+# written next to the main module when GeneratorOptions.tasks is set
+elm_tasks_module = """
+module {tasks_module} exposing
+    ( Join
+    , JoinMsg
+    , join
+    , join_update
+    , sequence
+    )
+
+{-| running several <fn>_task requests for a single result message.
+
+elm runs the tasks of a chain (Task.andThen, Task.map2, sequence) one after another,
+which is what dependent requests need. independent requests go through join: every task
+is sent as a command of its own, so the requests are in flight at the same time, and
+join_update hands back all of the results once the last one arrived.
+
+tasks of different response types are joined by mapping each result to an update of
+one value:
+
+    join GotPage
+        [ get_user_task user_id |> Task.map (\\user page -> { page | user = Just user })
+        , list_orders_task user_id |> Task.map (\\orders page -> { page | orders = orders })
+        ]
+
+and folding the updates once they are all in: `List.foldl (<|) empty_page updates`.
+
+-}
+
+import Dict exposing (Dict)
+import Task exposing (Task)
+
+
+{-| the tasks one after another, in a single message with every result or the first error
+-}
+sequence : (Result x (List a) -> msg) -> List (Task x a) -> Cmd msg
+sequence to_msg tasks =
+    Task.attempt to_msg (Task.sequence tasks)
+
+
+type Join x a
+    = Join
+        { pending : Int
+        , results : Dict Int a
+        , error : Maybe x
+        }
+
+
+type JoinMsg x a
+    = Finished Int (Result x a)
+
+
+{-| starts every task at once. an empty list of tasks never finishes.
+-}
+join : (JoinMsg x a -> msg) -> List (Task x a) -> ( Join x a, Cmd msg )
+join to_msg tasks =
+    ( Join { pending = List.length tasks, results = Dict.empty, error = Nothing }
+    , tasks
+        |> List.indexedMap (\\index task -> Task.attempt (Finished index >> to_msg) task)
+        |> Cmd.batch
+    )
+
+
+{-| Just the results, in the order of the tasks, once every task finished, or the
+error of the first task that failed
+-}
+join_update : JoinMsg x a -> Join x a -> ( Join x a, Maybe (Result x (List a)) )
+join_update (Finished index result) (Join state) =
+    let
+        next =
+            case result of
+                Ok value ->
+                    { state
+                        | pending = state.pending - 1
+                        , results = Dict.insert index value state.results
+                    }
+
+                Err error ->
+                    { state
+                        | pending = state.pending - 1
+                        , error = Just (Maybe.withDefault error state.error)
+                    }
+    in
+    ( Join next
+    , if next.pending > 0 then
+        Nothing
+
+      else
+        case next.error of
+            Just error ->
+                Just (Err error)
+
+            Nothing ->
+                Just (Ok (Dict.values next.results))
+    )
+""".strip()
+
+# written next to the main module when GeneratorOptions.cache is set, see format_elm_cache_module
+elm_cache_module = """
+module {cache_module} exposing
+    ( Cache
+    , Config
+    , Msg
+    , Request
+    , clear
+    , default_config
+    , empty
+    , get
+    , invalidate
+    , update
+    )
+
+{-| responses of the generated GET functions, kept in the model of the app.
+
+requests are keyed by method and url (query included). a fresh entry answers without
+a request, identical requests made while one is in flight share it, and the oldest
+entry is evicted once there are more than max_entries.
+
+-}
+
+import Dict exposing (Dict)
+import Http
+import Task
+import Time
+
+
+type alias Config =
+    { max_entries : Int
+    , default_ttl_ms : Int
+    }
+
+
+default_config : Config
+default_config =
+    { max_entries = {max_entries}
+    , default_ttl_ms = {default_ttl_ms}
+    }
+
+
+type alias Request =
+    { url : String
+    , headers : List ( String, String )
+    , timeout : Maybe Float
+    , ttl_ms : Maybe Int
+    }
+
+
+type alias Entry =
+    { response : Http.Response String
+    , stored_at : Int
+    , expires_at : Int
+    }
+
+
+type Cache msg
+    = Cache
+        { config : Config
+        , entries : Dict String Entry
+        , in_flight : Dict String (List (Http.Response String -> msg))
+        }
+
+
+type Msg
+    = Received String Int Time.Posix (Http.Response String)
+
+
+empty : Config -> Cache msg
+empty config =
+    Cache { config = config, entries = Dict.empty, in_flight = Dict.empty }
+
+
+get : (Msg -> msg) -> Request -> (Http.Response String -> msg) -> Time.Posix -> Cache msg -> ( Cache msg, Cmd msg )
+get to_msg request on_response now (Cache cache) =
+    let
+        key =
+            "GET " ++ request.url
+
+        fresh_response =
+            Dict.get key cache.entries
+                |> Maybe.andThen
+                    (\\entry ->
+                        if entry.expires_at > Time.posixToMillis now then
+                            Just entry.response
+
+                        else
+                            Nothing
+                    )
+
+        ttl_ms =
+            Maybe.withDefault cache.config.default_ttl_ms request.ttl_ms
+    in
+    case ( fresh_response, Dict.get key cache.in_flight ) of
+        ( Just response, _ ) ->
+            ( Cache cache, send on_response response )
+
+        ( Nothing, Just waiting ) ->
+            ( Cache { cache | in_flight = Dict.insert key (on_response :: waiting) cache.in_flight }
+            , Cmd.none
+            )
+
+        ( Nothing, Nothing ) ->
+            ( Cache { cache | in_flight = Dict.insert key [ on_response ] cache.in_flight }
+            , Http.task
+                { method = "GET"
+                , headers = List.map (\\( name, value ) -> Http.header name value) request.headers
+                , url = request.url
+                , body = Http.emptyBody
+                , resolver = Http.stringResolver Ok
+                , timeout = request.timeout
+                }
+                |> Task.andThen (\\response -> Task.map (\\time -> ( time, response )) Time.now)
+                |> Task.perform (\\( time, response ) -> to_msg (Received key ttl_ms time response))
+            )
+
+
+update : Msg -> Cache msg -> ( Cache msg, Cmd msg )
+update (Received key ttl_ms time response) (Cache cache) =
+    let
+        now =
+            Time.posixToMillis time
+
+        entries =
             case response of
-                Http.BadUrl_ url ->
-                    Err <| BadUrl url
+                Http.GoodStatus_ _ _ ->
+                    if ttl_ms > 0 then
+                        cache.entries
+                            |> Dict.filter (\\_ entry -> entry.expires_at > now)
+                            |> Dict.insert key { response = response, stored_at = now, expires_at = now + ttl_ms }
+                            |> evict_oldest cache.config.max_entries
+
+                    else
+                        cache.entries
+
+                _ ->
+                    cache.entries
+    in
+    ( Cache { cache | entries = entries, in_flight = Dict.remove key cache.in_flight }
+    , Dict.get key cache.in_flight
+        |> Maybe.withDefault []
+        |> List.reverse
+        |> List.map (\\on_response -> send on_response response)
+        |> Cmd.batch
+    )
 
-                Http.Timeout_ ->
-                    Err <| Timeout
 
-                Http.NetworkError_ ->
-                    Err <| NetworkError
+{-| forgets the response of a url built by one of the generated functions
+-}
+invalidate : String -> Cache msg -> Cache msg
+invalidate url (Cache cache) =
+    Cache { cache | entries = Dict.remove ("GET " ++ url) cache.entries }
 
-                Http.BadStatus_ metadata str_body ->
-                    Err <|
-                        BadStatus metadata.statusCode <|
-                            case D.decodeString decode_validation_error str_body of
-                                Ok value ->
-                                    value
 
-                                Err err ->
-                                    { detail = [ { loc = [], msg = D.errorToString err, type_ = "" } ] }
+clear : Cache msg -> Cache msg
+clear (Cache cache) =
+    Cache { cache | entries = Dict.empty }
 
-                Http.GoodStatus_ _ str_body ->
-                    case D.decodeString decoder str_body of
-                        Ok value ->
-                            Ok value
 
-                        Err err ->
-                            Err (BadBody (D.errorToString err))
+evict_oldest : Int -> Dict String Entry -> Dict String Entry
+evict_oldest max_entries entries =
+    if Dict.size entries <= max_entries then
+        entries
+
+    else
+        Dict.foldl
+            (\\key entry oldest ->
+                case oldest of
+                    Just ( _, stored_at ) ->
+                        if entry.stored_at < stored_at then
+                            Just ( key, entry.stored_at )
+
+                        else
+                            oldest
+
+                    Nothing ->
+                        Just ( key, entry.stored_at )
+            )
+            Nothing
+            entries
+            |> Maybe.map (\\( key, _ ) -> Dict.remove key entries)
+            |> Maybe.withDefault entries
+
+
+send : (a -> msg) -> a -> Cmd msg
+send to_msg value =
+    Task.perform to_msg (Task.succeed value)
+""".lstrip()
+
+
+elm_expect_fastpai_fn_and_types = f"{elm_fast_api_types}\n\n\n{elm_fast_api_codecs}"
+
+elm_imports = """
+import Http
+import HttpBuilder
+import Json.Decode as D
+import Json.Decode.Pipeline as JDP
+import Json.Encode as E
+import RemoteData exposing (RemoteData(..))
+import Url
+import Url.Builder
+""".strip()
+
+maybe_encoder_fn = """
+maybe_encoder : (a -> E.Value) -> Maybe a -> E.Value 
+maybe_encoder value_encoder mv = 
+    case mv of 
+        Just v -> value_encoder v 
+        Nothing -> E.null 
+""".strip()
+
+
+class FragmentSpool:
+    """keeps fragments in memory up to max_size, then on disk, and replays them in order"""
+
+    separator = "\0"
+
+    def __init__(self, max_size: int = 1 << 20):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_size, mode="w+")
+        self.count = 0
+
+    def extend(self, fragments: Iterable[str]) -> None:
+        for fragment in fragments:
+            self.file.write(fragment)
+            self.file.write(self.separator)
+            self.count += 1
+
+    def __iter__(self) -> Iterator[str]:
+        self.file.seek(0)
+        pending = ""
+        while chunk := self.file.read(1 << 16):
+            *fragments, pending = (pending + chunk).split(self.separator)
+            yield from fragments
+
+    def __enter__(self) -> "FragmentSpool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.file.close()
+
+
+def iter_elm_type_aliases(
+    schema_fragments: Iterable[tuple[str, list[str], list[str]]],
+    encoder_spool: FragmentSpool,
+    decoder_spool: FragmentSpool,
+) -> Iterator[str]:
+    """yields the type aliases and sets the encoders / decoders aside for later sections"""
+    for elm_type_alias, elm_encoder_fns, elm_decoder_fns in schema_fragments:
+        encoder_spool.extend(elm_encoder_fns)
+        decoder_spool.extend(elm_decoder_fns)
+        yield elm_type_alias
+
+
+class ChangeAwareFile:
+    """text file streamed into a temp file next to path while being hashed.
+
+    on close the temp file replaces path atomically, unless path already has the same
+    content: then path is left alone so its mtime (and every watcher / build cache) stays.
+    """
+
+    def __init__(self, path: str, buffering: int = 1 << 16):
+        self.path = pathlib.Path(path)
+        self.buffering = buffering
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.written: bool | None = None
+
+    def __enter__(self) -> "ChangeAwareFile":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # unlike mkstemp's 0600, 0666 lets the kernel apply the process' current umask
+        while True:
+            self.temp_path = str(
+                self.path.parent / f".{self.path.name}.{secrets.token_hex(4)}.tmp"
+            )
+            try:
+                fd = os.open(
+                    self.temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666
+                )
+                break
+            except FileExistsError:
+                continue
+        self._file = os.fdopen(fd, "wb", buffering=self.buffering)
+        return self
+
+    def write(self, text: str) -> int:
+        data = text.encode("utf-8")
+        self.digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def has_same_content(self) -> bool:
+        try:
+            if self.path.stat().st_size != self.size:
+                return False
+            existing_digest = hashlib.sha256()
+            with open(self.path, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    existing_digest.update(chunk)
+        except FileNotFoundError:
+            return False
+        return existing_digest.digest() == self.digest.digest()
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._file.close()
+        if exc_type is not None or self.has_same_content():
+            os.unlink(self.temp_path)
+            self.written = False if exc_type is None else None
+            return
+        # a replaced file keeps its mode, a new one keeps the mode it was created with
+        try:
+            os.chmod(self.temp_path, self.path.stat().st_mode & 0o777)
+        except FileNotFoundError:
+            pass
+        os.replace(self.temp_path, self.path)
+        self.written = True
+
+
+def log_written_file(output_file: str, written: bool) -> None:
+    logger.info(
+        "%s %s",
+        "wrote" if written else "unchanged",
+        output_file,
+        extra={"color": "green" if written else "blue"},
+    )
+
+
+def format_elm_cache_module(cache_module: str) -> str:
+    options = generator_options.get()
+    return (
+        elm_cache_module.replace("{cache_module}", cache_module)
+        .replace("{max_entries}", str(options.cache_max_entries))
+        .replace("{default_ttl_ms}", str(round(options.cache_ttl * 1000)))
+    )
+
+
+def format_elm_retry_module(retry_module: str) -> str:
+    options = generator_options.get()
+    return (
+        elm_retry_module.replace("{retry_module}", retry_module)
+        .replace("{max_attempts}", str(options.retry_attempts))
+        .replace("{base_delay_ms}", str(options.retry_delay_ms))
+        .replace("{max_delay_ms}", str(retry_max_delay_ms))
+        .replace(
+            "{retry_statuses}", format_elm_list([str(s) for s in options.retry_statuses])
+        )
+    )
+
+
+def get_elm_variant_imports(module_name: str) -> list[str]:
+    """imports the <fn>_cached / <fn>_task variants of module_name's functions need"""
+    options = generator_options.get()
+    imports = []
+    if options.cache:
+        imports += [f"import {module_name}.Cache as Cache", "import Time"]
+    if options.tasks or options.retry or options.pagination:
+        imports.append("import Task")
+    if options.retry:
+        imports.append(f"import {module_name}.Retry as Retry")
+    if options.pagination:
+        imports.append(f"import {module_name}.Paging as Paging")
+    return imports
+
+
+def get_elm_helper_modules(module_name: str) -> dict[str, str]:
+    """{module name: elm source} of the modules written next to module_name"""
+    options = generator_options.get()
+    modules = {}
+    if options.cache:
+        modules[f"{module_name}.Cache"] = format_elm_cache_module(
+            f"{module_name}.Cache"
+        )
+    if options.tasks:
+        modules[f"{module_name}.Tasks"] = elm_tasks_module.replace(
+            "{tasks_module}", f"{module_name}.Tasks"
+        )
+    if options.retry:
+        modules[f"{module_name}.Retry"] = format_elm_retry_module(
+            f"{module_name}.Retry"
+        )
+    if options.pagination:
+        modules[f"{module_name}.Paging"] = elm_paging_module.replace(
+            "{paging_module}", f"{module_name}.Paging"
         )
-""".strip()
+    return modules
 
-elm_imports = """
-import Http
-import HttpBuilder
-import Json.Decode as D
-import Json.Decode.Pipeline as JDP
-import Json.Encode as E
-import RemoteData exposing (RemoteData(..))
-""".strip()
 
-maybe_encoder_fn = """
-maybe_encoder : (a -> E.Value) -> Maybe a -> E.Value 
-maybe_encoder value_encoder mv = 
-    case mv of 
-        Just v -> value_encoder v 
-        Nothing -> E.null 
-""".strip()
+def write_fragments(f, fragments: Iterable[str], separator: str = "\n\n") -> int:
+    count = 0
+    for fragment in fragments:
+        if count > 0:
+            f.write(separator)
+        f.write(fragment)
+        count += 1
+    return count
 
 
 def write_http_fns_file(
-    elm_functions: dict[Any, Any],
-    elm_types: list[str] = [],
-    elm_encoder_fns: list[str] = [],
-    elm_decoder_fns: list[str] = [],
+    elm_functions: dict[Any, Any] | Iterable[tuple[str, str]],
+    elm_types: Iterable[str] = (),
+    elm_encoder_fns: Iterable[str] = (),
+    elm_decoder_fns: Iterable[str] = (),
     output_file: str = "./codegen/ApiGen.elm",
     open_api_version: str = "3.1.0",
     info: dict = {},
+    module_name: str = "ApiGen",
+) -> bool:
+    """returns False when output_file already had exactly this content and was left untouched"""
+    logger.info("generating file %s", output_file, extra={"color": "green"})
+    with ChangeAwareFile(output_file) as f:
+        write_http_fns(
+            f,
+            elm_functions,
+            elm_types=elm_types,
+            elm_encoder_fns=elm_encoder_fns,
+            elm_decoder_fns=elm_decoder_fns,
+            open_api_version=open_api_version,
+            info=info,
+            module_name=module_name,
+        )
+    log_written_file(output_file, f.written)
+    return f.written
+
+
+def write_http_fns(
+    f,
+    elm_functions: dict[Any, Any] | Iterable[tuple[str, str]],
+    elm_types: Iterable[str] = (),
+    elm_encoder_fns: Iterable[str] = (),
+    elm_decoder_fns: Iterable[str] = (),
+    open_api_version: str = "3.1.0",
+    info: dict = {},
+    module_name: str = "ApiGen",
 ) -> None:
-    print(colored("writing file", "green"))
-    print(colored(f"writing {len(elm_types)} api types", "blue"))
-    print(colored(f"writing {len(elm_encoder_fns)} encoder functions", "blue"))
-    print(colored(f"writing {len(elm_decoder_fns)} decoder functions", "blue"))
-    print(colored(f"writing {len(elm_functions)} api functions", "blue"))
-    total = len(elm_types) + len(elm_encoder_fns) + len(elm_functions)
-    print(colored(f"Total = {total}", "blue"))
-    functions_str = "\n\n".join(
-        [elm_fn_formatted for _, elm_fn_formatted in elm_functions.items()]
-    )
+    """writes the whole elm module into the text file f"""
+    if isinstance(elm_functions, dict):
+        elm_functions = elm_functions.items()
 
     unknown_type = "type alias UNKN=String"
-    elm_types_str = unknown_type + "\n\n" + "\n\n".join(elm_types)
-    elm_encoder_fns_str = "\n\n".join(elm_encoder_fns)
-    elm_decoder_fns_str = "\n\n".join(elm_decoder_fns)
-    file_content = f"""
-module ApiGen exposing(..)
+    imports = "\n".join([elm_imports, *get_elm_variant_imports(module_name)])
+    f.write(
+        f"""module {module_name} exposing(..)
 -- GENRATED FOR OPENAPI={open_api_version}
 -- INFO={info}
 
-{elm_imports}
+{imports}
 
 -- Helper Fns
 {maybe_encoder_fn}
 
 -- Api Types
-{elm_types_str}
+{unknown_type}
+
+"""
+    )
+    types_count = write_fragments(f, elm_types)
+    f.write("\n\n-- Api Encoder Fns\n")
+    encoders_count = write_fragments(f, elm_encoder_fns)
+    f.write("\n\n-- Api Decoder Fns\n")
+    decoders_count = write_fragments(f, elm_decoder_fns)
+    f.write(f"\n\n-- Api Functions\n{elm_expect_fastpai_fn_and_types}")
+    functions_count = 0
+    for _, elm_fn_formatted in elm_functions:
+        f.write(f"\n\n{elm_fn_formatted}")
+        functions_count += 1
+
+    logger.info("wrote %d api types", types_count, extra={"color": "blue"})
+    logger.info("wrote %d encoder functions", encoders_count, extra={"color": "blue"})
+    logger.info("wrote %d decoder functions", decoders_count, extra={"color": "blue"})
+    logger.info("wrote %d api functions", functions_count, extra={"color": "blue"})
+    total = types_count + encoders_count + functions_count
+    logger.info("Total = %d", total, extra={"color": "blue"})
+
+
+def generate_elm_file(
+    apis: dict[Any, Any],
+    output_file: str = "./codegen/src/ApiGen.elm",
+    manifest: dict[str, Any] | None = None,
+    jobs: int = 1,
+    module_name: str = "ApiGen",
+    profiler: StageProfiler | None = None,
+) -> dict[str, bool]:
+    """streams every generated fragment of the spec straight into output_file, see write_http_fns_file
+
+    returns whether each module was rewritten, the helper modules next to output_file included
+    """
+    reset_diagnostics()
+    with measure(profiler, "index"):
+        index_openapi_document(apis)
+    with FragmentSpool() as encoder_spool, FragmentSpool() as decoder_spool, measure(
+        profiler, "write"
+    ):
+        elm_types = iter_elm_type_aliases(
+            iter_elm_schema_fragments(
+                apis["components"]["schemas"],
+                manifest=manifest,
+                jobs=jobs,
+                profiler=profiler,
+            ),
+            encoder_spool,
+            decoder_spool,
+        )
+        written = {}
+        written[module_name] = write_http_fns_file(
+            iter_elm_api_functions(
+                apis, manifest=manifest, jobs=jobs, profiler=profiler
+            ),
+            elm_types=elm_types,
+            elm_encoder_fns=encoder_spool,
+            elm_decoder_fns=decoder_spool,
+            output_file=output_file,
+            open_api_version=apis["openapi"],
+            info=apis["info"],
+            module_name=module_name,
+        )
+        for helper_module, elm_module in get_elm_helper_modules(module_name).items():
+            # ApiGen.elm -> ApiGen/Cache.elm
+            helper_file = pathlib.Path(output_file).with_suffix("") / (
+                helper_module.rsplit(".", 1)[-1] + ".elm"
+            )
+            written[helper_module] = write_elm_module_if_changed(
+                str(helper_file), elm_module
+            )
+            log_written_file(str(helper_file), written[helper_module])
+        return written
+
+
+elm_declared_type_re = re.compile(r"^type (?:alias )?(\w+)", re.MULTILINE)
+elm_declared_fn_re = re.compile(r"^(\w+) :", re.MULTILINE)
+elm_identifier_re = re.compile(r"\b\w+\b")
+
+
+def get_elm_tag_module_name(tag: str | None, module_name: str = "ApiGen") -> str:
+    words = re.findall(r"[A-Za-z0-9]+", tag or "")
+    tag_module = "".join(word[0].upper() + word[1:] for word in words) or "Untagged"
+    if tag_module[0].isdigit():
+        tag_module = f"Tag{tag_module}"
+    if tag_module in ("Types", "Codecs"):
+        tag_module = f"{tag_module}Api"
+    return f"{module_name}.{tag_module}"
+
+
+def get_operation_module_names(
+    apis: dict[Any, Any], module_name: str = "ApiGen"
+) -> dict[str, str]:
+    """operationId -> module of its first tag"""
+    operation_modules: dict[str, str] = {}
+    for methods in apis["paths"].values():
+        for method_vals in methods.values():
+            tags = method_vals.get("tags") or [None]
+            operation_modules.setdefault(
+                method_vals["operationId"], get_elm_tag_module_name(tags[0], module_name)
+            )
+    return operation_modules
 
--- Api Encoder Fns
-{elm_encoder_fns_str}
 
--- Api Decoder Fns
-{elm_decoder_fns_str}
+def format_elm_module_header(
+    module_name: str, open_api_version: str, info: dict, imports: list[str]
+) -> str:
+    return "\n".join(
+        [
+            f"module {module_name} exposing(..)",
+            f"-- GENRATED FOR OPENAPI={open_api_version}",
+            f"-- INFO={info}",
+            "",
+            elm_imports,
+            *imports,
+        ]
+    )
 
--- Api Functions
-{elm_expect_fastpai_fn_and_types}
 
-{functions_str}
-    """.strip()
+def format_elm_import(module_name: str, names: Iterable[str]) -> str:
+    names = sorted(names)
+    if not names:
+        return f"import {module_name}"
+    return f'import {module_name} exposing ({", ".join(names)})'
+
+
+def write_elm_module_if_changed(module_file: str, content: str) -> bool:
+    """writes content unless module_file already has it, so elm make does not rebuild the module"""
+    with ChangeAwareFile(module_file) as f:
+        f.write(content)
+    return f.written
+
+
+def write_elm_modules(
+    modules: dict[str, str], src_dir: str = "./codegen/src", workers: int = 8
+) -> dict[str, bool]:
+    """writes every module concurrently, returns whether each module was rewritten"""
+    module_files = {name: get_elm_module_file_loc(name, src_dir) for name in modules}
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(modules)))) as executor:
+        written = dict(
+            zip(
+                modules,
+                executor.map(
+                    write_elm_module_if_changed,
+                    module_files.values(),
+                    modules.values(),
+                ),
+            )
+        )
+    for name, was_written in written.items():
+        log_written_file(module_files[name], was_written)
+    return written
+
+
+def generate_elm_modules(
+    apis: dict[Any, Any],
+    src_dir: str = "./codegen/src",
+    manifest: dict[str, Any] | None = None,
+    jobs: int = 1,
+    module_name: str = "ApiGen",
+    profiler: StageProfiler | None = None,
+) -> dict[str, bool]:
+    """writes the modules of build_elm_modules below src_dir"""
+    modules = build_elm_modules(
+        apis, manifest=manifest, jobs=jobs, module_name=module_name, profiler=profiler
+    )
+    with measure(profiler, "write"):
+        return write_elm_modules(modules, src_dir)
+
+
+def build_elm_modules(
+    apis: dict[Any, Any],
+    manifest: dict[str, Any] | None = None,
+    jobs: int = 1,
+    module_name: str = "ApiGen",
+    profiler: StageProfiler | None = None,
+) -> dict[str, str]:
+    """<module_name>.Types, <module_name>.Codecs and one module per tag instead of a single file"""
+    reset_diagnostics()
+    with measure(profiler, "index"):
+        index_openapi_document(apis)
+    elm_types: list[str] = []
+    elm_encoder_fns: list[str] = []
+    elm_decoder_fns: list[str] = []
+    for elm_type_alias, encoders, decoders in iter_elm_schema_fragments(
+        apis["components"]["schemas"], manifest=manifest, jobs=jobs, profiler=profiler
+    ):
+        elm_types.append(elm_type_alias)
+        elm_encoder_fns.extend(encoders)
+        elm_decoder_fns.extend(decoders)
+    operation_modules = get_operation_module_names(apis, module_name)
+    tag_modules: dict[str, list[str]] = {}
+    for fn_name, elm_fn_formatted in iter_elm_api_functions(
+        apis, manifest=manifest, jobs=jobs, profiler=profiler
+    ):
+        tag_modules.setdefault(operation_modules[fn_name], []).append(elm_fn_formatted)
+
+    types_module, codecs_module = f"{module_name}.Types", f"{module_name}.Codecs"
+    types_section = "\n\n".join(["type alias UNKN=String", *elm_types])
+    codecs_section = "\n\n".join(
+        [
+            maybe_encoder_fn,
+            *elm_encoder_fns,
+            *elm_decoder_fns,
+            elm_fast_api_codecs,
+        ]
+    )
+    type_names = set(elm_declared_type_re.findall(f"{types_section}\n{elm_fast_api_types}"))
+    codec_names = set(elm_declared_fn_re.findall(codecs_section))
+
+    def header(name: str, imports: list[str]) -> str:
+        return format_elm_module_header(name, apis["openapi"], apis["info"], imports)
+
+    modules = {
+        types_module: f"{header(types_module, [])}\n\n-- Api Types\n{types_section}\n\n-- FastApi Types\n{elm_fast_api_types}\n",
+        codecs_module: f"{header(codecs_module, [f'import {types_module} exposing (..)'])}\n\n-- Api Codecs\n{codecs_section}\n",
+    }
+    for tag_module, elm_fns in tag_modules.items():
+        functions_section = "\n\n".join(elm_fns)
+        used_names = set(elm_identifier_re.findall(functions_section))
+        imports = [
+            format_elm_import(types_module, type_names & used_names),
+            format_elm_import(codecs_module, codec_names & used_names),
+            *get_elm_variant_imports(module_name),
+        ]
+        modules[tag_module] = f"{header(tag_module, imports)}\n\n-- Api Functions\n{functions_section}\n"
+    modules.update(get_elm_helper_modules(module_name))
+    return modules
+
+
+def generate(
+    spec: dict[Any, Any],
+    options: GeneratorOptions | None = None,
+    issues: list[dict[str, Any]] | None = None,
+) -> dict[str, str]:
+    """elm modules of an openapi spec dict, generated in memory without touching disk or the network.
+
+    returns {module name: elm source}; one module_name module, or with split_modules
+    module_name.Types, module_name.Codecs and one module per tag. issues found while
+    generating are appended to issues. every call runs in a context of its own (options,
+    $ref index, issues), so calls can run from several threads at once.
+    """
+    found_issues: list[dict[str, Any]] = []
+    modules = copy_context().run(
+        generate_in_context, spec, options or GeneratorOptions(), found_issues
+    )
+    if issues is not None:
+        issues.extend(found_issues)
+    return modules
+
+
+def generate_in_context(
+    spec: dict[Any, Any], options: GeneratorOptions, issues: list[dict[str, Any]]
+) -> dict[str, str]:
+    generator_options.set(options)
+    current_diagnostics.set(issues)
+    apis = select_openapi_document(
+        spec,
+        include_tags=options.include_tags,
+        exclude_tags=options.exclude_tags,
+        path_globs=options.path_globs,
+        operation_ids=options.operation_ids,
+        tree_shake=options.tree_shake,
+    )
+    if options.split_modules:
+        return build_elm_modules(
+            apis, jobs=options.jobs, module_name=options.module_name
+        )
+    index_openapi_document(apis)
+    elm_types, elm_encoder_fns, elm_decoder_fns = generate_all_elm_types(
+        apis["components"]["schemas"], jobs=options.jobs
+    )
+    f = io.StringIO()
+    write_http_fns(
+        f,
+        iter_elm_api_functions(apis, jobs=options.jobs),
+        elm_types=elm_types,
+        elm_encoder_fns=elm_encoder_fns,
+        elm_decoder_fns=elm_decoder_fns,
+        open_api_version=apis["openapi"],
+        info=apis["info"],
+        module_name=options.module_name,
+    )
+    return {
+        options.module_name: f.getvalue(),
+        **get_elm_helper_modules(options.module_name),
+    }
+
+
+def select_openapi_document(
+    apis: dict[Any, Any],
+    include_tags: Iterable[str] = (),
+    exclude_tags: Iterable[str] = (),
+    path_globs: Iterable[str] = (),
+    operation_ids: Iterable[str] = (),
+    tree_shake: bool = False,
+) -> dict[Any, Any]:
+    """apis as is unless an operation selector or tree_shake is given"""
+    selectors = [include_tags, exclude_tags, path_globs, operation_ids]
+    if not tree_shake and not any(selectors):
+        return apis
+    return tree_shake_openapi_document(apis, select_operations(apis["paths"], *selectors))
+
+
+def operation_selection_options(command):
+    for option in reversed(
+        [
+            click.option(
+                "--include-tag",
+                "include_tags",
+                multiple=True,
+                help="Only generate operations with this tag (repeatable)",
+            ),
+            click.option(
+                "--exclude-tag",
+                "exclude_tags",
+                multiple=True,
+                help="Skip operations with this tag (repeatable)",
+            ),
+            click.option(
+                "--path-glob",
+                "path_globs",
+                multiple=True,
+                help="Only generate routes matching this glob, e.g. '/api/db/*' (repeatable)",
+            ),
+            click.option(
+                "--operation-id",
+                "operation_ids",
+                multiple=True,
+                help="Only generate this operation (repeatable)",
+            ),
+            click.option(
+                "--tree-shake/--no-tree-shake",
+                default=False,
+                help="Drop schemas the generated operations do not use (implied by any selector)",
+            ),
+        ]
+    ):
+        command = option(command)
+    return command
+
+
+decoder_style_option = click.option(
+    "--decoder-style",
+    type=click.Choice(decoder_styles),
+    default="map",
+    help="Decode records with D.map..D.map8 (faster) or a Json.Decode.Pipeline chain",
+)
+
+tasks_option = click.option(
+    "--tasks",
+    is_flag=True,
+    help="Also write ApiGen.Tasks and a <fn>_task variant of every api function",
+)
+
+pagination_option = click.option(
+    "--pagination",
+    is_flag=True,
+    help="Also write ApiGen.Paging and a <fn>_pages source of every paginated list",
+)
 
-    with open(output_file, "w") as f:
-        f.write(file_content)
+
+def update_generator_options(**changes: Any) -> None:
+    generator_options.set(replace(generator_options.get(), **changes))
+
+
+# GeneratorOptions set by the shared click options above and by batch config entries
+configurable_options = (
+    "decoder_style",
+    "cache",
+    "cache_ttl",
+    "cache_max_entries",
+    "cache_ttls",
+    "tasks",
+    "pagination",
+    "timeout_ms",
+    "tag_timeouts",
+    "retry",
+    "retry_attempts",
+    "retry_delay_ms",
+    "retry_statuses",
+)
+
+
+def pop_configurable_options(settings: dict[str, Any]) -> dict[str, Any]:
+    """takes the configurable_options out of click kwargs / a batch entry.
+
+    json objects and lists of batch entries become the tuples the click options produce
+    """
+    options = {}
+    for name in configurable_options:
+        if name not in settings:
+            continue
+        value = settings.pop(name)
+        if isinstance(value, dict):
+            value = tuple(value.items())
+        elif isinstance(value, list):
+            value = tuple(value)
+        options[name] = value
+    return options
+
+
+def parse_assignments(convert: Callable[[str], Any], metavar: str):
+    """click callback turning repeated NAME=VALUE options into ((name, value), ...)"""
+
+    def parse(ctx, param, values) -> tuple[tuple[str, Any], ...]:
+        assignments = []
+        for value in values:
+            name, _, converted = value.partition("=")
+            try:
+                assignments.append((name, convert(converted)))
+            except ValueError:
+                raise click.BadParameter(f"expected {metavar}, got {value}")
+        return tuple(assignments)
+
+    return parse
+
+
+def cache_options(command):
+    for option in reversed(
+        [
+            click.option(
+                "--cache",
+                is_flag=True,
+                help="Also write ApiGen.Cache and a cached <fn>_cached variant of every GET",
+            ),
+            click.option(
+                "--cache-ttl",
+                default=GeneratorOptions().cache_ttl,
+                type=click.FloatRange(min=0),
+                help="Seconds a response is cached when the operation has no x-cache-ttl",
+            ),
+            click.option(
+                "--cache-max-entries",
+                default=GeneratorOptions().cache_max_entries,
+                type=click.IntRange(min=1),
+                help="Responses kept before the oldest is evicted",
+            ),
+            click.option(
+                "--cache-ttl-for",
+                "cache_ttls",
+                multiple=True,
+                callback=parse_assignments(float, "OPERATION_ID=SECONDS"),
+                metavar="OPERATION_ID=SECONDS",
+                help="Cache ttl of one operation, overrides its x-cache-ttl (repeatable)",
+            ),
+        ]
+    ):
+        command = option(command)
+    return command
+
+
+def request_options(command):
+    for option in reversed(
+        [
+            click.option(
+                "--timeout-ms",
+                default=GeneratorOptions().timeout_ms,
+                type=click.IntRange(min=1),
+                help="Request timeout of operations without x-timeout-ms",
+            ),
+            click.option(
+                "--timeout-for-tag",
+                "tag_timeouts",
+                multiple=True,
+                callback=parse_assignments(int, "TAG=MILLISECONDS"),
+                metavar="TAG=MILLISECONDS",
+                help="Timeout of the operations of a tag without x-timeout-ms (repeatable)",
+            ),
+            click.option(
+                "--retry",
+                is_flag=True,
+                help="Also write ApiGen.Retry and <fn>_retry variants of idempotent functions",
+            ),
+            click.option(
+                "--retry-attempts",
+                default=GeneratorOptions().retry_attempts,
+                type=click.IntRange(min=1),
+                help="Attempts of Retry.default_policy, the first one included",
+            ),
+            click.option(
+                "--retry-delay-ms",
+                default=GeneratorOptions().retry_delay_ms,
+                type=click.IntRange(min=0),
+                help="Backoff before the first retry, doubled on every further retry",
+            ),
+            click.option(
+                "--retry-status",
+                "retry_statuses",
+                multiple=True,
+                type=int,
+                default=GeneratorOptions().retry_statuses,
+                help="Status code retried besides timeouts and network errors "
+                "(repeatable, 502 503 504 by default)",
+            ),
+        ]
+    ):
+        command = option(command)
+    return command
 
 
 # TODO: add argument for output file path
 # TODO: add strict argument with default being true  and a warning stating: "only disable if you do not control your backend code"
 @click.group()
-def cli():
-    pass
+@click.option("-q", "--quiet", is_flag=True, help="Only print warnings and errors")
+@click.option("-v", "--verbose", is_flag=True, help="Print every generated fragment")
+@click.option("--trace", is_flag=True, help="Also dump the schemas being processed")
+def cli(quiet, verbose, trace):
+    level = logging.INFO
+    if quiet:
+        level = logging.WARNING
+    if verbose:
+        level = logging.DEBUG
+    if trace:
+        level = TRACE
+    configure_logging(level)
 
 
 @click.command()
@@ -424,28 +3227,422 @@ def cli():
     type=str,
     help=f"Location of the openapi.json file (e.g. {local_openapi_json})",
 )
-def write_elm_fns(url):
+@click.option(
+    "--incremental/--no-incremental",
+    default=True,
+    help=f"Reuse unchanged fragments recorded in {manifest_file_loc}",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Compile schemas and routes in N worker processes",
+)
+@click.option(
+    "--warnings-report",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Write every warning (with its route / schema) to this json file",
+)
+@click.option(
+    "--profile", is_flag=True, help="Print time and memory spent in every stage"
+)
+@click.option(
+    "--profile-top",
+    default=10,
+    type=int,
+    help="Number of slowest schemas / routes listed by --profile",
+)
+@click.option(
+    "--profile-trace",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Also write a chrome trace-event json file (implies --profile)",
+)
+@click.option(
+    "--split-modules",
+    is_flag=True,
+    help="Write ApiGen.Types, ApiGen.Codecs and one ApiGen.<Tag> module per tag",
+)
+@decoder_style_option
+@cache_options
+@tasks_option
+@pagination_option
+@request_options
+@operation_selection_options
+def write_elm_fns(
+    url,
+    incremental,
+    jobs,
+    warnings_report,
+    profile,
+    profile_top,
+    profile_trace,
+    split_modules,
+    **selection,
+):
+    # what is left of the kwargs are the operation selection options
+    update_generator_options(**pop_configurable_options(selection))
+    profiler = None
+    if profile or profile_trace is not None:
+        profiler = StageProfiler(slowest_count=profile_top)
+        profiler.start()
     try:
-        apis = get_openapi_config(url)
-        elm_types, elm_encoder_fns, elm_decoder_fns = generate_all_elm_types(
-            apis["components"]["schemas"]
-        )
-        write_http_fns_file(
-            generate_all_elm_api_functions(apis),
-            elm_types=elm_types,
-            elm_encoder_fns=elm_encoder_fns,
-            elm_decoder_fns=elm_decoder_fns,
-            output_file="./codegen/src/ApiGen.elm",
-            open_api_version=apis["openapi"],
-            info=apis["info"],
+        apis = get_openapi_config(url, profiler=profiler)
+        with measure(profiler, "bundle"):
+            apis = bundle_external_refs(apis, get_spec_base_uri(url))
+        with measure(profiler, "tree_shake"):
+            apis = select_openapi_document(apis, **selection)
+        with measure(profiler, "manifest"):
+            manifest = load_manifest() if incremental else None
+        if split_modules:
+            written = generate_elm_modules(
+                apis,
+                src_dir="./codegen/src",
+                manifest=manifest,
+                jobs=jobs,
+                profiler=profiler,
+            )
+        else:
+            written = generate_elm_file(
+                apis,
+                output_file="./codegen/src/ApiGen.elm",
+                manifest=manifest,
+                jobs=jobs,
+                profiler=profiler,
+            )
+        written_count = sum(written.values())
+        logger.info(
+            "%d files written, %d unchanged",
+            written_count,
+            len(written) - written_count,
+            extra={"color": "blue"},
         )
+        if manifest is not None:
+            with measure(profiler, "manifest"):
+                save_manifest(manifest)
+        if warnings_report is not None:
+            write_diagnostics_report(warnings_report)
+        logger.info("%d warnings", len(current_diagnostics.get()))
         return apis  # , elm_functions
     except requests.exceptions.ConnectionError:
-        print(f"is {url} running?")
+        logger.error("is %s running?", url)
+    finally:
+        if profiler is not None:
+            profiler.stop()
+            print(profiler.summary())
+            if profile_trace is not None:
+                profiler.write_chrome_trace(profile_trace)
+
+
+def get_elm_module_file_loc(output_module: str, src_dir: str = "./codegen/src") -> str:
+    return str(pathlib.Path(src_dir, *output_module.split("."))) + ".elm"
+
+
+def generate_elm_module(service: dict[str, Any]) -> dict[str, Any]:
+    """runs the whole pipeline for one batch entry; executed inside a worker process"""
+    output_module = service["output_module"]
+    result: dict[str, Any] = {
+        "output_module": output_module,
+        "error": None,
+        "written": False,
+    }
+    start = time.perf_counter()
+    # the logging of many services interleaving is unreadable, warnings are counted instead
+    previous_level = logger.level
+    logger.setLevel(logging.CRITICAL)
+    reset_diagnostics()
+    # pool workers are reused, so every entry sets all of its options, defaults included
+    generator_options.set(
+        replace(GeneratorOptions(), **pop_configurable_options(dict(service)))
+    )
+    try:
+        apis = load_openapi_spec(
+            service["url_or_path"],
+            service.get("openapi_cache", f"./codegen/{output_module}.openapi.json"),
+        )
+        output_file = service.get(
+            "output_file", get_elm_module_file_loc(output_module)
+        )
+        apis = select_openapi_document(
+            apis,
+            include_tags=service.get("include_tags", ()),
+            exclude_tags=service.get("exclude_tags", ()),
+            path_globs=service.get("path_globs", ()),
+            operation_ids=service.get("operation_ids", ()),
+            tree_shake=service.get("tree_shake", False),
+        )
+        pathlib.Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+        result["written"] = any(
+            generate_elm_file(
+                apis, output_file=output_file, module_name=output_module
+            ).values()
+        )
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        logger.setLevel(previous_level)
+    result["warnings"] = len(current_diagnostics.get())
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def load_batch_config(config_file: str) -> list[dict[str, str]]:
+    with open(config_file, "r") as f:
+        config = json.loads(f.read())
+    services = config["services"] if isinstance(config, dict) else config
+    output_modules = set()
+    for service in services:
+        if "url_or_path" not in service or "output_module" not in service:
+            raise click.BadParameter(
+                f"every entry needs url_or_path and output_module, got {service}"
+            )
+        if service.get("decoder_style", "map") not in decoder_styles:
+            raise click.BadParameter(
+                f'decoder_style must be one of {", ".join(decoder_styles)}, got {service}'
+            )
+        if service["output_module"] in output_modules:
+            raise click.BadParameter(
+                f'{service["output_module"]} is listed more than once'
+            )
+        output_modules.add(service["output_module"])
+    return services
+
+
+@click.command()
+@click.argument("config_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-j",
+    "--workers",
+    default=None,
+    type=int,
+    help="Number of worker processes (defaults to the number of cores)",
+)
+def batch(config_file, workers):
+    """Generate one elm module per entry of CONFIG_FILE ([{url_or_path, output_module}, ...])"""
+    services = load_batch_config(config_file)
+    start = time.perf_counter()
+    results: dict[str, dict[str, Any]] = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(generate_elm_module, s) for s in services]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result["output_module"]] = result
+            status = "FAILED"
+            if result["error"] is None:
+                status = "ok" if result["written"] else "unchanged"
+            print(
+                colored(
+                    f'{status} {result["output_module"]} ({result["seconds"]:.2f}s)',
+                    "green" if result["error"] is None else "red",
+                )
+            )
+
+    print("-" * 25)
+    failures = 0
+    for service in services:
+        result = results[service["output_module"]]
+        print(
+            f'{result["output_module"]:<40} {result["seconds"]:>8.2f}s {result["warnings"]:>5} warnings'
+        )
+        if result["error"] is not None:
+            failures += 1
+            print(colored(f'\t{result["error"]}', "red"))
+    print(
+        f"{len(services) - failures}/{len(services)} specs generated in {time.perf_counter() - start:.2f}s"
+    )
+    if failures:
+        raise SystemExit(1)
+
+
+class OpenApiSpecSource:
+    """remembers what was last seen of a spec url / file so polling it only reads real changes"""
+
+    def __init__(self, url_or_path: str, timeout: float = request_timeout):
+        self.url_or_path = url_or_path
+        self.is_url = url_or_path.startswith(("http://", "https://"))
+        self.timeout = timeout
+        self.etag: str | None = None
+        self.last_modified: str | None = None
+        self.file_stat: tuple[int, int] | None = None
+        self.digest: str | None = None
+        self.reachable = True
+
+    def fetch(self) -> bytes | None:
+        conditional_headers = {}
+        if self.etag:
+            conditional_headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            conditional_headers["If-Modified-Since"] = self.last_modified
+        try:
+            resp = get_http_session().get(
+                self.url_or_path, headers=conditional_headers, timeout=self.timeout
+            )
+            resp.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            # the backend is down while it reloads, only say so once
+            if self.reachable:
+                logger.warning("could not reach %s (%s)", self.url_or_path, e)
+            self.reachable = False
+            return None
+        if not self.reachable:
+            logger.info("%s is back", self.url_or_path)
+        self.reachable = True
+        if resp.status_code == 304:
+            return None
+        self.etag = resp.headers.get("ETag")
+        self.last_modified = resp.headers.get("Last-Modified")
+        return resp.content
+
+    def read_file(self) -> bytes | None:
+        try:
+            stat = os.stat(self.url_or_path)
+        except FileNotFoundError:
+            return None
+        file_stat = (stat.st_mtime_ns, stat.st_size)
+        if file_stat == self.file_stat:
+            return None
+        self.file_stat = file_stat
+        with open(self.url_or_path, "rb") as f:
+            return f.read()
+
+    def read_if_changed(self) -> bytes | None:
+        """the raw spec when its content differs from what the last call returned"""
+        body = self.fetch() if self.is_url else self.read_file()
+        if body is None:
+            return None
+        digest = hashlib.sha256(body).hexdigest()
+        if digest == self.digest:
+            return None
+        self.digest = digest
+        return body
+
+
+def watch_openapi_spec(
+    source: OpenApiSpecSource,
+    on_change,
+    interval: float = 1.0,
+    debounce: float = 0.3,
+    stop: threading.Event | None = None,
+) -> None:
+    """polls source until stop is set, calling on_change(body) once a burst of changes settled"""
+    stop = stop or threading.Event()
+    while not stop.is_set():
+        body = source.read_if_changed()
+        if body is not None:
+            # editors and --reload servers touch the spec several times in a row
+            while not stop.wait(debounce):
+                newer_body = source.read_if_changed()
+                if newer_body is None:
+                    break
+                body = newer_body
+            if stop.is_set():
+                return
+            on_change(body)
+        stop.wait(interval)
+
+
+def regenerate_elm_file(
+    body: bytes,
+    output_file: str,
+    manifest: dict[str, Any],
+    jobs: int = 1,
+    selection: dict[str, Any] | None = None,
+    base_uri: str | None = None,
+) -> bool:
+    start = time.perf_counter()
+    try:
+        apis = parse_openapi_spec(body)
+        if base_uri is not None:
+            apis = bundle_external_refs(apis, base_uri)
+        apis = select_openapi_document(apis, **(selection or {}))
+        written = generate_elm_file(
+            apis, output_file=output_file, manifest=manifest, jobs=jobs
+        )
+    except Exception:
+        logger.exception("could not regenerate %s", output_file)
+        return False
+    logger.info(
+        "regenerated %s in %.3fs (%s, %d warnings)",
+        output_file,
+        time.perf_counter() - start,
+        "written" if any(written.values()) else "unchanged",
+        len(current_diagnostics.get()),
+        extra={"color": "green"},
+    )
+    return True
+
+
+@click.command()
+@click.option(
+    "-u",
+    "--url",
+    "url_or_path",
+    default=local_openapi_json,
+    type=str,
+    help="openapi.json url to poll or a local spec file to watch",
+)
+@click.option("-o", "--output-file", default="./codegen/src/ApiGen.elm", type=str)
+@click.option(
+    "--interval", default=1.0, type=float, help="Seconds between two polls of the spec"
+)
+@click.option(
+    "--debounce",
+    default=0.3,
+    type=float,
+    help="Wait until the spec stopped changing for this many seconds",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Compile schemas and routes in N worker processes",
+)
+@decoder_style_option
+@cache_options
+@tasks_option
+@pagination_option
+@request_options
+@operation_selection_options
+def watch(
+    url_or_path,
+    output_file,
+    interval,
+    debounce,
+    jobs,
+    **selection,
+):
+    """Regenerate the elm module whenever the spec changes"""
+    # what is left of the kwargs are the operation selection options
+    update_generator_options(**pop_configurable_options(selection))
+    # compiled fragments stay in memory between regenerations, only changes are recompiled
+    manifest = empty_manifest()
+    pathlib.Path(output_file).parent.mkdir(parents=True, exist_ok=True)
+    logger.info("watching %s", url_or_path)
+    try:
+        watch_openapi_spec(
+            OpenApiSpecSource(url_or_path),
+            functools.partial(
+                regenerate_elm_file,
+                output_file=output_file,
+                manifest=manifest,
+                jobs=jobs,
+                selection=selection,
+                base_uri=get_spec_base_uri(url_or_path),
+            ),
+            interval=interval,
+            debounce=debounce,
+        )
+    except KeyboardInterrupt:
+        pass
 
 
 def main():
     cli.add_command(write_elm_fns)
+    cli.add_command(batch)
+    cli.add_command(watch)
     cli()
 
 
@@ -523,73 +3720,168 @@ def generate_elm_prop_name(prop_name):
 
 
 def generate_elm_type_name_from_ref(ref: str) -> str:
-    return type_prefix + ref.split("/")[-1]
-
-
-# e.g. List String
-# e.g. List (List String) or List (List (String))
-def recursive_type_gen(items: dict[Any, Any], prefix: str) -> str:
-    print(colored(f"rec fn {items=}", "blue"))
-    if "$ref" in items:
-        return prefix + generate_elm_type_name_from_ref(items["$ref"])
-    if items["type"] == "array":
-        return (
-            recursive_type_gen(items["items"], prefix=prefix + f"List {open_bracket}")
-            + close_bracket
-        )
+    type_prefix = generator_options.get().type_prefix
+    return type_prefix + get_schema_name_or_last_token(ref)
+
+
+@dataclass(frozen=True, slots=True)
+class ElmTypeNode:
+    """elm type, encoder and decoder of one json schema node, computed together"""
+
+    elm_type: str
+    encoder: str
+    decoder: str
+
+
+@dataclass(frozen=True, slots=True)
+class ElmRecordField:
+    json_name: str
+    elm_name: str
+    elm_type: str
+    # elm expressions encoding ta.<elm_name> and decoding the json value
+    encoder: str
+    decoder: str
+
+
+@dataclass(frozen=True, slots=True)
+class ElmRecord:
+    type_name: str
+    fields: tuple[ElmRecordField, ...]
+    # `type X = X { .. }` instead of a type alias, elm rejects recursive type aliases
+    wrapped: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class ElmUnionVariant:
+    tag: str
+    elm_type: str
+    encoder: str
+    decoder: str
+
+
+@dataclass(frozen=True, slots=True)
+class ElmUnionType:
+    type_name: str
+    variants: tuple[ElmUnionVariant, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class ElmEncoder:
+    fn_name: str
+    target: Union[ElmRecord, ElmUnionType]
+
+
+@dataclass(frozen=True, slots=True)
+class ElmDecoder:
+    fn_name: str
+    target: Union[ElmRecord, ElmUnionType]
+
+
+@dataclass(frozen=True, slots=True)
+class ElmSchema:
+    """type alias of one component schema with the union types, encoders and decoders it needs"""
+
+    record: ElmRecord
+    union_types: tuple[ElmUnionType, ...]
+    encoders: tuple[ElmEncoder, ...]
+    decoders: tuple[ElmDecoder, ...]
+
+
+# normalized shape (elm types of the variants) -> union type, see intern_union_type
+_union_type_cache: dict[tuple[str, ...], ElmUnionType] = {}
+
+
+def intern_union_type(any_of: list[dict[Any, Any]]) -> ElmUnionType:
+    """one union type per distinct shape, named after it (e.g. UT_String_Int) so every schema and worker agrees"""
+    # elm type -> first json type giving it, repeated variants could never be told apart
+    json_types: dict[str, str] = {}
+    for variant in any_of:
+        if "type" in variant:
+            json_types.setdefault(convert_to_elm_data_type(variant["type"]), variant["type"])
+    shape = tuple(json_types)
+    union_type = _union_type_cache.get(shape)
+    if union_type is not None:
+        return union_type
+    segments = [re.sub(r"\W", "", elm_type) for elm_type in shape]
+    type_name = "_".join(["UT", *segments])
+    union_type = ElmUnionType(
+        type_name=type_name,
+        variants=tuple(
+            ElmUnionVariant(
+                tag=f"{type_name}_{segment}",
+                elm_type=elm_type,
+                encoder=convert_to_elm_encoder_type(json_types[elm_type]),
+                decoder=convert_to_elm_decoder_type(json_types[elm_type]),
+            )
+            for elm_type, segment in zip(shape, segments)
+        ),
+    )
+    _union_type_cache[shape] = union_type
+    return union_type
 
-    elm_prop_type = convert_to_elm_data_type(items["type"])
-    return f"{prefix} {open_bracket} {elm_prop_type} {close_bracket}"
 
+type_node_cache_max_size = 10_000
+_type_node_cache: dict[tuple[str, int, str, str], ElmTypeNode] = {}
 
-def elm_encoder_recursive_type_gen(items, prefix):
-    print(colored(items, "red"))
-    if "$ref" in items:
-        return prefix + generate_elm_encoder_fn_name(
-            generate_elm_type_name_from_ref(items["$ref"])
-        )
-    if items["type"] == "array":
-        return (
-            elm_encoder_recursive_type_gen(
-                items["items"], prefix=prefix + f"E.list {open_bracket}"
-            )
-            + close_bracket
-        )
-    elm_encoder_type = convert_to_elm_encoder_type(items["type"])
-    return f"{prefix} {open_bracket} {elm_encoder_type} {close_bracket}"
 
+# e.g. List String
+# e.g. List (List String) or List (List (String))
+def compile_type_node(schema: dict[Any, Any]) -> ElmTypeNode:
+    type_prefix = generator_options.get().type_prefix
+    # arrays are the only nesting, so walk down the items chain instead of recursing.
+    # the output only depends on the list depth and the leaf, which is also the memo key
+    list_depth = 0
+    node = schema
+    is_cacheable = True
+    inlined_refs: set[str] = set()
+    while True:
+        if "$ref" in node:
+            # refs to anything but a component schema have no elm type name, inline them
+            ref = node["$ref"]
+            if get_schema_name_from_ref(ref) is not None or ref in inlined_refs:
+                break
+            target = resolve_ref(ref)
+            if not isinstance(target, dict):
+                break
+            inlined_refs.add(ref)
+            node = target
+            is_cacheable = False
+        elif node.get("type") == "array":
+            list_depth += 1
+            node = node.get("items", {})
+        else:
+            break
 
-def elm_decoder_recursive_type_gen(items, prefix):
-    # print(colored(f"{items}", "red"))
-    if "$ref" in items:
-        return prefix + generate_elm_decoder_fn_name(
-            generate_elm_type_name_from_ref(items["$ref"])
-        )
-    if items["type"] == "array":
-        return (
-            elm_decoder_recursive_type_gen(
-                items["items"], prefix=prefix + f"D.list {open_bracket}"
-            )
-            + close_bracket
-        )
-    elm_decoder_type = convert_to_elm_decoder_type(items["type"])
-    return f"{prefix} {open_bracket} {elm_decoder_type} {close_bracket}"
-
-
-def generate_encoder(elm_t_name, elm_t_props, elm_t_union_types):
-    print(elm_t_props)
-    encoder_fn_def = {
-        "fn_name": f'{elm_t_name.replace(type_prefix, "api_").lower()}_encoder',
-        "args": [elm_t_name, "E.Value"],
-        "args_names": ["v"],
-        "fn_body": {
-            "encoder_list": [
-                (f'"{elm_prop_name}"', f"E.string v.{elm_prop_name}")
-                for elm_prop_name, _ in elm_t_props.items()
-            ]
-        },
-    }
-    return encoder_fn_def
+    leaf_key = (
+        ("$ref", node["$ref"]) if "$ref" in node else ("type", str(node.get("type", "")))
+    )
+    cache_key = (type_prefix, list_depth, *leaf_key)
+    if is_cacheable and cache_key in _type_node_cache:
+        return _type_node_cache[cache_key]
+
+    if "$ref" in node:
+        elm_type_name = generate_elm_type_name_from_ref(node["$ref"])
+        elm_type = elm_type_name
+        encoder = generate_elm_encoder_fn_name(elm_type_name)
+        decoder = generate_elm_decoder_fn_name(elm_type_name)
+    else:
+        json_type = node.get("type", "")
+        elm_type = f" {open_bracket} {convert_to_elm_data_type(json_type)} {close_bracket}"
+        encoder = f" {open_bracket} {convert_to_elm_encoder_type(json_type)} {close_bracket}"
+        decoder = f" {open_bracket} {convert_to_elm_decoder_type(json_type)} {close_bracket}"
+
+    closing_brackets = close_bracket * list_depth
+    type_node = ElmTypeNode(
+        elm_type=f"List {open_bracket}" * list_depth + elm_type + closing_brackets,
+        encoder=f"E.list {open_bracket}" * list_depth + encoder + closing_brackets,
+        decoder=f"D.list {open_bracket}" * list_depth + decoder + closing_brackets,
+    )
+    if not is_cacheable:
+        return type_node
+    if len(_type_node_cache) >= type_node_cache_max_size:
+        _type_node_cache.clear()
+    _type_node_cache[cache_key] = type_node
+    return type_node
 
 
 """
@@ -625,10 +3917,16 @@ def generate_elm_maybe_type(type0, type1):
 
 
 def generate_elm_encoder_fn_name(elm_type_name: str) -> str:
+    type_prefix = generator_options.get().type_prefix
     return f'{elm_type_name.replace(type_prefix, "api_").lower()}_encoder'
 
 
+def generate_elm_union_encoder_fn_name(elm_union_type_name: str) -> str:
+    return f"api_{elm_union_type_name.lower()}_encoder"
+
+
 def generate_elm_decoder_fn_name(elm_type_name: str) -> str:
+    type_prefix = generator_options.get().type_prefix
     return f'{elm_type_name.replace(type_prefix, "api_").lower()}_decoder'
 
 
@@ -636,191 +3934,138 @@ def generate_encoder_fn_name_from_schema_ref(schema_ref: str) -> str:
     return ""
 
 
+def generate_elm_ref_decoder(
+    schema_name: str, recursive_refs: frozenset[str] = frozenset()
+) -> str:
+    type_prefix = generator_options.get().type_prefix
+    elm_decoder_fn = generate_elm_decoder_fn_name(f"{type_prefix}{schema_name}")
+    if schema_name in recursive_refs:
+        # decoders of recursive models refer to each other, elm needs them to be lazy
+        return f"{open_bracket}D.lazy (\\_ -> {elm_decoder_fn}){close_bracket}"
+    return elm_decoder_fn
+
+
 def generate_elm_type_and_encoder_decoder_fn(
     schema: dict[str, Any],
-) -> tuple[
-    str,
-    dict[Any, Any],
-    list[str],
-    dict[Any, Any],
-    list[dict[Any, Any]],
-    dict[Any, Any],
-    list[dict[Any, Any]],
-]:  # tuple[Any, Any, Any, Any, Any]:
-    all_elm_union_types = []
-
-    print(colored(f"schema keys={schema.keys()}", "yellow"))
-    print(colored(f'required={schema.get("required")}', "yellow"))
+    recursive_refs: frozenset[str] = frozenset(),
+) -> ElmSchema:
+    type_prefix = generator_options.get().type_prefix
+    union_types: list[ElmUnionType] = []
+
+    logger.log(TRACE, "schema keys=%s", schema.keys())
+    logger.log(TRACE, "required=%s", schema.get("required"))
     required_: list[str] = [k for k, _ in schema["properties"].items()]
     if "required" in schema:
         required_ = schema["required"]
     required = set(required_)
 
-    elm_type_args_dict = {}
     elm_type_name = f'{type_prefix}{schema["title"]}'
-    all_elm_union_encoders: list[dict[Any, Any]] = []
-    elm_encoder_fn_def: dict[Any, Any] = {
-        "fn_name": generate_elm_encoder_fn_name(elm_type_name),
-        "args": [elm_type_name],
-        "encoder_type": "type_alias",
-        "args_output": "E.Value",
-        "args_names": ["ta"],
-        "fn_body": {"encoder_list": []},
-    }
-
-    # TODO: look at the args, and args_names list, does this structure suit it better: args: [{"elm_type": "", "name": ""}}?
-    all_elm_union_decoders: list[dict[Any, Any]] = []
-    elm_decoder_fn_def: dict[Any, Any] = {
-        "fn_name": generate_elm_decoder_fn_name(elm_type_name),
-        "args": [],
-        "decoder_type": "type_alias",
-        "args_output": f"D.Decoder {elm_type_name}",
-        "args_names": [],
-        "fn_body": {"decoder_list": []},
-    }
-
+    fields: list[ElmRecordField] = []
     for prop_name, prop_metadata in schema["properties"].items():
         is_required = prop_name in required
-        print(prop_name, "===", prop_metadata)
+        logger.log(TRACE, "%s === %s", prop_name, prop_metadata)
         elm_prop_name = generate_elm_prop_name(prop_name)
-        elm_encoder_tuple = [f'"{prop_name}"', 'E.string "UNKN"']
-        elm_decoder_tuple = [f'"{prop_name}"', "(D.string)"]
+        elm_encoder = 'E.string "UNKN"'
+        elm_decoder = "(D.string)"
 
         if "type" in prop_metadata:
             prop_type = prop_metadata["type"]
-            # print(f'{prop_type=}')
             elm_prop_type = convert_to_elm_data_type(prop_type)
-            elm_encoder_tuple[1] = (
-                f"{convert_to_elm_encoder_type(prop_type)} ta.{elm_prop_name}"
-            )
-            elm_decoder_tuple[1] = f"{convert_to_elm_decoder_type(prop_type)}"
+            elm_encoder = f"{convert_to_elm_encoder_type(prop_type)} ta.{elm_prop_name}"
+            elm_decoder = f"{convert_to_elm_decoder_type(prop_type)}"
 
             if prop_type == "array":
                 if "type" in prop_metadata["items"]:
-                    elm_recursed_type_gen = recursive_type_gen(
-                        prop_metadata["items"], prefix=f"List {open_bracket}"
-                    ) + close_bracket
-                    elm_rtg_encoder = (
-                        elm_encoder_recursive_type_gen(
-                            prop_metadata["items"], prefix=f"E.list {open_bracket}"
-                        )
-                        + close_bracket
+                    items_node = compile_type_node(prop_metadata["items"])
+                    elm_prop_type = (
+                        f"List {open_bracket}{items_node.elm_type}{close_bracket}"
                     )
-                    # list_type = convert_to_elm_data_type(prop_metadata["items"]["type"])
-                    elm_prop_type = elm_recursed_type_gen
-                    elm_encoder_tuple[1] = elm_rtg_encoder + f" ta.{elm_prop_name}"
-                    elm_decoder_tuple[1] = (
-                        elm_decoder_recursive_type_gen(
-                            prop_metadata["items"], prefix=f"D.list {open_bracket} "
-                        )
-                        + close_bracket
+                    elm_encoder = f"E.list {open_bracket}{items_node.encoder}{close_bracket} ta.{elm_prop_name}"
+                    elm_decoder = (
+                        f"D.list {open_bracket} {items_node.decoder}{close_bracket}"
                     )
                 elif "anyOf" in prop_metadata["items"]:
-                    elm_union_type_name = f"UT_{elm_prop_name}"
-                    # TODO: implement case expression for ut encoder func
-                    ut_encoder_fn: dict[str, Any] = {
-                        "fn_name": f"api_{elm_union_type_name.lower()}_encoder",
-                        "args": [elm_union_type_name],
-                        "encoder_type": "union_type",
-                        "args_output": "E.Value",
-                        "args_names": ["ut"],
-                        "fn_body": {"encoder_list": [f"{tab}case ut of"]},
-                    }
-                    ut_decoder_fn: dict[str, Any] = {
-                        "fn_name": generate_elm_decoder_fn_name(elm_union_type_name),
-                        "args": [],
-                        "decoder_type": "union_type",
-                        "args_output": f"D.Decoder {elm_union_type_name}",
-                        "args_names": [],
-                        "fn_body": {"decoder_list": []},
-                    }
-                    # TODO: generate a union type and insert it into type array
-                    union_types = []
-                    for i, ut in enumerate(prop_metadata["items"]["anyOf"]):
-                        if "type" in ut:
-                            elm_ut_arg = convert_to_elm_data_type(ut["type"])
-                            union_types.append(f"UTArg{i} {elm_ut_arg}")
-                            ut_encoder_fn["fn_body"]["encoder_list"].append(
-                                f'{tab}{tab}UTArg{i} v -> {convert_to_elm_encoder_type(ut["type"])} v'
-                            )
-                            ut_decoder_fn["fn_body"]["decoder_list"].append(
-                                f'D.map UTArg{i} {convert_to_elm_decoder_type(ut["type"])}'
-                            )
-
-                    # print(colored(ut_encoder_fn, 'red'))
-                    union_type_gen = f"type {elm_union_type_name}\n{tab}= "
-                    union_type_gen += f"\n{tab}| ".join(union_types)
-                    print(colored(union_type_gen, "yellow"))
-                    all_elm_union_types.append(union_type_gen)
-                    elm_prop_type = f"List {elm_union_type_name}"
-
-                    all_elm_union_encoders.append(ut_encoder_fn)
-                    all_elm_union_decoders.append(ut_decoder_fn)
-
-                    elm_encoder_tuple[1] = (
-                        f'E.list {ut_encoder_fn["fn_name"]} ta.{elm_prop_name}'
-                    )
-                    elm_decoder_tuple[1] = f'(D.list ({ut_decoder_fn["fn_name"]}))'
+                    union_type = intern_union_type(prop_metadata["items"]["anyOf"])
+                    logger.log(TRACE, "%s", union_type)
+                    if union_type not in union_types:
+                        union_types.append(union_type)
+                    elm_prop_type = f"List {union_type.type_name}"
+                    elm_encoder = f"E.list {generate_elm_union_encoder_fn_name(union_type.type_name)} ta.{elm_prop_name}"
+                    elm_decoder = f"(D.list ({generate_elm_decoder_fn_name(union_type.type_name)}))"
 
                 elif "$ref" in prop_metadata["items"]:
                     # assume type alias for ref is created - might not even need topological sort - elm compiler could handle it for me
-                    reference = prop_metadata["items"]["$ref"].split("/")[-1]
+                    reference = get_schema_name_or_last_token(
+                        prop_metadata["items"]["$ref"]
+                    )
                     ref_type_name = f"{type_prefix}{reference}"
                     elm_prop_type = f"List {ref_type_name}"
-
-                    # assume encoder function exists. what is the name?
-                    ref_encoder_fn_name = (
-                        f'{ref_type_name.replace(type_prefix, "api_").lower()}_encoder'
-                    )
-
-                    elm_encoder_tuple[1] = (
-                        f"E.list ({ref_encoder_fn_name}) ta.{elm_prop_name}"
-                    )
-                    elm_decoder_tuple[1] = (
-                        f"(D.list {generate_elm_decoder_fn_name(ref_type_name)})"
+                    elm_encoder = f"E.list ({generate_elm_encoder_fn_name(ref_type_name)}) ta.{elm_prop_name}"
+                    elm_decoder = (
+                        f"(D.list {generate_elm_ref_decoder(reference, recursive_refs)})"
                     )
         elif "$ref" in prop_metadata:
-            reference = prop_metadata["$ref"].split("/")[-1]
+            reference = get_schema_name_or_last_token(prop_metadata["$ref"])
             ref_type_name = f"{type_prefix}{reference}"
             elm_prop_type = f"{ref_type_name}"
-
-            ref_encoder_fn_name = (
-                f'{ref_type_name.replace(type_prefix, "api_").lower()}_encoder'
-            )
-            elm_encoder_tuple[1] = f"{ref_encoder_fn_name} ta.{elm_prop_name}"
-            elm_decoder_tuple[1] = generate_elm_decoder_fn_name(elm_prop_type)
+            elm_encoder = f"{generate_elm_encoder_fn_name(ref_type_name)} ta.{elm_prop_name}"
+            elm_decoder = generate_elm_ref_decoder(reference, recursive_refs)
         elif "anyOf" in prop_metadata and len(prop_metadata) == 2:
             type0 = prop_metadata["anyOf"][0]["type"]
             type1 = prop_metadata["anyOf"][1]["type"]
             if type0 == "null" or type1 == "null":
                 # Optional type used
-                # print(colored('generating Optional Type', 'yellow'))
                 elm_prop_type = generate_elm_maybe_type(type0, type1)
                 elm_encoder_type = generate_elm_maybe_encoder(type0, type1)
-                elm_encoder_tuple[1] = f"{elm_encoder_type} ta.{elm_prop_name}"
-                elm_decoder_tuple[1] = generate_elm_maybe_decoder(type0, type1)
+                elm_encoder = f"{elm_encoder_type} ta.{elm_prop_name}"
+                elm_decoder = generate_elm_maybe_decoder(type0, type1)
             else:
-                print(colored("TODO: account for anyOf length > 2", "red"))
+                report_issue(
+                    "unsupported_any_of",
+                    "TODO: account for anyOf length > 2 (%s)",
+                    prop_name,
+                    property=prop_name,
+                )
                 elm_prop_type = "UNKN"
         else:
-            print(colored(f"proptye not found for {prop_name=}", "red"))
+            report_issue(
+                "unknown_property_type",
+                "proptye not found for prop_name=%s",
+                prop_name,
+                property=prop_name,
+            )
             elm_prop_type = "UNKN"
-        if is_required:
-            elm_type_args_dict[elm_prop_name] = elm_prop_type
-        else:
-            # TODO: figure out what to do with default values
-            elm_type_args_dict[elm_prop_name] = f"{elm_prop_type}"
-        elm_encoder_fn_def["fn_body"]["encoder_list"].append(elm_encoder_tuple)
-        elm_decoder_fn_def["fn_body"]["decoder_list"].append(elm_decoder_tuple)
+        # TODO: figure out what to do with default values of props that are not is_required
+        fields.append(
+            ElmRecordField(
+                json_name=prop_name,
+                elm_name=elm_prop_name,
+                elm_type=elm_prop_type,
+                encoder=elm_encoder,
+                decoder=elm_decoder,
+            )
+        )
 
-    return (
-        elm_type_name,
-        elm_type_args_dict,
-        all_elm_union_types,
-        elm_encoder_fn_def,
-        all_elm_union_encoders,
-        elm_decoder_fn_def,
-        all_elm_union_decoders,
+    record = ElmRecord(
+        type_name=elm_type_name, fields=tuple(fields), wrapped=bool(recursive_refs)
+    )
+    return ElmSchema(
+        record=record,
+        union_types=tuple(union_types),
+        encoders=(
+            ElmEncoder(generate_elm_encoder_fn_name(elm_type_name), record),
+            *(
+                ElmEncoder(generate_elm_union_encoder_fn_name(ut.type_name), ut)
+                for ut in union_types
+            ),
+        ),
+        decoders=(
+            ElmDecoder(generate_elm_decoder_fn_name(elm_type_name), record),
+            *(
+                ElmDecoder(generate_elm_decoder_fn_name(ut.type_name), ut)
+                for ut in union_types
+            ),
+        ),
     )
 
 
@@ -854,131 +4099,289 @@ api_httpvalidationerror_decoder =
 """
 
 
-def format_elm_decoder_fn(decoder_fn_def: dict[Any, Any]) -> str:
-    if decoder_fn_def["decoder_type"] == "type_alias":
-        decoder_type = decoder_fn_def["args_output"].replace("D.Decoder ", "").strip()
-        decoder_list = f"D.succeed {decoder_type}\n{tab}{tab}" + f"\n{tab}{tab}".join(
+def format_elm_record_constructor(record: ElmRecord) -> str:
+    """the function decoders apply to the decoded fields, in field order"""
+    if not record.wrapped:
+        return record.type_name
+    # a wrapped record has no record constructor; positional names can't shadow anything
+    args = [f"field_{index}" for index in range(len(record.fields))]
+    assignments = ", ".join(
+        f"{field.elm_name} = {arg}" for field, arg in zip(record.fields, args)
+    )
+    return f"(\\{' '.join(args)} -> {record.type_name} {{ {assignments} }})"
+
+
+def format_elm_record_map_decoder(record: ElmRecord, tab: str) -> str:
+    """D.map..D.map8 over the fields; wider records apply the constructor 8 fields at a
+    time, D.andThen handing the partially applied constructor to the next D.mapN"""
+    fields = record.fields
+    if not fields:
+        return f"D.succeed {record.type_name}"
+    stages = []
+    for start in range(0, len(fields), max_map_arity):
+        group = fields[start : start + max_map_arity]
+        map_fn = "D.map" if len(group) == 1 else f"D.map{len(group)}"
+        indent = f"\n{tab * 2}" if start == 0 else f"\n{tab * 5}"
+        field_decoders = "".join(
+            f'{indent}(D.field "{field.json_name}" {field.decoder})'
+            if " " not in field.decoder or field.decoder[0] == "("
+            else f'{indent}(D.field "{field.json_name}" ({field.decoder}))'
+            for field in group
+        )
+        if start == 0:
+            constructor = format_elm_record_constructor(record)
+            stages.append(f"{map_fn} {constructor}{field_decoders}")
+        else:
+            stages.append(
+                f"\n{tab * 2}|> D.andThen\n{tab * 3}(\\ctor ->\n{tab * 4}"
+                f"{map_fn} ctor{field_decoders}\n{tab * 3})"
+            )
+    return "".join(stages)
+
+
+def format_elm_decoder_fn(decoder_fn: ElmDecoder) -> str:
+    tab = generator_options.get().tab
+    target = decoder_fn.target
+    if isinstance(target, ElmRecord) and generator_options.get().decoder_style == "map":
+        return (
+            f"{decoder_fn.fn_name} : D.Decoder {target.type_name}\n"
+            f"{decoder_fn.fn_name} =\n{tab}{format_elm_record_map_decoder(target, tab)}"
+        )
+    if isinstance(target, ElmRecord):
+        constructor = format_elm_record_constructor(target)
+        decoder_list = f"D.succeed {constructor}\n{tab}{tab}" + f"\n{tab}{tab}".join(
             [
-                f"|> JDP.required {prop_name} ({prop_val})"
-                for prop_name, prop_val in decoder_fn_def["fn_body"]["decoder_list"]
+                f'|> JDP.required "{field.json_name}" ({field.decoder})'
+                for field in target.fields
             ]
         )
 
         return f"""
-{decoder_fn_def["fn_name"]} : {decoder_fn_def["args_output"]}
-{decoder_fn_def["fn_name"]} = 
+{decoder_fn.fn_name} : D.Decoder {target.type_name}
+{decoder_fn.fn_name} = 
 {tab} {decoder_list} 
 """.strip()
 
-    decoder_list = ", ".join(decoder_fn_def["fn_body"]["decoder_list"])
+    decoder_list = ", ".join(
+        [f"D.map {variant.tag} {variant.decoder}" for variant in target.variants]
+    )
     return f"""
-{decoder_fn_def["fn_name"]} : {decoder_fn_def["args_output"]}
-{decoder_fn_def["fn_name"]} = 
+{decoder_fn.fn_name} : D.Decoder {target.type_name}
+{decoder_fn.fn_name} = 
     D.oneOf [{decoder_list}]
 
     """.strip()
 
 
-def format_elm_encoder_fn(encoder_fn_def):
-    fn_args = " -> ".join(encoder_fn_def["args"])
-    fn_args_names = " ".join(encoder_fn_def["args_names"])
-    if encoder_fn_def["encoder_type"] == "type_alias":
+def format_elm_encoder_fn(encoder_fn: ElmEncoder) -> str:
+    tab = generator_options.get().tab
+    target = encoder_fn.target
+    if isinstance(target, ElmRecord):
         encoder_list = f"\n{tab}{tab}{open_square_bracket} " + f"\n{tab}{tab}, ".join(
-            [
-                f"({prop_name}, {prop_val})"
-                for prop_name, prop_val in encoder_fn_def["fn_body"]["encoder_list"]
-            ]
+            [f'("{field.json_name}", {field.encoder})' for field in target.fields]
         )
         encoder_list += f"\n{tab}{tab}]"
+        argument = f"({target.type_name} ta)" if target.wrapped else "ta"
 
         return f"""
-{encoder_fn_def["fn_name"]} : {fn_args} -> {encoder_fn_def["args_output"]}
-{encoder_fn_def["fn_name"]} {fn_args_names} = 
+{encoder_fn.fn_name} : {target.type_name} -> E.Value
+{encoder_fn.fn_name} {argument} = 
 {tab} E.object {encoder_list}
 """.strip()
 
-    encoder_list = "\n".join(encoder_fn_def["fn_body"]["encoder_list"])
+    encoder_list = "\n".join(
+        [f"{tab}case ut of"]
+        + [
+            f"{tab}{tab}{variant.tag} v -> {variant.encoder} v"
+            for variant in target.variants
+        ]
+    )
     return f"""
-{encoder_fn_def["fn_name"]} : {fn_args} -> {encoder_fn_def["args_output"]}
-{encoder_fn_def["fn_name"]} {fn_args_names} = 
+{encoder_fn.fn_name} : {target.type_name} -> E.Value
+{encoder_fn.fn_name} ut = 
 {encoder_list}
 
     """.strip()
 
 
-def format_elm_types(
-    elm_type_name: str,
-    elm_type_args_dict: dict[str, Any],
-    all_elm_union_types: list[str],
-) -> str:
-    elm_type_args_tuple = [(k, v) for k, v in elm_type_args_dict.items()]
-    first_type_arg = elm_type_args_tuple[0]
+def format_elm_union_type(union_type: ElmUnionType) -> str:
+    tab = generator_options.get().tab
+    return f"type {union_type.type_name}\n{tab}= " + f"\n{tab}| ".join(
+        [f"{variant.tag} {variant.elm_type}" for variant in union_type.variants]
+    )
+
 
-    elm_type_args = "{ " + f"{first_type_arg[0]}: {first_type_arg[1]}\n"
-    if len(elm_type_args_tuple) >= 2:
-        elm_type_args += f"{tab}, "
-        elm_type_args += f"{tab}, ".join(
-            [f"{p}: {pt}\n" for p, pt in elm_type_args_tuple[1:]]
+def format_elm_types(record: ElmRecord, union_types: Iterable[ElmUnionType]) -> str:
+    tab = generator_options.get().tab
+    indent = tab * 2 if record.wrapped else tab
+    first_field = record.fields[0]
+
+    elm_type_args = "{ " + f"{first_field.elm_name}: {first_field.elm_type}\n"
+    if len(record.fields) >= 2:
+        elm_type_args += f"{indent}, "
+        elm_type_args += f"{indent}, ".join(
+            [f"{field.elm_name}: {field.elm_type}\n" for field in record.fields[1:]]
         )
-    elm_type_args += tab + "}"
+    elm_type_args += indent + "}"
 
-    all_elm_union_types_str = "\n\n".join(all_elm_union_types)
+    all_elm_union_types_str = "\n\n".join(
+        [format_elm_union_type(union_type) for union_type in union_types]
+    )
 
-    return f"""{all_elm_union_types_str}\n\ntype alias {elm_type_name} =\n{tab}{elm_type_args}\n""".strip()
+    if record.wrapped:
+        declaration = f"type {record.type_name}\n{tab}= {record.type_name}\n{indent}{elm_type_args}"
+    else:
+        declaration = f"type alias {record.type_name} =\n{tab}{elm_type_args}"
+    return f"""{all_elm_union_types_str}\n\n{declaration}\n""".strip()
 
 
-def generate_all_elm_types(
+def compile_elm_schema(
+    schema_props: dict[Any, Any], recursive_refs: frozenset[str] = frozenset()
+) -> tuple[str, list[str], list[str], list[list[str]]]:
+    """type alias, encoder and decoder of the schema plus [name, type, encoder, decoder] per union type it uses"""
+    with diagnostic_scope(schema=schema_props.get("title")):
+        elm_schema = generate_elm_type_and_encoder_decoder_fn(
+            schema_props, recursive_refs
+        )
+    elm_type_alias = format_elm_types(elm_schema.record, ())
+    record_encoder, *union_encoders = elm_schema.encoders
+    record_decoder, *union_decoders = elm_schema.decoders
+    elm_union_types = [
+        [
+            union_type.type_name,
+            format_elm_union_type(union_type),
+            format_elm_encoder_fn(union_encoder),
+            format_elm_decoder_fn(union_decoder),
+        ]
+        for union_type, union_encoder, union_decoder in zip(
+            elm_schema.union_types, union_encoders, union_decoders
+        )
+    ]
+
+    logger.log(TRACE, "%s", elm_type_alias, extra={"color": "green"})
+    return (
+        elm_type_alias,
+        [format_elm_encoder_fn(record_encoder)],
+        [format_elm_decoder_fn(record_decoder)],
+        elm_union_types,
+    )
+
+
+def add_interned_union_types(
+    elm_type_alias: str,
+    elm_encoder_fns: list[str],
+    elm_decoder_fns: list[str],
+    elm_union_types: list[list[str]],
+    emitted_union_types: set[str],
+) -> tuple[str, list[str], list[str]]:
+    """puts the union types not emitted yet in front of the schema's fragments"""
+    new_union_types = [ut for ut in elm_union_types if ut[0] not in emitted_union_types]
+    emitted_union_types.update(ut[0] for ut in new_union_types)
+    return (
+        "\n\n".join([*(ut[1] for ut in new_union_types), elm_type_alias]),
+        [*elm_encoder_fns, *(ut[2] for ut in new_union_types)],
+        [*elm_decoder_fns, *(ut[3] for ut in new_union_types)],
+    )
+
+
+def iter_elm_schema_fragments(
     schemas: dict[Any, Any],
-) -> tuple[list[Any], list[Any], list[Any]]:
-    print(colored("Assume every property is required", "red"))
-    print(
-        colored(
-            "Assume pyton class name and elm type alias names are the same structure",
-            "red",
+    manifest: dict[str, Any] | None = None,
+    jobs: int = 1,
+    profiler: StageProfiler | None = None,
+) -> Iterator[tuple[str, list[str], list[str]]]:
+    """yields (type alias, encoders, decoders) per schema, dependencies first"""
+    diagnostics = current_diagnostics.get()
+    logger.info("Assume every property is required")
+    logger.info(
+        "Assume pyton class name and elm type alias names are the same structure"
+    )
+    with measure(profiler, "schema_order"):
+        schema_order, recursive_schemas = topological_schema_order(schemas)
+    for schema_name in recursive_schemas:
+        report_issue(
+            "recursive_schema",
+            "%s is recursive, generated as a custom type wrapping its record",
+            schema_name,
+            schema=schema_name,
         )
+    cached_schemas = manifest["schemas"] if manifest is not None else {}
+    compiled_schemas = {}
+    schema_hashes = {}
+    if manifest is not None:
+        for schema_name in schema_order:
+            with measure(profiler, "fingerprint"):
+                schema_hash = fingerprint_fragment_inputs(schemas[schema_name], schemas)
+            schema_hashes[schema_name] = schema_hash
+            cached = cached_schemas.get(schema_name)
+            if cached is not None and cached["hash"] == schema_hash:
+                compiled_schemas[schema_name] = cached
+
+    uncompiled = [name for name in schema_order if name not in compiled_schemas]
+    compiled = imap_in_order(
+        compile_elm_schema,
+        [schemas[name] for name in uncompiled],
+        [recursive_schemas.get(name, frozenset()) for name in uncompiled],
+        jobs=jobs,
     )
+    # union types are named after their shape, the first schema using one emits it
+    emitted_union_types: set[str] = set()
+    for schema_name in schema_order:
+        if schema_name in compiled_schemas:
+            cached = compiled_schemas[schema_name]
+            diagnostics.extend(cached.get("issues", []))
+            yield add_interned_union_types(
+                cached["type_alias"],
+                cached["encoders"],
+                cached["decoders"],
+                cached.get("union_types", []),
+                emitted_union_types,
+            )
+            continue
+        issues_start = len(diagnostics)
+        with measure(profiler, "types", schema_name):
+            elm_type_alias, elm_encoder_fns, elm_decoder_fns, elm_union_types = next(
+                compiled
+            )
+        if manifest is not None:
+            compiled_schemas[schema_name] = {
+                "hash": schema_hashes[schema_name],
+                "type_alias": elm_type_alias,
+                "encoders": elm_encoder_fns,
+                "decoders": elm_decoder_fns,
+                "union_types": elm_union_types,
+                "issues": diagnostics[issues_start:],
+            }
+        yield add_interned_union_types(
+            elm_type_alias,
+            elm_encoder_fns,
+            elm_decoder_fns,
+            elm_union_types,
+            emitted_union_types,
+        )
+    if manifest is not None:
+        manifest["schemas"] = {name: compiled_schemas[name] for name in schema_order}
+
+
+def generate_all_elm_types(
+    schemas: dict[Any, Any],
+    manifest: dict[str, Any] | None = None,
+    jobs: int = 1,
+) -> tuple[list[Any], list[Any], list[Any]]:
     all_elm_type_alias: list[str] = []
     all_elm_encoder_fns: list[str] = []
     all_elm_decoder_fns: list[str] = []
-    for schema_name, schema_props in schemas.items():
-        (
-            elm_type_name,
-            elm_type_props_dict,
-            all_elm_union_types,
-            elm_encoder_fn,
-            all_elm_union_encoders,
-            elm_decoder_fn,
-            all_elm_union_decoders,
-        ) = generate_elm_type_and_encoder_decoder_fn(schema_props)
-        elm_type_alias = format_elm_types(
-            elm_type_name, elm_type_props_dict, all_elm_union_types
-        )
-        all_elm_encoder_fns.append(format_elm_encoder_fn(elm_encoder_fn))
-        for ute in all_elm_union_encoders:
-            all_elm_encoder_fns.append(format_elm_encoder_fn(ute))
-
-        all_elm_decoder_fns.append(format_elm_decoder_fn(elm_decoder_fn))
-        for utd in all_elm_union_decoders:
-            all_elm_decoder_fns.append(format_elm_decoder_fn(utd))
-
-        print(colored(elm_type_alias, "green"))
-        print("-" * 20)
+    for elm_type_alias, elm_encoder_fns, elm_decoder_fns in iter_elm_schema_fragments(
+        schemas, manifest=manifest, jobs=jobs
+    ):
         all_elm_type_alias.append(elm_type_alias)
+        all_elm_encoder_fns.extend(elm_encoder_fns)
+        all_elm_decoder_fns.extend(elm_decoder_fns)
     return all_elm_type_alias, all_elm_encoder_fns, all_elm_decoder_fns
 
 
 if __name__ == "__main__":
+    configure_logging()
     url = local_openapi_json
     apis = get_openapi_config(url)
-    elm_types, elm_encoder_fns, elm_decoder_fns = generate_all_elm_types(
-        apis["components"]["schemas"]
-    )
-    write_http_fns_file(
-        generate_all_elm_api_functions(apis),
-        elm_types=elm_types,
-        elm_encoder_fns=elm_encoder_fns,
-        elm_decoder_fns=elm_decoder_fns,
-        output_file="./codegen/src/ApiGen.elm",
-        open_api_version=apis["openapi"],
-        info=apis["info"],
-    )
+    generate_elm_file(apis, output_file="./codegen/src/ApiGen.elm")
@@ -15,9 +15,10 @@ with open("requirements.txt", "r", encoding="utf-8") as fh:
         long_description=long_description,
         long_description_content_type="text/markdown",
         url="https://github.com/Farooq-azam-khan/elm-api-functions-code-gen",
-        py_modules=["get_all_routes"],
+        py_modules=["get_all_routes", "codegen_profile"],
         packages=find_packages(),
         install_requires=[requirements],
+        extras_require={"fast": ["orjson"], "yaml": ["pyyaml"]},
         python_requires=">=3.12",
         classifiers=[
             "Programming Language :: Python :: 3.8",
@@ -0,0 +1,216 @@
+import json
+import random
+from typing import Any
+
+import click
+
+primitive_types = ["string", "integer", "number", "boolean"]
+
+
+def validation_error_schemas() -> dict[str, Any]:
+    return {
+        "HTTPValidationError": {
+            "title": "HTTPValidationError",
+            "type": "object",
+            "properties": {
+                "detail": {
+                    "title": "Detail",
+                    "type": "array",
+                    "items": {"$ref": "#/components/schemas/ValidationError"},
+                }
+            },
+        },
+        "ValidationError": {
+            "title": "ValidationError",
+            "type": "object",
+            "required": ["loc", "msg", "type"],
+            "properties": {
+                "loc": {
+                    "title": "Location",
+                    "type": "array",
+                    "items": {"anyOf": [{"type": "string"}, {"type": "integer"}]},
+                },
+                "msg": {"title": "Message", "type": "string"},
+                "type": {"title": "Error Type", "type": "string"},
+            },
+        },
+    }
+
+
+def nested_array(items: dict[str, Any], depth: int) -> dict[str, Any]:
+    for _ in range(depth):
+        items = {"type": "array", "items": items}
+    return items
+
+
+def synthetic_schema(
+    rng: random.Random,
+    schema_name: str,
+    earlier_schemas: list[str],
+    properties: int,
+    nesting_depth: int,
+    any_of_ratio: float,
+    ref_fan_out: int,
+) -> dict[str, Any]:
+    schema_properties: dict[str, Any] = {}
+    for i in range(properties):
+        roll = rng.random()
+        if roll < any_of_ratio / 2:
+            schema_properties[f"optional_{i}"] = {
+                "anyOf": [{"type": rng.choice(primitive_types)}, {"type": "null"}],
+                "title": f"Optional {i}",
+            }
+        elif roll < any_of_ratio:
+            schema_properties[f"union_{i}"] = {
+                "title": f"Union {i}",
+                "type": "array",
+                "items": {"anyOf": rng.sample(primitive_types, 2)},
+            }
+        elif roll < 0.8:
+            schema_properties[f"field_{i}"] = nested_array(
+                {"type": rng.choice(primitive_types)}, rng.randint(0, nesting_depth)
+            )
+        else:
+            schema_properties[f"list_{i}"] = nested_array(
+                {"type": rng.choice(primitive_types)}, max(1, nesting_depth)
+            )
+    # refs only point at earlier schemas so the synthetic models stay acyclic
+    for i, ref_name in enumerate(
+        rng.sample(earlier_schemas, min(ref_fan_out, len(earlier_schemas)))
+    ):
+        ref = {"$ref": f"#/components/schemas/{ref_name}"}
+        if i % 2 == 0:
+            schema_properties[f"ref_{i}"] = ref
+        else:
+            schema_properties[f"refs_{i}"] = {"type": "array", "items": ref}
+    return {
+        "title": schema_name,
+        "type": "object",
+        "required": sorted(schema_properties)[: len(schema_properties) // 2],
+        "properties": schema_properties,
+    }
+
+
+def synthetic_operation(
+    rng: random.Random,
+    operation_id: str,
+    method: str,
+    path_params: list[str],
+    schema_names: list[str],
+) -> dict[str, Any]:
+    response_ref = {"$ref": f"#/components/schemas/{rng.choice(schema_names)}"}
+    operation: dict[str, Any] = {
+        "tags": [f"Tag{rng.randint(0, 9)}"],
+        "operationId": operation_id,
+        "parameters": [
+            {
+                "name": param,
+                "in": "path",
+                "required": True,
+                "schema": {"type": "string", "title": param.title()},
+            }
+            for param in path_params
+        ],
+        "responses": {
+            "200": {
+                "description": "Successful Response",
+                "content": {
+                    "application/json": {
+                        "schema": response_ref
+                        if rng.random() < 0.5
+                        else {"type": "array", "items": response_ref}
+                    }
+                },
+            },
+            "422": {
+                "description": "Validation Error",
+                "content": {
+                    "application/json": {
+                        "schema": {"$ref": "#/components/schemas/HTTPValidationError"}
+                    }
+                },
+            },
+        },
+    }
+    if method in ("post", "put", "patch"):
+        operation["requestBody"] = {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "$ref": f"#/components/schemas/{rng.choice(schema_names)}"
+                    }
+                }
+            },
+        }
+    return operation
+
+
+def generate_synthetic_spec(
+    paths: int = 10,
+    schemas: int = 10,
+    properties: int = 6,
+    nesting_depth: int = 2,
+    any_of_ratio: float = 0.2,
+    path_params: int = 1,
+    ref_fan_out: int = 2,
+    seed: int = 0,
+) -> dict[str, Any]:
+    """deterministic fastapi style openapi.json, the same knobs always give the same spec"""
+    rng = random.Random(seed)
+    component_schemas = validation_error_schemas()
+    schema_names: list[str] = []
+    for i in range(schemas):
+        schema_name = f"Model{i}"
+        component_schemas[schema_name] = synthetic_schema(
+            rng,
+            schema_name,
+            schema_names,
+            properties,
+            nesting_depth,
+            any_of_ratio,
+            ref_fan_out,
+        )
+        schema_names.append(schema_name)
+
+    spec_paths: dict[str, Any] = {}
+    for i in range(paths):
+        params = [f"param_{p}" for p in range(rng.randint(0, path_params))]
+        route = f"/api/resource{i}" + "".join(f"/{{{param}}}" for param in params)
+        methods = rng.sample(["get", "post", "put", "delete"], rng.randint(1, 2))
+        spec_paths[route] = {
+            method: synthetic_operation(
+                rng,
+                f"resource{i}_api_resource{i}_{method}",
+                method,
+                params,
+                schema_names or ["HTTPValidationError"],
+            )
+            for method in methods
+        }
+
+    return {
+        "openapi": "3.1.0",
+        "info": {"title": "Synthetic", "version": "0.1.0"},
+        "paths": spec_paths,
+        "components": {"schemas": component_schemas},
+    }
+
+
+@click.command()
+@click.option("--paths", default=10, type=int)
+@click.option("--schemas", default=10, type=int)
+@click.option("--properties", default=6, type=int)
+@click.option("--nesting-depth", default=2, type=int)
+@click.option("--any-of-ratio", default=0.2, type=float)
+@click.option("--path-params", default=1, type=int)
+@click.option("--ref-fan-out", default=2, type=int)
+@click.option("--seed", default=0, type=int)
+@click.option("-o", "--output", default="-", type=click.File("w"))
+def main(output, **knobs):
+    """Write a synthetic openapi.json for benchmarking"""
+    output.write(json.dumps(generate_synthetic_spec(**knobs), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,63 @@
-from get_all_routes import add_url_parameters_to_fn, format_api_fn
+import gzip
+import json
+import os
+import pathlib
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+
+import get_all_routes
+from get_all_routes import (
+    ChangeAwareFile,
+    ElmOperation,
+    ElmParam,
+    ElmRecord,
+    GeneratorOptions,
+    FragmentSpool,
+    OpenApiSpecSource,
+    add_url_parameters_to_fn,
+    compile_type_node,
+    configurable_options,
+    diagnostics,
+    empty_manifest,
+    format_api_fn,
+    generate,
+    generate_all_elm_api_functions,
+    generate_all_elm_types,
+    generate_elm_file,
+    generate_elm_module,
+    generate_elm_modules,
+    generate_elm_type_and_encoder_decoder_fn,
+    get_openapi_config,
+    index_openapi_document,
+    pop_configurable_options,
+    read_openapi_file,
+    resolve_ref,
+    select_openapi_document,
+    topological_schema_order,
+    watch_openapi_spec,
+    write_elm_fns,
+    write_http_fns_file,
+)
+from codegen_profile import StageProfiler
+from synthetic_spec import generate_synthetic_spec
+
+fastapi_example = pathlib.Path(__file__).parent / "examples" / "fastapi-openapi.json"
 
 
 def test_fn_definition_outputs_correct_string_output():
-    elm_fn_definition_dict = {
-        "fn_name": "mode_api_mode_get",
-        "args": ["(WebData a -> msg)", "D.Decoder a"],
-        "args_names": ["msg", "decoder"],
-        "output_arg": "Cmd msg",
-        "fn_body": {
-            "route": '"/api/mode"',
-            "http_method": "get",
-            "http_builder_fns": [
-                "        |> HttpBuilder.withTimeout 90000",
-                "        |> HttpBuilder.withExpect\n            (Http.expectJson (RemoteData.fromResult >> msg) decoder)",
-                "        |> HttpBuilder.request",
-            ],
-        },
-    }
+    operation = ElmOperation(
+        fn_name="mode_api_mode_get",
+        http_method="get",
+        route='"/api/mode"',
+        params=(
+            ElmParam("msg", "(WebData a -> msg)"),
+            ElmParam("decoder", "D.Decoder a"),
+        ),
+        request_body=None,
+        expect="(Http.expectJson (RemoteData.fromResult >> msg) decoder)",
+    )
     elm_fn_str = """
 mode_api_mode_get : (WebData a -> msg) -> D.Decoder a -> Cmd msg
 mode_api_mode_get msg decoder =
@@ -27,21 +68,15 @@ mode_api_mode_get msg decoder =
             (Http.expectJson (RemoteData.fromResult >> msg) decoder)
         |> HttpBuilder.request
     """.strip()
-    formatted_fn_output = format_api_fn(
-        elm_fn_definition_dict,
-        # elm_fn_definition,
-        # elm_fn_arguments,
-        # route,
-        "get",
-        "",
-    )
+    formatted_fn_output = format_api_fn(operation)
     print(formatted_fn_output)
     print(elm_fn_str)
     assert formatted_fn_output == elm_fn_str
 
 
 def test_fn_url_param_output():
-    elm_route, args, args_names = add_url_parameters_to_fn(
+    params = []
+    elm_route, elm_headers = add_url_parameters_to_fn(
         {
             "parameters": [
                 {
@@ -52,11 +87,959 @@ def test_fn_url_param_output():
                 }
             ]
         },
-        args=[],
-        args_names=[],
-        elm_route='"' + "/api/db/question/{uuid}" + '"',
+        params=params,
         route="/api/db/question/{uuid}",
     )
-    assert len(args) == 1
-    assert args[0] == "String"
-    assert elm_route == '"/api/db/question/"++ uuid'
+    assert params == [ElmParam("uuid", "String")]
+    assert (
+        elm_route
+        == 'Url.Builder.absolute [ "api", "db", "question", Url.percentEncode uuid ] []'
+    )
+    assert elm_headers is None
+
+
+def test_query_and_header_params_are_typed_and_optional_ones_are_maybes():
+    params = []
+    elm_route, elm_headers = add_url_parameters_to_fn(
+        {
+            "parameters": [
+                {"name": "limit", "in": "query", "schema": {"type": "integer"}},
+                {
+                    "name": "q",
+                    "in": "query",
+                    "required": True,
+                    "schema": {"type": "string"},
+                },
+                {
+                    "name": "tag",
+                    "in": "query",
+                    "schema": {"type": "array", "items": {"type": "string"}},
+                },
+                {
+                    "name": "X-Request-Id",
+                    "in": "header",
+                    "required": True,
+                    "schema": {"type": "string"},
+                },
+                {"name": "item", "in": "path", "schema": {"type": "integer"}},
+                {"name": "session", "in": "cookie", "schema": {"type": "string"}},
+            ]
+        },
+        params=params,
+        # item is a substring of items, the old str.replace approach mangled this route
+        route="/api/items/{item}.json",
+    )
+    assert params == [
+        ElmParam("item", "Int"),
+        ElmParam("limit", "(Maybe Int)", "limit"),
+        ElmParam("q", "String", "q"),
+        ElmParam("tag", "(List String)"),
+        ElmParam("x_Request_Id", "String"),
+    ]
+    assert elm_route == (
+        'Url.Builder.absolute [ "api", "items", String.fromInt item ++ ".json" ] '
+        '(List.filterMap identity [ Maybe.map (Url.Builder.int "limit") limit, '
+        'Just (Url.Builder.string "q" q) ] ++ List.map (Url.Builder.string "tag") tag)'
+    )
+    assert elm_headers == '[ Tuple.pair "X-Request-Id" x_Request_Id ]'
+    assert [issue["code"] for issue in diagnostics[-1:]] == ["unsupported_parameter"]
+
+
+def test_manifest_reuses_unchanged_schemas_and_recompiles_dependents():
+    schemas = {
+        "Tag": {
+            "title": "Tag",
+            "type": "object",
+            "properties": {"name": {"type": "string"}},
+        },
+        "Pet": {
+            "title": "Pet",
+            "type": "object",
+            "properties": {"tag": {"$ref": "#/components/schemas/Tag"}},
+        },
+        "Owner": {
+            "title": "Owner",
+            "type": "object",
+            "properties": {"name": {"type": "string"}},
+        },
+    }
+    manifest = empty_manifest()
+    elm_types, _, _ = generate_all_elm_types(schemas, manifest=manifest)
+    assert set(manifest["schemas"].keys()) == {"Tag", "Pet", "Owner"}
+
+    for cached in manifest["schemas"].values():
+        cached["type_alias"] = "-- cached"
+    elm_types, _, _ = generate_all_elm_types(schemas, manifest=manifest)
+    assert elm_types == ["-- cached", "-- cached", "-- cached"]
+
+    schemas["Tag"]["properties"]["size"] = {"type": "integer"}
+    elm_types, _, _ = generate_all_elm_types(schemas, manifest=manifest)
+    assert elm_types[0].startswith("type alias ApiTag")
+    assert elm_types[1].startswith("type alias ApiPet")
+    assert elm_types[2] == "-- cached"
+
+
+def test_manifest_follows_refs_into_every_component():
+    apis = {
+        "openapi": "3.1.0",
+        "info": {},
+        "paths": {
+            "/api/items": {
+                "get": {
+                    "operationId": "list_items",
+                    "parameters": [{"$ref": "#/components/parameters/Limit"}],
+                    "requestBody": {"$ref": "#/components/requestBodies/Filter"},
+                    "responses": {},
+                }
+            }
+        },
+        "components": {
+            "schemas": {
+                "Filter": {
+                    "title": "Filter",
+                    "type": "object",
+                    "properties": {"tag": {"type": "string"}},
+                }
+            },
+            "parameters": {
+                "Limit": {"name": "limit", "in": "query", "schema": {"type": "string"}}
+            },
+            "requestBodies": {
+                "Filter": {
+                    "content": {
+                        "application/json": {
+                            "schema": {"$ref": "#/components/schemas/Filter"}
+                        }
+                    }
+                }
+            },
+        },
+    }
+    manifest = empty_manifest()
+    index_openapi_document(apis)
+    elm_fns = generate_all_elm_api_functions(apis, manifest=manifest)
+    assert 'Maybe.map (Url.Builder.string "limit") limit' in elm_fns["list_items"]
+    operation_hash = manifest["operations"]["get /api/items"]["hash"]
+
+    apis["components"]["schemas"]["Filter"]["properties"]["size"] = {"type": "integer"}
+    index_openapi_document(apis)
+    generate_all_elm_api_functions(apis, manifest=manifest)
+    assert manifest["operations"]["get /api/items"]["hash"] != operation_hash
+
+    apis["components"]["parameters"]["Limit"] = {
+        "name": "max",
+        "in": "query",
+        "schema": {"type": "integer"},
+    }
+    index_openapi_document(apis)
+    elm_fns = generate_all_elm_api_functions(apis, manifest=manifest)
+    assert 'Maybe.map (Url.Builder.int "max") max' in elm_fns["list_items"]
+
+
+def test_openapi_config_is_revalidated_with_etag(tmp_path):
+    spec = {"openapi": "3.1.0", "info": {}, "paths": {}}
+    served = []
+
+    class OpenApiHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.headers.get("If-None-Match") == '"v1"':
+                served.append(304)
+                self.send_response(304)
+                self.end_headers()
+                return
+            served.append(200)
+            body = json.dumps(spec).encode("utf-8")
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), OpenApiHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_port}/openapi.json"
+        cache_file = str(tmp_path / "openapi.json")
+        assert get_openapi_config(url, cache_file) == spec
+        assert get_openapi_config(url, cache_file) == spec
+    finally:
+        server.shutdown()
+    assert served == [200, 304]
+
+
+def test_batch_worker_writes_module_and_reports_failures(tmp_path):
+    spec_file = tmp_path / "spec.json"
+    spec_file.write_text(
+        json.dumps(
+            {
+                "openapi": "3.1.0",
+                "info": {},
+                "paths": {},
+                "components": {"schemas": {}},
+            }
+        )
+    )
+    output_file = tmp_path / "src" / "Service" / "ApiGen.elm"
+    result = generate_elm_module(
+        {
+            "url_or_path": str(spec_file),
+            "output_module": "Service.ApiGen",
+            "output_file": str(output_file),
+        }
+    )
+    assert result["error"] is None
+    assert output_file.read_text().startswith("module Service.ApiGen exposing(..)")
+
+    result = generate_elm_module(
+        {"url_or_path": str(tmp_path / "missing.json"), "output_module": "Missing"}
+    )
+    assert result["error"].startswith("FileNotFoundError")
+
+
+def test_parallel_generation_matches_serial_output():
+    apis = json.loads(fastapi_example.read_text())
+    schemas = apis["components"]["schemas"]
+    assert generate_all_elm_types(schemas, jobs=2) == generate_all_elm_types(schemas)
+    assert list(generate_all_elm_api_functions(apis, jobs=2).items()) == list(
+        generate_all_elm_api_functions(apis).items()
+    )
+
+
+def test_type_node_compiles_type_encoder_and_decoder_together():
+    node = compile_type_node(
+        {"type": "array", "items": {"$ref": "#/components/schemas/Question"}}
+    )
+    assert node.elm_type == "List (ApiQuestion)"
+    assert node.encoder == "E.list (api_question_encoder)"
+    assert node.decoder == "D.list (api_question_decoder)"
+    assert compile_type_node({"$ref": "#/components/schemas/Question"}) is (
+        compile_type_node({"$ref": "#/components/schemas/Question"})
+    )
+
+
+def test_list_responses_are_single_elm_arguments():
+    apis = json.loads(fastapi_example.read_text())
+    module = generate(apis)["ApiGen"]
+    assert (
+        "list_questions_api_db_questions_get : (Maybe Int)"
+        " -> (FastApiWebData (List (ApiQuestion)) -> msg) -> Cmd msg\n"
+    ) in module
+    assert (
+        "expect_fast_api_response (RemoteData.fromResult >> msg)"
+        " (D.list (api_question_decoder)) )"
+    ) in module
+
+
+def test_type_node_handles_deeply_nested_arrays():
+    schema = {"type": "integer"}
+    for _ in range(5000):
+        schema = {"type": "array", "items": schema}
+    node = compile_type_node(schema)
+    assert node.elm_type.startswith("List (List (")
+    assert node.decoder.endswith("( D.int )" + ")" * 5000)
+
+
+def test_ref_index_resolves_escaped_and_nested_pointers():
+    index_openapi_document(
+        {
+            "paths": {"/api/a/{id}": {"get": {"operationId": "a"}}},
+            "components": {"schemas": {"A": {"properties": {"x": {"type": "integer"}}}}},
+        }
+    )
+    assert resolve_ref("#/paths/~1api~1a~1{id}/get") == {"operationId": "a"}
+    assert resolve_ref("#/components/schemas/A/properties/x") == {"type": "integer"}
+    assert compile_type_node(
+        {"$ref": "#/components/schemas/A/properties/x"}
+    ).elm_type == " ( Int )"
+
+
+def test_schemas_are_ordered_by_dependency_and_cycles_are_wrapped_and_lazy():
+    schemas = {
+        "Comment": {
+            "title": "Comment",
+            "properties": {
+                "author": {"$ref": "#/components/schemas/User"},
+                "replies": {
+                    "type": "array",
+                    "items": {"$ref": "#/components/schemas/Comment"},
+                },
+            },
+        },
+        "User": {"title": "User", "properties": {"name": {"type": "string"}}},
+    }
+    order, recursive_schemas = topological_schema_order(schemas)
+    assert order == ["User", "Comment"]
+    assert recursive_schemas == {"Comment": frozenset({"Comment"})}
+
+    elm_types, elm_encoder_fns, elm_decoder_fns = generate_all_elm_types(schemas)
+    assert "(D.list (D.lazy (\\_ -> api_comment_decoder)))" in elm_decoder_fns[1]
+    assert '(D.field "author" api_user_decoder)' in elm_decoder_fns[1]
+    # elm rejects recursive type aliases, the record of a cycle is wrapped in a custom type
+    assert elm_types[0].startswith("type alias ApiUser =")
+    assert elm_types[1] == (
+        "type ApiComment\n"
+        "    = ApiComment\n"
+        "        { author: ApiUser\n"
+        "        , replies: List ApiComment\n"
+        "        }"
+    )
+    assert "api_comment_encoder (ApiComment ta) =" in elm_encoder_fns[1]
+    assert (
+        "D.map2 (\\field_0 field_1 -> "
+        "ApiComment { author = field_0, replies = field_1 })"
+    ) in elm_decoder_fns[1]
+
+
+def test_fragment_spool_replays_fragments_spilled_to_disk():
+    fragments = [f"fragment {i}\n" * (i % 7) for i in range(500)]
+    with FragmentSpool(max_size=64) as spool:
+        spool.extend(fragments)
+        assert list(spool) == fragments
+        assert spool.count == 500
+
+
+def test_streamed_file_matches_file_written_from_lists(tmp_path):
+    apis = json.loads(fastapi_example.read_text())
+    generate_elm_file(apis, output_file=str(tmp_path / "Streamed.elm"))
+
+    elm_types, elm_encoder_fns, elm_decoder_fns = generate_all_elm_types(
+        apis["components"]["schemas"]
+    )
+    write_http_fns_file(
+        generate_all_elm_api_functions(apis),
+        elm_types=elm_types,
+        elm_encoder_fns=elm_encoder_fns,
+        elm_decoder_fns=elm_decoder_fns,
+        output_file=str(tmp_path / "Lists.elm"),
+        open_api_version=apis["openapi"],
+        info=apis["info"],
+    )
+    assert (tmp_path / "Streamed.elm").read_text() == (
+        tmp_path / "Lists.elm"
+    ).read_text()
+
+
+def test_issues_are_reported_with_their_route():
+    apis = {
+        "paths": {
+            "/api/ping": {
+                "get": {
+                    "operationId": "ping_api_ping_get",
+                    "responses": {"200": {"description": "ok"}},
+                }
+            }
+        },
+        "components": {"schemas": {}},
+    }
+    index_openapi_document(apis)
+    diagnostics.clear()
+    generate_all_elm_api_functions(apis)
+    assert diagnostics == [
+        {
+            "code": "response_schema_missing",
+            "message": "schema response not defined",
+            "route": "/api/ping",
+            "method": "get",
+            "operation_id": "ping_api_ping_get",
+            "response": "200",
+        }
+    ]
+
+
+def test_synthetic_spec_is_deterministic_and_generates(tmp_path):
+    knobs = {"paths": 20, "schemas": 15, "nesting_depth": 3, "ref_fan_out": 3}
+    apis = generate_synthetic_spec(**knobs)
+    assert apis == generate_synthetic_spec(**knobs)
+    assert apis != generate_synthetic_spec(**knobs, seed=1)
+    assert len(apis["paths"]) == 20
+
+    generate_elm_file(apis, output_file=str(tmp_path / "ApiGen.elm"))
+    assert "api_model14_decoder" in (tmp_path / "ApiGen.elm").read_text()
+
+
+def test_profiler_records_stages_slowest_items_and_chrome_trace(tmp_path):
+    apis = generate_synthetic_spec(paths=12, schemas=8)
+    profiler = StageProfiler(slowest_count=3)
+    profiler.start()
+    try:
+        generate_elm_file(
+            apis, output_file=str(tmp_path / "ApiGen.elm"), profiler=profiler
+        )
+    finally:
+        profiler.stop()
+
+    assert profiler.stages["types"]["count"] == len(apis["components"]["schemas"])
+    assert profiler.stages["write"]["count"] == 1
+    assert profiler.stages["write"]["peak_bytes"] > 0
+    assert len(profiler.slowest_items["api_functions"]) == 3
+    assert "slowest types:" in profiler.summary()
+
+    profiler.write_chrome_trace(str(tmp_path / "trace.json"))
+    trace = json.loads((tmp_path / "trace.json").read_text())
+    assert {event["ph"] for event in trace["traceEvents"]} == {"X"}
+
+
+def test_watch_regenerates_once_per_burst_of_changes(tmp_path):
+    spec_file = tmp_path / "openapi.json"
+    spec_file.write_text(fastapi_example.read_text())
+    source = OpenApiSpecSource(str(spec_file))
+    stop = threading.Event()
+    regenerated = []
+
+    def on_change(body):
+        regenerated.append(json.loads(body))
+        if len(regenerated) == 1:
+            apis = json.loads(body)
+            for version in ("0.2", "0.3.0"):
+                apis["info"]["version"] = version
+                spec_file.write_text(json.dumps(apis))
+        else:
+            stop.set()
+
+    watcher = threading.Thread(
+        target=watch_openapi_spec,
+        args=(source, on_change),
+        kwargs={"interval": 0.01, "debounce": 0.05, "stop": stop},
+    )
+    watcher.start()
+    watcher.join(timeout=5)
+    assert not watcher.is_alive()
+    assert [apis["info"]["version"] for apis in regenerated] == ["0.1", "0.3.0"]
+    # touching the file without changing it is not a change
+    os.utime(spec_file, ns=(0, 1))
+    assert source.read_if_changed() is None
+
+
+def test_spec_files_are_read_plain_or_gzipped_with_only_used_sections(
+    tmp_path, monkeypatch
+):
+    apis = json.loads(fastapi_example.read_text())
+    spec = dict(apis, servers=[{"url": "/"}], webhooks={})
+    (tmp_path / "openapi.json").write_text(json.dumps(spec))
+    (tmp_path / "openapi.json.gz").write_bytes(gzip.compress(json.dumps(spec).encode()))
+
+    assert read_openapi_file(str(tmp_path / "openapi.json")) == apis
+    assert read_openapi_file(str(tmp_path / "openapi.json.gz")) == apis
+    monkeypatch.setattr(get_all_routes, "orjson", None)
+    assert read_openapi_file(str(tmp_path / "openapi.json.gz")) == apis
+    assert read_openapi_file(str(tmp_path / "openapi.json")) == apis
+
+
+def test_schema_ir_is_hashable_and_picklable():
+    elm_schema = generate_elm_type_and_encoder_decoder_fn(
+        {
+            "title": "ValidationError",
+            "properties": {
+                "loc": {
+                    "type": "array",
+                    "items": {"anyOf": [{"type": "string"}, {"type": "integer"}]},
+                },
+                "msg": {"type": "string"},
+            },
+        }
+    )
+    assert [field.elm_type for field in elm_schema.record.fields] == [
+        "List UT_String_Int",
+        "String",
+    ]
+    assert [v.tag for v in elm_schema.union_types[0].variants] == [
+        "UT_String_Int_String",
+        "UT_String_Int_Int",
+    ]
+    assert [d.fn_name for d in elm_schema.decoders] == [
+        "api_validationerror_decoder",
+        "ut_string_int_decoder",
+    ]
+    assert isinstance(elm_schema.encoders[0].target, ElmRecord)
+    assert pickle.loads(pickle.dumps(elm_schema)) == elm_schema
+    assert len({elm_schema, pickle.loads(pickle.dumps(elm_schema))}) == 1
+
+
+def test_selected_operations_only_keep_the_schemas_they_reach(tmp_path):
+    apis = json.loads(fastapi_example.read_text())
+    selected = select_openapi_document(apis, include_tags=["Test"])
+    assert list(selected["paths"]) == ["/api/test/optional"]
+    assert list(selected["components"]["schemas"]) == ["OptionalTest"]
+
+    selected = select_openapi_document(
+        apis, path_globs=["/api/db/question/*"], exclude_tags=["Test"]
+    )
+    assert list(selected["components"]["schemas"]) == [
+        "HTTPValidationError",
+        "OptionalTest",
+        "Question",
+        "ValidationError",
+    ]
+    assert select_openapi_document(apis) is apis
+
+    generate_elm_file(
+        select_openapi_document(apis, operation_ids=["mode_api_mode_get"]),
+        output_file=str(tmp_path / "ApiGen.elm"),
+    )
+    elm_module = (tmp_path / "ApiGen.elm").read_text()
+    assert "mode_api_mode_get :" in elm_module
+    assert "type alias Api" not in elm_module
+
+
+def test_split_modules_import_what_they_use_and_only_rewrite_changes(tmp_path):
+    apis = json.loads(fastapi_example.read_text())
+    written = generate_elm_modules(apis, src_dir=str(tmp_path))
+    assert written == {
+        "ApiGen.Types": True,
+        "ApiGen.Codecs": True,
+        "ApiGen.Untagged": True,
+        "ApiGen.Questions": True,
+        "ApiGen.Test": True,
+    }
+    questions = (tmp_path / "ApiGen" / "Questions.elm").read_text()
+    assert "import ApiGen.Types exposing (ApiQuestion, FastApiWebData)" in questions
+    assert "api_question_encoder, expect_fast_api_response)" in questions
+    assert "expect_fast_api_response :" in (
+        tmp_path / "ApiGen" / "Codecs.elm"
+    ).read_text()
+
+    apis["paths"]["/api/test/optional_v2"] = apis["paths"].pop("/api/test/optional")
+    written = generate_elm_modules(apis, src_dir=str(tmp_path))
+    assert [module for module, changed in written.items() if changed] == [
+        "ApiGen.Test"
+    ]
+
+
+def test_union_types_are_generated_once_per_shape():
+    def union_schema(title, prop_name, any_of):
+        return {
+            "title": title,
+            "properties": {
+                prop_name: {"type": "array", "items": {"anyOf": any_of}},
+                "also": {"type": "array", "items": {"anyOf": any_of}},
+            },
+        }
+
+    string_or_int = [{"type": "string"}, {"type": "integer"}]
+    schemas = {
+        "A": union_schema("A", "loc", string_or_int),
+        "B": union_schema("B", "path", string_or_int),
+        "C": union_schema("C", "loc", [{"type": "integer"}, {"type": "boolean"}]),
+    }
+    for jobs in (1, 2):
+        elm_types, elm_encoder_fns, elm_decoder_fns = generate_all_elm_types(
+            schemas, jobs=jobs
+        )
+        elm_module = "\n\n".join(elm_types + elm_encoder_fns + elm_decoder_fns)
+        assert elm_module.count("type UT_String_Int\n") == 1
+        assert elm_module.count("type UT_Int_Bool\n") == 1
+        assert elm_module.count("ut_string_int_decoder =") == 1
+        assert "path: List UT_String_Int" in elm_types[1]
+
+
+def test_output_is_only_replaced_when_its_content_changed(tmp_path):
+    apis = json.loads(fastapi_example.read_text())
+    output_file = tmp_path / "src" / "ApiGen.elm"
+    assert generate_elm_file(apis, output_file=str(output_file)) == {"ApiGen": True}
+    os.utime(output_file, ns=(0, 0))
+    assert generate_elm_file(apis, output_file=str(output_file)) == {"ApiGen": False}
+    assert output_file.stat().st_mtime_ns == 0
+
+    apis["info"]["version"] = "0.2"
+    assert generate_elm_file(apis, output_file=str(output_file)) == {"ApiGen": True}
+    assert "'version': '0.2'" in output_file.read_text()
+
+    try:
+        with ChangeAwareFile(str(output_file)) as f:
+            f.write("module Half")
+            raise RuntimeError("interrupted")
+    except RuntimeError:
+        pass
+    assert "'version': '0.2'" in output_file.read_text()
+    assert [p.name for p in output_file.parent.iterdir()] == ["ApiGen.elm"]
+
+
+def test_replaced_output_keeps_its_mode(tmp_path):
+    new_file = tmp_path / "New.elm"
+    previous_umask = os.umask(0o027)
+    try:
+        with ChangeAwareFile(str(new_file)) as f:
+            f.write("module New exposing (..)")
+    finally:
+        os.umask(previous_umask)
+    assert new_file.stat().st_mode & 0o777 == 0o640
+
+    output_file = tmp_path / "ApiGen.elm"
+    output_file.write_text("module Old exposing (..)")
+    output_file.chmod(0o640)
+    with ChangeAwareFile(str(output_file)) as f:
+        f.write("module ApiGen exposing (..)")
+    assert f.written is True
+    assert output_file.stat().st_mode & 0o777 == 0o640
+
+
+def test_library_generate_is_isolated_per_call_and_thread(tmp_path, capsys):
+    apis = json.loads(fastapi_example.read_text())
+    apis["paths"]["/api/ping"] = {
+        "get": {"operationId": "ping", "responses": {"200": {"description": "ok"}}}
+    }
+    generate_elm_file(apis, output_file=str(tmp_path / "ApiGen.elm"))
+    assert generate(apis) == {"ApiGen": (tmp_path / "ApiGen.elm").read_text()}
+
+    def generate_with_prefix(prefix):
+        issues = []
+        modules = generate(
+            apis,
+            GeneratorOptions(module_name=f"{prefix}Gen", type_prefix=prefix, tab="  "),
+            issues=issues,
+        )
+        return modules, issues
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(generate_with_prefix, ["Foo", "Bar"] * 8))
+    for prefix, (modules, issues) in zip(["Foo", "Bar"] * 8, results):
+        elm_module = modules[f"{prefix}Gen"]
+        assert f"type alias {prefix}Question =\n  {{ uuid: String" in elm_module
+        assert "ApiQuestion" not in elm_module
+        assert [issue["operation_id"] for issue in issues] == ["ping"]
+
+    split = generate(apis, GeneratorOptions(split_modules=True, include_tags=("Test",)))
+    assert list(split) == ["ApiGen.Types", "ApiGen.Codecs", "ApiGen.Test"]
+    assert capsys.readouterr() == ("", "")
+
+
+def test_external_refs_are_fetched_once_and_bundled_into_components(
+    tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    served = []
+
+    class SharedHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            served.append((self.path, self.headers.get("If-None-Match")))
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            tag = {"type": "object", "properties": {"name": {"type": "string"}}}
+            body = json.dumps({"Tag": tag}).encode("utf-8")
+            self.send_response(200)
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SharedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    shared_url = f"http://127.0.0.1:{server.server_port}/shared.json"
+    (tmp_path / "common").mkdir()
+    (tmp_path / "common" / "errors.json").write_text(
+        json.dumps(
+            {
+                "Error": {
+                    "type": "object",
+                    "properties": {
+                        "detail": {"$ref": "#/Detail"},
+                        "tag": {"$ref": f"{shared_url}#/Tag"},
+                    },
+                },
+                "Detail": {"properties": {"message": {"type": "string"}}},
+            }
+        )
+    )
+    spec = {
+        "openapi": "3.1.0",
+        "info": {},
+        "paths": {
+            "/api/pets": {
+                "get": {
+                    "operationId": "list_pets",
+                    "responses": {
+                        "200": {
+                            "content": {
+                                "application/json": {
+                                    "schema": {"$ref": "./common/errors.json#/Error"}
+                                }
+                            }
+                        }
+                    },
+                }
+            }
+        },
+        "components": {
+            "schemas": {
+                "Detail": {
+                    "title": "Detail",
+                    "properties": {"code": {"type": "integer"}},
+                },
+                "Pet": {
+                    "title": "Pet",
+                    "properties": {"tag": {"$ref": f"{shared_url}#/Tag"}},
+                },
+            }
+        },
+    }
+    (tmp_path / "openapi.json").write_text(json.dumps(spec))
+    try:
+        for _ in range(2):
+            apis = get_all_routes.load_openapi_spec(
+                str(tmp_path / "openapi.json"), str(tmp_path / "cache.json")
+            )
+    finally:
+        server.shutdown()
+
+    assert served == [("/shared.json", None), ("/shared.json", '"v1"')]
+    schemas = apis["components"]["schemas"]
+    assert sorted(schemas) == ["Detail", "Detail2", "Error", "Pet", "Tag"]
+    assert schemas["Error"]["properties"] == {
+        "detail": {"$ref": "#/components/schemas/Detail2"},
+        "tag": {"$ref": "#/components/schemas/Tag"},
+    }
+    assert schemas["Pet"]["properties"]["tag"] == {"$ref": "#/components/schemas/Tag"}
+    modules = generate(apis)
+    assert "{ detail: ApiDetail2\n    , tag: ApiTag" in modules["ApiGen"]
+
+
+def test_wide_records_are_decoded_in_map8_stages_or_with_a_pipeline():
+    properties = {f"field{i}": {"type": "integer"} for i in range(11)}
+    apis = {
+        "openapi": "3.1.0",
+        "info": {},
+        "paths": {},
+        "components": {
+            "schemas": {"Wide": {"title": "Wide", "properties": properties}}
+        },
+    }
+
+    module = generate(apis)["ApiGen"]
+    assert "D.map8 ApiWide\n" in module
+    assert "|> D.andThen\n            (\\ctor ->\n                D.map3 ctor\n" in module
+    assert '(D.field "field10" D.int)' in module
+    assert "JDP.required" not in module
+
+    module = generate(apis, GeneratorOptions(decoder_style="pipeline"))["ApiGen"]
+    assert "D.succeed ApiWide" in module
+    assert module.count("|> JDP.required") == 11
+
+
+def test_cached_get_variants_take_their_ttl_from_cli_extension_or_default(tmp_path):
+    apis = json.loads(fastapi_example.read_text())
+    apis["paths"]["/api/db/questions"]["get"]["x-cache-ttl"] = 5
+    options = GeneratorOptions(
+        cache=True, cache_ttl=30, cache_ttls=(("mode_api_mode_get", 0),)
+    )
+    modules = generate(apis, options)
+    assert sorted(modules) == ["ApiGen", "ApiGen.Cache"]
+    assert modules["ApiGen.Cache"].startswith("module ApiGen.Cache exposing")
+    assert "default_ttl_ms = 30000" in modules["ApiGen.Cache"]
+    module = modules["ApiGen"]
+    assert "import ApiGen.Cache as Cache\nimport Time" in module
+    assert "ttl_ms = Just 0\n" in module.split("mode_api_mode_get_cached :")[1]
+    assert "ttl_ms = Just 5000\n" in module.split("questions_get_cached :")[1]
+    assert "ttl_ms = Just 30000\n" in module.split("uuid__get_cached :")[1]
+    assert "create_question_api_db_questions_post_cached" not in module
+    assert "_cached" not in generate(apis)["ApiGen"]
+
+    output_file = tmp_path / "src" / "ApiGen.elm"
+    context = get_all_routes.copy_context()
+    context.run(get_all_routes.generator_options.set, options)
+    written = context.run(generate_elm_file, apis, str(output_file))
+    assert written == {"ApiGen": True, "ApiGen.Cache": True}
+    assert (tmp_path / "src" / "ApiGen" / "Cache.elm").read_text() == modules[
+        "ApiGen.Cache"
+    ]
+
+
+def test_cli_option_defaults_are_the_generator_option_defaults():
+    defaults = {param.name: param.default for param in write_elm_fns.params}
+    assert defaults["cache_ttl"] == GeneratorOptions().cache_ttl
+    assert defaults["cache_max_entries"] == GeneratorOptions().cache_max_entries
+
+
+def test_configurable_options_are_taken_from_cli_and_batch_entries():
+    for command in (write_elm_fns, get_all_routes.watch):
+        params = {param.name for param in command.params}
+        assert set(configurable_options) <= params
+    assert set(configurable_options) <= set(GeneratorOptions.__dataclass_fields__)
+
+    service = {
+        "output_module": "Billing",
+        "retry": True,
+        "retry_statuses": [503],
+        "cache_ttls": {"list_invoices": 5000},
+    }
+    options = pop_configurable_options(service)
+    assert options == {
+        "retry": True,
+        "retry_statuses": (503,),
+        "cache_ttls": (("list_invoices", 5000),),
+    }
+    assert service == {"output_module": "Billing"}
+
+
+def test_task_variants_share_the_request_of_their_api_function():
+    apis = json.loads(fastapi_example.read_text())
+    modules = generate(apis, GeneratorOptions(tasks=True, split_modules=True))
+    assert "ApiGen.Tasks" in modules
+    assert "join_update :" in modules["ApiGen.Tasks"]
+    questions = next(
+        module for module in modules.values() if "list_questions_api" in module
+    )
+    assert "\nimport Task\n" in questions
+    assert (
+        "list_questions_api_db_questions_get_task : (Maybe Int)"
+        " -> Task.Task FastApiHttpError (List (ApiQuestion))"
+    ) in questions
+    task = questions.split("create_question_api_db_questions_post_task req_body =")[1]
+    assert '{ method = "POST"' in task
+    assert ", body = Http.jsonBody (api_question_encoder req_body)" in task
+    assert (
+        ", resolver = Http.stringResolver"
+        " (fast_api_response_to_result api_question_decoder)"
+    ) in task
+    assert "_task" not in generate(apis)["ApiGen"]
+
+
+def test_timeouts_per_operation_and_retry_variants_of_idempotent_functions():
+    apis = json.loads(fastapi_example.read_text())
+    apis["paths"]["/api/db/questions"]["get"]["x-timeout-ms"] = 5000
+    options = GeneratorOptions(
+        timeout_ms=1000, tag_timeouts=(("Questions", 20000),), retry=True
+    )
+    modules = generate(apis, options)
+    assert sorted(modules) == ["ApiGen", "ApiGen.Retry"]
+    assert "retry_statuses = [ 502, 503, 504 ]" in modules["ApiGen.Retry"]
+    module = modules["ApiGen"]
+    assert "import Task\nimport ApiGen.Retry as Retry" in module
+
+    def timeout_of(fn_name: str) -> str:
+        return module.split(f"\n{fn_name} :")[1].split("withTimeout ")[1].split("\n")[0]
+
+    assert timeout_of("mode_api_mode_get") == "1000"
+    assert timeout_of("get_question_api_db_question__uuid__get") == "20000"
+    assert timeout_of("list_questions_api_db_questions_get") == "5000"
+    assert (
+        "list_questions_api_db_questions_get_retry : Retry.Policy -> (Maybe Int)"
+        " -> (FastApiWebData (List (ApiQuestion)) -> msg) -> Cmd msg\n"
+    ) in module
+    assert (
+        "list_questions_api_db_questions_get_retry policy limit msg =\n"
+        "    list_questions_api_db_questions_get_task limit\n"
+        "        |> Retry.retry (is_retryable_error policy.retry_statuses) policy"
+        ' (Url.Builder.absolute [ "api", "db", "questions" ]'
+    ) in module
+    # the jitter comes from the policy's seed, not from the clock shared by every client
+    assert "seed : Random.Seed" in modules["ApiGen.Retry"]
+    assert "Random.step (backoff_ms policy attempt) seed" in modules["ApiGen.Retry"]
+    assert "create_question_api_db_questions_post_task" in module
+    assert "create_question_api_db_questions_post_retry" not in module
+
+
+def test_paginated_list_operations_get_a_pages_source():
+    apis = json.loads(fastapi_example.read_text())
+    apis["components"]["schemas"]["EventPage"] = {
+        "title": "EventPage",
+        "type": "object",
+        "properties": {
+            "events": {"type": "array", "items": {"type": "string"}},
+            "next": {"anyOf": [{"type": "string"}, {"type": "null"}], "title": "Next"},
+        },
+    }
+    apis["paths"]["/api/events"] = {
+        "get": {
+            "operationId": "list_events",
+            "x-pagination": {"style": "cursor", "page_param": "from"},
+            "parameters": [
+                {"name": "from", "in": "query", "schema": {"type": "string"}},
+                {"name": "per_page", "in": "query", "schema": {"type": "integer"}},
+            ],
+            "responses": {
+                "200": {
+                    "content": {
+                        "application/json": {
+                            "schema": {"$ref": "#/components/schemas/EventPage"}
+                        }
+                    }
+                }
+            },
+        }
+    }
+    questions = apis["paths"]["/api/db/questions"]["get"]
+    questions["parameters"].append(
+        {"name": "skip", "in": "query", "required": True, "schema": {"type": "integer"}}
+    )
+    issues = []
+    modules = generate(apis, GeneratorOptions(pagination=True), issues)
+    assert sorted(modules) == ["ApiGen", "ApiGen.Paging"]
+    assert issues == []
+    module = modules["ApiGen"]
+    assert "import Task\nimport ApiGen.Paging as Paging" in module
+    assert (
+        "list_questions_api_db_questions_get_pages limit =\n"
+        "    { first = Paging.Offset 0 (Maybe.withDefault 0 limit)\n"
+        "    , fetch =\n"
+        "        \\page ->\n"
+        "            list_questions_api_db_questions_get_task limit (Paging.offset_of page)\n"
+        "                |> Task.map (\\response -> Paging.loaded page response)\n"
+    ) in module
+    assert (
+        "list_events_pages : (Maybe Int) -> Paging.Source FastApiHttpError ( String )"
+    ) in module
+    assert (
+        "list_events_task (Paging.cursor_of page) per_page\n"
+        "                |> Task.map (\\response -> "
+        "Paging.cursor_loaded page response.next response.events)"
+    ) in module
+    assert "get_question_api_db_question__uuid__get_pages" not in module
+
+    questions["x-pagination"] = False
+    module = generate(apis, GeneratorOptions(pagination=True))["ApiGen"]
+    assert "list_questions_api_db_questions_get_pages" not in module
+
+
+def test_cursor_pagination_needs_a_string_cursor_in_the_response_record():
+    apis = json.loads(fastapi_example.read_text())
+    apis["components"]["schemas"]["EventPage"] = {
+        "title": "EventPage",
+        "type": "object",
+        "properties": {
+            "items": {"type": "array", "items": {"type": "string"}},
+            # what pydantic v2 writes for next_cursor: str | None = None
+            "next_cursor": {
+                "anyOf": [{"type": "string"}, {"type": "null"}],
+                "default": None,
+                "title": "Next Cursor",
+            },
+        },
+    }
+    apis["paths"]["/api/events"] = {
+        "get": {
+            "operationId": "list_events",
+            "parameters": [
+                {"name": "cursor", "in": "query", "schema": {"type": "string"}},
+            ],
+            "responses": {
+                "200": {
+                    "content": {
+                        "application/json": {
+                            "schema": {"$ref": "#/components/schemas/EventPage"}
+                        }
+                    }
+                }
+            },
+        }
+    }
+    issues = []
+    module = generate(apis, GeneratorOptions(pagination=True), issues)["ApiGen"]
+    assert "list_events_pages" not in module
+    codes = [issue["code"] for issue in issues]
+    assert codes.count("invalid_pagination") == 1
+    assert codes.count("unknown_property_type") == 1
+
+    apis["components"]["schemas"]["EventPage"]["properties"]["next_cursor"] = {
+        "type": "string",
+        "title": "Next Cursor",
+    }
+    module = generate(apis, GeneratorOptions(pagination=True))["ApiGen"]
+    assert "Paging.cursor_loaded page (Just response.next_cursor)" in module